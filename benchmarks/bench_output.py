@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of the accumulation of per-subject outputs in Experiment.process.
+
+Compares growing each channel with one pd.concat per subject against
+collecting the blocks with OutputBuilder and concatenating once.
+
+Usage:
+  python benchmarks/bench_output.py
+"""
+import time
+import numpy as np
+import pandas as pd
+from pypsych.output import OutputBuilder, long_block, concat_long
+
+N_BINS = 40
+STATS = ['VAL', 'SEM', 'COUNT', 'NANS']
+
+
+def synthetic_output(subject_id):
+    """One subject's long-format output for a single channel."""
+    label_bins = pd.DataFrame({'Order': np.arange(N_BINS),
+                               'ID': ['ID{}'.format(i) for i in range(N_BINS)],
+                               'Label': 'Label',
+                               'Condition': 'Condition',
+                               'Bin_Order': np.arange(N_BINS),
+                               'Bin_Index': 0})
+    output = concat_long([long_block(label_bins, 'channel', stat,
+                                     np.random.rand(N_BINS))
+                          for stat in STATS])
+    output.insert(0, 'Subject', subject_id)
+    return output
+
+
+def concat_per_subject(outputs):
+    output = None
+    for subject_output in outputs:
+        if output is None:
+            output = subject_output
+        else:
+            output = concat_long([output, subject_output])
+    return output
+
+
+def collect_then_concat(outputs):
+    builder = OutputBuilder(['Task'], subjects=range(len(outputs)))
+    for subject_id, subject_output in enumerate(outputs):
+        builder.add('Task', subject_id, subject_output)
+    return builder.build()['Task']
+
+
+def timed(fun, *args):
+    start = time.time()
+    fun(*args)
+    return time.time() - start
+
+
+if __name__ == '__main__':
+    print '{:>8} {:>14} {:>14}'.format('subjects', 'per-subject', 'builder')
+    for n_subjects in [10, 100, 1000]:
+        outputs = [synthetic_output(i) for i in range(n_subjects)]
+        print '{:>8} {:>13.3f}s {:>13.3f}s'.format(
+            n_subjects,
+            timed(concat_per_subject, outputs),
+            timed(collect_then_concat, outputs))
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of Experiment.pivot_outputs.
+
+Compares pivoting each channel statistic of the Panel views with
+pd.pivot_table and a Python aggfunc against pivot_long, which unstacks every
+wide table of a task at once from the long-format output.
+
+Usage:
+  python benchmarks/bench_pivot.py
+"""
+import time
+import numpy as np
+import pandas as pd
+from pypsych.output import long_block, concat_long, long_to_panels, \
+    pivot_long
+
+N_LABELS = 10
+N_BINS = 4
+CHANNELS = ['LDiameter', 'RDiameter', 'LPOR', 'RPOR']
+STATS = ['VAL', 'SEM', 'COUNT', 'NANS']
+
+
+def synthetic_output(subject_id):
+    """One subject's long-format output, N_LABELS labels of N_BINS bins."""
+    n_rows = N_LABELS * N_BINS
+    label_bins = pd.DataFrame({
+        'Order': np.repeat(np.arange(N_LABELS), N_BINS),
+        'ID': np.repeat(['ID{}'.format(i) for i in range(N_LABELS)], N_BINS),
+        'Label': np.repeat(['Label{}'.format(i % 3) for i in range(N_LABELS)],
+                           N_BINS),
+        'Condition': np.repeat(['Cond{}'.format(i % 2)
+                                for i in range(N_LABELS)], N_BINS),
+        'Bin_Order': np.arange(n_rows),
+        'Bin_Index': np.tile(np.arange(N_BINS), N_LABELS)})
+    output = concat_long([long_block(label_bins, channel, stat,
+                                     np.random.rand(n_rows))
+                          for channel in CHANNELS
+                          for stat in STATS])
+    output.insert(0, 'Subject', subject_id)
+    return output
+
+
+def pivot_panels(output):
+    """The wide tables as pivoted before pivot_long."""
+    pivots = {}
+    for channel, stats in long_to_panels(output).iteritems():
+        pivots[channel] = {}
+        stats.loc[:, :, 'Event'] = stats.loc[:, :, 'Label'] \
+            + stats.loc[:, :, 'Bin_Index'].astype(str)
+        for stat_name, stat in stats.iteritems():
+            full_cols = stat[['Subject', 'Condition',
+                              'ID', 'Order']].dropna(how='all', axis=1)\
+                                             .columns
+            pivots[channel][stat_name] = pd.pivot_table(
+                stat,
+                values='stat',
+                index=list(full_cols),
+                columns='Event',
+                aggfunc=lambda x: x.iloc[0])
+    return pivots
+
+
+def timed(fun, *args):
+    start = time.time()
+    result = fun(*args)
+    return time.time() - start, result
+
+
+if __name__ == '__main__':
+    print '{:>8} {:>14} {:>14}'.format('subjects', 'pivot_table', 'pivot_long')
+    for n_subjects in [50, 500]:
+        output = concat_long([synthetic_output(i)
+                              for i in range(n_subjects)])
+        panels_time, expected = timed(pivot_panels, output)
+        long_time, pivots = timed(pivot_long, output)
+        for channel in CHANNELS:
+            for stat in STATS:
+                pd.util.testing.assert_frame_equal(
+                    pivots[channel][stat],
+                    expected[channel][stat].astype(np.float64),
+                    check_index_type=False)
+        print '{:>8} {:>13.3f}s {:>13.3f}s'.format(n_subjects, panels_time,
+                                                   long_time)
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of the Biopac channel smoothers in pypsych.data_sources.smoothers.
+
+Each smoother is run on synthetic heart rate channels sampled every 100 ms, as
+Biopac._clean_samples sees them, and compared with the full-length spline
+which Biopac has always used. The deviation is reported as the RMS and the
+maximum absolute difference from the spline, and the error as the RMS
+difference from the noiseless channel, in the units of the channel.
+
+Usage:
+  python benchmarks/bench_smoothers.py
+"""
+import time
+import numpy as np
+from pypsych.data_sources.smoothers import SMOOTHERS
+
+MINUTES = [10, 30, 60]
+
+# Parameters of the compared smoothers. The spline comes first as the
+# reference.
+CANDIDATES = [('spline', {}),
+              ('windowed_spline', {}),
+              ('savgol', {}),
+              ('savgol', {'window': 31}),
+              ('whittaker', {}),
+              ('whittaker', {'lam': 10000.0})]
+
+
+def synthetic_channel(n_samples, seed=0):
+    """A slowly drifting heart rate with beat-to-beat noise, in bpm."""
+    rng = np.random.RandomState(seed)
+    t = np.arange(n_samples) * 0.1
+    drift = np.cumsum(rng.normal(0, 0.02, n_samples))
+    truth = 70 + 5*np.sin(2*np.pi*t/60) + 2*np.sin(2*np.pi*t/7) + drift
+    y = truth + rng.normal(0, 0.7, n_samples)
+    return np.arange(n_samples) * 100, y, truth
+
+
+def timed(fun, *args, **kwargs):
+    start = time.time()
+    res = fun(*args, **kwargs)
+    return time.time() - start, res
+
+
+if __name__ == '__main__':
+    print '{:>7} {:>30} {:>8} {:>8} {:>8} {:>8}'.format(
+        'minutes', 'smoother', 'seconds', 'rms', 'max', 'error')
+    for minutes in MINUTES:
+        x, y, truth = synthetic_channel(minutes*600)
+        reference = None
+        for name, params in CANDIDATES:
+            seconds, smoothed = timed(SMOOTHERS[name], x, y, **params)
+            if reference is None:
+                reference = smoothed
+            diff = smoothed - reference
+            print '{:>7} {:>30} {:>8.3f} {:>8.4f} {:>8.4f} {:>8.4f}'.format(
+                minutes,
+                name + (' ' + str(params) if params else ''),
+                seconds,
+                np.sqrt(np.mean(diff**2)),
+                np.max(np.abs(diff)),
+                np.sqrt(np.mean((smoothed - truth)**2)))
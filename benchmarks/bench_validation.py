@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of the construction of the validation matrix in
+Experiment.validate_files.
+
+Compares pivoting the schedule and the file checks with Python aggfuncs
+against the long status table of pypsych.validation, unstacked once. The
+schedule has a file of every column for every subject, and a few percent of
+the checks fail.
+
+Usage:
+  python benchmarks/bench_validation.py
+"""
+import time
+import numpy as np
+import pandas as pd
+from pypsych.validation import file_counts, status_table, status_matrix, \
+    FILE_COLUMNS
+
+N_FILE_COLUMNS = 20
+
+
+def synthetic_validation(n_subjects):
+    """A schedule with N_FILE_COLUMNS files per subject and their checks."""
+    files = [('Source{}'.format(i % 2), 'Task{}'.format(i // 4),
+              'file{}'.format(i % 4 // 2))
+             for i in range(N_FILE_COLUMNS)]
+    rows = [(subject, ds_name, task, file_type, 'path')
+            for subject in range(n_subjects)
+            for ds_name, task, file_type in files]
+    sched_df = pd.DataFrame.from_records(
+        rows, columns=['Subject'] + FILE_COLUMNS + ['Path'])
+
+    passed = np.random.RandomState(0).uniform(size=len(rows)) > 0.03
+    validation = {}
+    for (subject, ds_name, task, file_type, _), ok in zip(rows, passed):
+        validation.setdefault((subject, task, ds_name), {})[file_type] = ok
+    return sched_df, validation
+
+
+def pivot_aggfuncs(sched_df, validation):
+    """The matrix as built before the long table, with Python aggfuncs."""
+    vf = (sched_df.pivot_table(index='Subject',
+                               columns=FILE_COLUMNS,
+                               values='Path',
+                               aggfunc=lambda x: len(x)) == 1)
+    ef = [{'Subject': subject,
+           'Task_Name': task,
+           'File': file_type,
+           'Data_Source_Name': ds_name,
+           'Status': status}
+          for (subject, task, ds_name), sub in validation.iteritems()
+          for file_type, status in sub.iteritems()]
+    ef = pd.DataFrame.from_dict(ef)
+    ef = ef.pivot_table(index='Subject',
+                        columns=FILE_COLUMNS,
+                        values='Status',
+                        aggfunc=np.all).replace(np.nan, True)
+    ef = ef.as_matrix().astype(bool)
+    zf = vf.as_matrix()
+    yf = np.copy(zf).astype(np.object)
+    yf[zf] = 'Found'
+    yf[~ef] = 'Corrupt'
+    yf[~zf] = 'Missing'
+    vf.loc[:, :] = yf
+    return vf
+
+
+def long_table(sched_df, validation):
+    """The matrix unstacked from the long status table."""
+    checks = pd.DataFrame.from_records(
+        [(subject, ds_name, task, file_type, passed)
+         for (subject, task, ds_name), sub in validation.iteritems()
+         for file_type, passed in sub.iteritems()],
+        columns=['Subject'] + FILE_COLUMNS + ['Passed'])
+    return status_matrix(status_table(file_counts(sched_df), checks))
+
+
+def timed(fun, *args):
+    start = time.time()
+    result = fun(*args)
+    return time.time() - start, result
+
+
+if __name__ == '__main__':
+    print '{:>8} {:>14} {:>14}'.format('subjects', 'aggfuncs', 'long table')
+    for n_subjects in [10, 100, 1000]:
+        sched_df, validation = synthetic_validation(n_subjects)
+        pivot_time, pivoted = timed(pivot_aggfuncs, sched_df, validation)
+        long_time, unstacked = timed(long_table, sched_df, validation)
+        assert (pivoted.values == unstacked.values).all()
+        print '{:>8} {:>13.3f}s {:>13.3f}s'.format(n_subjects, pivot_time,
+                                                   long_time)
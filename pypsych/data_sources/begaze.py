@@ -7,36 +7,135 @@ Includes the BeGaze data source class
 import pandas as pd
 import numpy as np
 from data_source import DataSource
-from schema import Schema, Or, Optional
+from interpolation import interpolate_gaps, chunk_cut
+from schema import Schema, And, Or, Optional
 
+# Degree of the spline filling the gaps of the pupil diameter
+INTERPOLATION_ORDER = 3
 
-def _val(x, pos, label_bin):
-    return np.mean(x)
+# Gaps are filled from this many valid samples on either side of them unless
+# the interpolation option sets another window, or none for the global fit.
+DEFAULT_INTERPOLATION_WINDOW = 100
 
 
-def _sem(x, pos, label_bin):
-    return x.sem(axis=0)
+def _streamable(options):
+    """Streamed samples can only be filled with an interpolation window."""
+    return options.get('chunksize') is None or \
+        options.get('interpolation', {}).get('window', 0) is not None
 
 
-def _count(x, pos, label_bin):
-    return np.size(x)
-
-
-def _nans(x, pos, label_bin):
-    return np.size(pos) - np.sum(pos)
+class BeGaze(DataSource):
+    # Columns of the samples file used by _clean_samples, and their dtypes
+    samples_dtypes = {'Time': np.float64,
+                      'L Pupil Diameter [mm]': np.float64,
+                      'L Event Info': 'category'}
 
+    # Columns of the labels copied to each of their bins
+    label_info_columns = ['ID', 'Label', 'Condition']
 
-class BeGaze(DataSource):
     def __init__(self, config, schedule):
 
         # Call the parent class init
         super(BeGaze, self).__init__(config, schedule)
 
         # Diameter channel statistics
-        self.panels = {'LDiameter': {'VAL': _val,
-                                     'SEM': _sem,
-                                     'COUNT': _count,
-                                     'NANS': _nans}}
+        self.panels = {'LDiameter': {'VAL': 'mean',
+                                     'SEM': 'sem',
+                                     'COUNT': 'count',
+                                     'NANS': 'nans'}}
+
+    def load(self, file_paths):
+        """
+        Load the labels file as TSV and only the used columns of the samples
+        file, with explicit dtypes. With the chunksize option, the samples are
+        not loaded but streamed from their file by bin_data.
+        """
+        super(BeGaze, self).load({file_type: file_path
+                                  for file_type, file_path
+                                  in file_paths.iteritems()
+                                  if file_type != 'samples'})
+        self.samples_path = file_paths['samples']
+        if self.options.get('chunksize') is None:
+            self.data['samples'] = self._read_samples(
+                file_paths['samples'],
+                dtypes=self.samples_dtypes)
+
+    def load_and_merge(self, file_paths, loaded=None):
+        """
+        With the chunksize option, only the labels are merged, and the sample
+        cache is bypassed since there are no merged samples to keep.
+        """
+        if self.options.get('chunksize') is None:
+            super(BeGaze, self).load_and_merge(file_paths, loaded=loaded)
+            return
+
+        if loaded is None:
+            self.load(file_paths)
+        else:
+            self.data = loaded
+            self.samples_path = file_paths['samples']
+        self.merge_data()
+
+    @staticmethod
+    def _read_samples(file_path, dtypes, chunksize=None):
+        """
+        Read the given columns of a BeGaze samples file.
+
+        Args:
+          file_path (str): path to the samples file.
+          dtypes (dict): dtype of each column to read.
+          chunksize (int): if given, return an iterator over chunks of this
+            many rows instead.
+        """
+        return pd.read_csv(file_path,
+                           comment="#",
+                           delimiter="\t",
+                           skipinitialspace=True,
+                           usecols=dtypes.keys(),
+                           dtype=dtypes,
+                           chunksize=chunksize)
+
+    def _stream_samples(self):
+        """
+        Read and clean the samples file in chunks of the chunksize option.
+
+        The gaps of each chunk are filled up to the chunk_cut of its diameter,
+        and the samples after the cut are carried over to the next chunk along
+        with the window valid samples before it, so the cleaned samples are
+        exactly those of _clean_samples. A chunk without a cut is carried over
+        whole, so memory is bounded by the chunk size as long as the
+        recording has runs of 2*window valid samples.
+
+        Output:
+          chunks (generator): the cleaned samples, in time order.
+        """
+        interpolation = self._interpolation()
+        window = interpolation['window']
+        reader = self._read_samples(self.samples_path,
+                                    dtypes=self.samples_dtypes,
+                                    chunksize=self.options['chunksize'])
+        time_zero = None
+        carried = None
+        # Number of rows at the start of carried which were already yielded
+        n_yielded = 0
+        for chunk in reader:
+            if time_zero is None:
+                time_zero = chunk['Time'].values[0]
+            chunk = self._mark_fixations(chunk, time_zero)
+            if carried is not None:
+                chunk = pd.concat([carried, chunk])
+            cut = chunk_cut(chunk['LDiameter'].values, window)
+            if cut is None or cut <= n_yielded:
+                carried = chunk
+                continue
+            yield self._fill_gaps(chunk.iloc[:cut].copy(),
+                                  interpolation).iloc[n_yielded:]
+            carried = chunk.iloc[cut - window:]
+            n_yielded = window
+
+        if carried is not None and len(carried) > n_yielded:
+            yield self._fill_gaps(carried.copy(),
+                                  interpolation).iloc[n_yielded:]
 
     def merge_data(self):
         """
@@ -44,8 +143,10 @@ class BeGaze(DataSource):
         """
         # TODO(janmtl): return an error if the files have not been loaded yet.
 
-        # Clean the samples data frame and the labels data frame
-        self.data['samples'] = self._clean_samples(self.data['samples'])
+        # Clean the samples data frame and the labels data frame. Streamed
+        # samples are cleaned by bin_data.
+        if 'samples' in self.data:
+            self.data['samples'] = self._clean_samples(self.data['samples'])
         self.data['labels'] = self._clean_labels(self.data['labels'])
 
         # Combine the labels data with the labels configuration
@@ -55,6 +156,26 @@ class BeGaze(DataSource):
 
         self.data['labels'] = self._clean_duplicate_labels(self.data['labels'])
 
+    def bin_data(self):
+        """
+        Bin the merged samples or, with the chunksize option, the samples
+        streamed from their file. See DataSource.bin_chunks.
+        """
+        if self.options.get('chunksize') is None:
+            super(BeGaze, self).bin_data()
+        else:
+            self.bin_chunks(self._stream_samples())
+
+    def validate_data(self):
+        """
+        Check that each data file has at least one record. Streamed samples
+        are checked on their file.
+        """
+        status = super(BeGaze, self).validate_data()
+        if self.options.get('chunksize') is not None:
+            status['samples'] = self.check_file('samples', self.samples_path)
+        return status
+
     @staticmethod
     def _clean_labels(labels):
         """
@@ -81,16 +202,26 @@ class BeGaze(DataSource):
         labels = pd.concat([labels, temp_labels], axis=1)
         return labels
 
-    @staticmethod
-    def _clean_samples(samples):
+    def _clean_samples(self, samples):
         """
         Turn any non-Fixation data points into NaN values and extract and
-        relabel the columns.
+        relabel the columns. The diameter is then interpolated across the
+        gaps as set by the interpolation option.
 
         Args:
           samples (pandas Data Frame): data frame resulting from loading the
             BeGaze samples file.
         """
+        samples = self._mark_fixations(samples, samples.loc[0, 'Time'])
+        return self._fill_gaps(samples, self._interpolation())
+
+    @staticmethod
+    def _mark_fixations(samples, time_zero):
+        """
+        Extract and relabel the columns, index the samples by their time in
+        ms since time_zero and turn any non-Fixation data points into NaN
+        values.
+        """
         # Extract and rename columns of interest. We are using the left pupil
         # by convention.
         samples = samples.loc[:, ['Time',
@@ -100,7 +231,7 @@ class BeGaze(DataSource):
 
         # Adjust the sample time to the epoch at the top of the file and convert
         # to milliseconds.
-        samples[['Time']] = samples[['Time']] - samples.loc[0, 'Time']
+        samples[['Time']] = samples[['Time']] - time_zero
         samples[['Time']] = samples[['Time']]/1000
 
         # Change the data frame index to the Time column for faster indexing
@@ -113,9 +244,22 @@ class BeGaze(DataSource):
         samples.drop('info', axis=1, inplace=True)
         samples['pos'] = np.invert(no_fixations)
         samples.loc[no_fixations, 'LDiameter'] = np.nan
-        samples['LDiameter'] = samples['LDiameter'].interpolate(method='spline',
-                                                                order=3)
+        return samples
 
+    def _interpolation(self):
+        """The keyword arguments of interpolate_gaps set by the options."""
+        interpolation = {'window': DEFAULT_INTERPOLATION_WINDOW}
+        interpolation.update(self.options.get('interpolation', {}))
+        return interpolation
+
+    @staticmethod
+    def _fill_gaps(samples, interpolation):
+        """Interpolate the diameter across its gaps, in place."""
+        samples['LDiameter'] = interpolate_gaps(
+            samples.index.values,
+            samples['LDiameter'].values,
+            order=INTERPOLATION_ORDER,
+            **interpolation)
         return samples
 
     @staticmethod
@@ -206,54 +350,6 @@ class BeGaze(DataSource):
 
         return labels
 
-    def create_label_bins(self, labels):
-        """Replace the N_Bins column with Bin_Index and the Duration column
-        with End_Time. This procedure grows the number of rows in the labels
-        data frame."""
-
-        total_bins = labels['N_Bins'].sum()
-        label_bins = pd.DataFrame(columns=['Order', 'ID', 'Label',
-                                           'Condition', 'Bin_Order',
-                                           'Start_Time', 'End_Time',
-                                           'Bin_Index'],
-                                  index=np.arange(0, total_bins))
-        idx = 0
-        for event_order, label in labels.iterrows():
-            n_bins = label['N_Bins']
-            cuts = np.linspace(start=label['Start_Time'] + label['Left_Trim'],
-                               stop=(label['Start_Time']
-                                     + label['Duration']
-                                     - label['Right_Trim']),
-                               num=n_bins+1)
-            label_info = np.tile(label.as_matrix(columns=['ID',
-                                                          'Label',
-                                                          'Condition']),
-                                 (n_bins, 1))
-
-            # Order
-            label_bins.iloc[idx:idx+n_bins, 0] = np.nan
-            # ID, Label, Condition
-            label_bins.iloc[idx:idx+n_bins, 1:4] = label_info
-            # Bin_Order
-            label_bins.iloc[idx:idx+n_bins, 4] = idx+np.arange(0, n_bins, 1)
-            # Start_Time
-            label_bins.iloc[idx:idx+n_bins, 5] = cuts[0:n_bins]
-            # End_Time
-            label_bins.iloc[idx:idx+n_bins, 6] = cuts[1:n_bins+1]
-            # Bin_Index
-            label_bins.iloc[idx:idx+n_bins, 7] = np.arange(0, n_bins, 1)
-
-            idx = idx + n_bins
-
-        # Add the Order by iterating over Labels and Bin indices
-        for lc, group in label_bins.groupby(['Label', 'Bin_Index']):
-            selector = (label_bins['Label'] == lc[0]) & \
-                       (label_bins['Bin_Index'] == lc[1])
-            label_bins.loc[selector, 'Order'] = \
-                np.arange(0, np.sum(selector), 1)
-
-        return label_bins
-
     @staticmethod
     def _validate_config(raw):
         """
@@ -279,6 +375,37 @@ class BeGaze(DataSource):
         # ID and an Condition
         return schema.validate(raw)
 
+    @staticmethod
+    def _validate_options(raw):
+        """
+        Validates the options dict passed to the Data Source.
+
+        Args:
+          raw (dict): must match the following schema
+            {
+              chunksize (optional): stream the samples file in chunks of this
+                many rows rather than loading it whole (int). Needs an
+                interpolation window.
+              interpolation (optional): {
+                window (optional): fill each diameter gap from this many valid
+                  samples on either side of it, at least
+                  INTERPOLATION_ORDER + 1 (int, default
+                  DEFAULT_INTERPOLATION_WINDOW), or from one spline of the
+                  whole recording if null
+                max_gap (optional): leave gaps longer than this many ms
+                  unfilled (float or int)
+              }
+            }
+        """
+        schema = Schema(And({Optional('chunksize'): And(int, lambda n: n > 0),
+                             Optional('interpolation'): {
+                                 Optional('window'): Or(None, And(
+                                     int, lambda n: n > INTERPOLATION_ORDER)),
+                                 Optional('max_gap'): Or(float, int)}},
+                            _streamable))
+
+        return schema.validate(raw)
+
     @staticmethod
     def _validate_schedule(raw):
 
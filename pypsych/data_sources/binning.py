@@ -0,0 +1,323 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Vectorized binning engine shared by the pypsych data sources.
+
+Bins are located once on the sorted sample index with np.searchsorted, and the
+statistics of every bin are then computed as reductions over contiguous
+segments (np.add.reduceat) rather than with one boolean mask per bin.
+
+Statistics pooled over groups of bins (e.g. all bins of a condition) use the
+same reductions: PooledSegments lays out the samples of all the bins of each
+group as one segment.
+
+Samples streamed in chunks are binned chunk by chunk: StreamedMoments folds
+the reductions of each chunk into per-bin counts, sums and sums of squares.
+"""
+import pandas as pd
+import numpy as np
+
+
+def bin_bounds(index, start_times, end_times):
+    """
+    Locate the [first, last) sample positions of each bin.
+
+    A sample belongs to a bin if Start_Time <= t < End_Time, which is the rule
+    DataSource.bin_data has always used.
+
+    Args:
+      index (numpy array): sample times sorted in increasing order.
+      start_times (numpy array): the Start_Time of each bin.
+      end_times (numpy array): the End_Time of each bin.
+
+    Output:
+      first, last (numpy arrays): sample positions bounding each bin.
+    """
+    first = np.searchsorted(index, start_times, side='left')
+    last = np.searchsorted(index, end_times, side='left')
+    last = np.maximum(first, last)
+    return first, last
+
+
+class Segments(object):
+    """
+    The samples of every bin laid out as contiguous segments.
+
+    Args:
+      first (numpy array): position of the first sample in each bin.
+      last (numpy array): position one past the last sample in each bin.
+    """
+
+    def __init__(self, first, last):
+        self.first = np.asarray(first, dtype=np.int64)
+        self.last = np.asarray(last, dtype=np.int64)
+        self.lengths = self.last - self.first
+        self.offsets = np.cumsum(self.lengths) - self.lengths
+        self.nonempty = self.lengths > 0
+
+        # Bins may overlap, so the samples of each bin are gathered into their
+        # own segment of one flat array of positions.
+        total = self.lengths.sum()
+        self.positions = np.repeat(self.first - self.offsets, self.lengths) \
+            + np.arange(total, dtype=np.int64)
+
+    def __len__(self):
+        return self.lengths.size
+
+    def gather(self, values):
+        """Lay out values so that each bin is one contiguous segment."""
+        return values[self.positions]
+
+    def broadcast(self, per_bin):
+        """Repeat one value per bin over the samples of that bin."""
+        return np.repeat(per_bin, self.lengths)
+
+    def indexers(self):
+        """The positions of the samples of each segment, for iloc."""
+        return [slice(first, last)
+                for first, last in zip(self.first, self.last)]
+
+    def reduce(self, gathered):
+        """
+        Sum each segment of a gathered array along its last axis; empty
+        segments sum to 0.
+        """
+        gathered = np.asarray(gathered, dtype=np.float64)
+        out = np.zeros(gathered.shape[:-1] + (len(self),), dtype=np.float64)
+        if self.nonempty.any():
+            out[..., self.nonempty] = np.add.reduceat(
+                gathered, self.offsets[self.nonempty], axis=-1)
+        return out
+
+
+def pool_groups(*keys):
+    """
+    Number the distinct combinations of keys of each bin in order of first
+    appearance. NaN is a key value like any other.
+
+    Args:
+      keys (numpy arrays): one value per bin for each key.
+
+    Output:
+      groups (numpy array): the group number of each bin.
+    """
+    combined = np.zeros(len(keys[0]), dtype=np.int64)
+    for key in keys:
+        codes, uniques = pd.factorize(key)
+        combined = combined * (len(uniques) + 1) + (codes + 1)
+    groups, _ = pd.factorize(combined)
+    return groups.astype(np.int64)
+
+
+class PooledSegments(Segments):
+    """
+    The samples of groups of bins, with all the samples of the bins of each
+    group laid out as one contiguous segment, in bin order. Reductions over
+    these segments are statistics pooled over the bins of each group.
+
+    Args:
+      segments (Segments): the bins.
+      groups (numpy array): group number, from 0, of each bin.
+
+    Attributes:
+      groups (numpy array): as given.
+      first_bins (numpy array): the first bin of each group.
+    """
+
+    def __init__(self, segments, groups):
+        self.groups = np.asarray(groups, dtype=np.int64)
+        n_groups = self.groups.max() + 1 if self.groups.size else 0
+
+        # Bins in group order, so the samples of each group are contiguous in
+        # the gathered samples of the bins.
+        order = np.argsort(self.groups, kind='mergesort')
+        self.first_bins = order[np.searchsorted(self.groups[order],
+                                                np.arange(n_groups))]
+        bin_offsets = segments.offsets[order]
+        by_group = Segments(bin_offsets, bin_offsets + segments.lengths[order])
+        self.positions = segments.positions[by_group.positions]
+
+        self.lengths = np.bincount(self.groups,
+                                   weights=segments.lengths,
+                                   minlength=n_groups).astype(np.int64)
+        self.offsets = np.cumsum(self.lengths) - self.lengths
+        self.nonempty = self.lengths > 0
+
+        # The first and one past the last pooled sample of each group
+        self.first = np.zeros(n_groups, dtype=np.int64)
+        self.last = np.zeros(n_groups, dtype=np.int64)
+        self.first[self.nonempty] = self.positions[self.offsets[self.nonempty]]
+        self.last[self.nonempty] = self.positions[
+            (self.offsets + self.lengths - 1)[self.nonempty]] + 1
+
+    def indexers(self):
+        """The positions of the samples of each segment, for iloc."""
+        return [self.positions[offset:offset + length]
+                for offset, length in zip(self.offsets, self.lengths)]
+
+    def to_bins(self, per_group):
+        """Broadcast one value per group back to each bin of the group."""
+        return np.asarray(per_group)[self.groups]
+
+
+class SegmentMoments(object):
+    """
+    Lazily computed segment reductions of one channel over all bins. These are
+    the building blocks of the vectorized statistics in the statistics module.
+
+    Args:
+      values (numpy array): the channel samples.
+      pos (numpy array): True where the sample is a valid recording.
+      index (numpy array): the sample times.
+      segments (Segments): the bins to reduce over.
+      label_bins (pandas DataFrame): the bins, as from create_label_bins, for
+        statistics which depend on the labels of each bin.
+    """
+
+    def __init__(self, values, pos, index, segments, label_bins=None):
+        self.values = values
+        self.pos = pos
+        self.index = index
+        self.segments = segments
+        self.label_bins = label_bins
+        self._cache = {}
+
+    def memo(self, key, fun):
+        """
+        Compute fun() once per key. Results are shared by all the statistics
+        of the channel.
+        """
+        if key not in self._cache:
+            self._cache[key] = fun()
+        return self._cache[key]
+
+    def gathered(self):
+        """The channel samples laid out by bin, see Segments.gather."""
+        return self.memo('gathered', lambda: self.segments.gather(
+            np.asarray(self.values, dtype=np.float64)))
+
+    def _valid(self):
+        return self.memo('valid', lambda: ~np.isnan(self.gathered()))
+
+    def count(self):
+        """Number of samples in each bin, NaNs included."""
+        return self.segments.lengths.astype(np.int64)
+
+    def n(self):
+        """Number of non-NaN samples in each bin."""
+        return self.memo('n', lambda: self.segments.reduce(
+            self._valid().astype(np.float64)))
+
+    def sum(self):
+        """Sum of the non-NaN samples in each bin."""
+        return self.memo('sum', lambda: self.segments.reduce(
+            np.where(self._valid(), self.gathered(), 0.0)))
+
+    def sumsq(self):
+        """
+        Sum of squares of the non-NaN samples about their bin mean. Centering
+        first keeps the variance as accurate as the two-pass pandas version.
+        """
+        def sumsq():
+            with np.errstate(divide='ignore', invalid='ignore'):
+                mean = self.sum() / self.n()
+            dev = self.gathered() - self.segments.broadcast(mean)
+            return self.segments.reduce(np.where(self._valid(), dev**2, 0.0))
+        return self.memo('sumsq', sumsq)
+
+    def nans(self):
+        """Number of samples in each bin that are not valid recordings."""
+        invalid = ~np.asarray(self.pos, dtype=bool)
+        return self.segments.reduce(
+            self.segments.gather(invalid).astype(np.float64)).astype(np.int64)
+
+    def first_index(self):
+        """Time of the first sample in each bin."""
+        res = np.full(len(self.segments), np.nan)
+        nonempty = self.segments.nonempty
+        res[nonempty] = self.index[self.segments.first[nonempty]]
+        return res
+
+    def last_index(self):
+        """Time of the last sample in each bin."""
+        res = np.full(len(self.segments), np.nan)
+        nonempty = self.segments.nonempty
+        res[nonempty] = self.index[self.segments.last[nonempty] - 1]
+        return res
+
+
+class StreamedMoments(object):
+    """
+    The segment reductions of one channel accumulated over consecutive
+    chunks of its samples, for binning samples which are streamed rather than
+    held whole. Offers the methods of SegmentMoments which reduce to per-bin
+    counts, sums and sums of squares, and the times at the edges of the bins.
+
+    Args:
+      n_bins (int): number of bins.
+      label_bins (pandas DataFrame): the bins, as from create_label_bins.
+    """
+
+    def __init__(self, n_bins, label_bins=None):
+        self.label_bins = label_bins
+        self._count = np.zeros(n_bins, dtype=np.int64)
+        self._nans = np.zeros(n_bins, dtype=np.int64)
+        self._n = np.zeros(n_bins, dtype=np.float64)
+        self._sum = np.zeros(n_bins, dtype=np.float64)
+        self._sumsq = np.zeros(n_bins, dtype=np.float64)
+        self._first = np.full(n_bins, np.nan)
+        self._last = np.full(n_bins, np.nan)
+
+    def add(self, moments):
+        """
+        Fold in the SegmentMoments of the next chunk of samples, over the
+        same bins. The sums of squares about the bin means are combined as
+        in the pairwise variance update of Chan et al.
+        """
+        n_a, n_b = self._n, moments.n()
+        n = n_a + n_b
+        with np.errstate(divide='ignore', invalid='ignore'):
+            delta = moments.sum() / n_b - self._sum / n_a
+            cross = delta**2 * n_a * n_b / n
+        both = (n_a > 0) & (n_b > 0)
+        self._sumsq += moments.sumsq() + np.where(both, cross, 0.0)
+        self._n = n
+        self._sum += moments.sum()
+        self._count += moments.count()
+        self._nans += moments.nans()
+
+        first = moments.first_index()
+        unset = np.isnan(self._first)
+        self._first[unset] = first[unset]
+        last = moments.last_index()
+        has_last = ~np.isnan(last)
+        self._last[has_last] = last[has_last]
+
+    def count(self):
+        """Number of samples in each bin, NaNs included."""
+        return self._count
+
+    def n(self):
+        """Number of non-NaN samples in each bin."""
+        return self._n
+
+    def sum(self):
+        """Sum of the non-NaN samples in each bin."""
+        return self._sum
+
+    def sumsq(self):
+        """Sum of squares of the non-NaN samples about their bin mean."""
+        return self._sumsq
+
+    def nans(self):
+        """Number of samples in each bin that are not valid recordings."""
+        return self._nans
+
+    def first_index(self):
+        """Time of the first sample in each bin."""
+        return self._first
+
+    def last_index(self):
+        """Time of the last sample in each bin."""
+        return self._last
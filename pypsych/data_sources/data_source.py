@@ -6,18 +6,50 @@ Provides the base DataSource class for pypsych data sources.
 """
 
 import pandas as pd
+import numpy as np
+from binning import bin_bounds, pool_groups, Segments, PooledSegments, \
+    SegmentMoments, StreamedMoments
+from statistics import get_statistic
+from output import long_block, concat_long, long_to_panels
+from file_checks import has_rows
+
+# Columns of the data frame made by DataSource.create_label_bins
+LABEL_BIN_COLUMNS = ['Order', 'ID', 'Label', 'Condition', 'Bin_Order',
+                     'Start_Time', 'End_Time', 'Bin_Index']
 
 
 class DataSource(object):
     """
     DataSource base class.
+
+    Args:
+      config (dict): the data source configuration. Its optional 'Options'
+        entry holds settings of the data source itself rather than label
+        configuration, and is kept apart at self.options.
+      schedule (dict): the data source schedule configuration.
     """
+    # Columns of the merged labels copied to each of their bins by
+    # create_label_bins. Columns of LABEL_BIN_COLUMNS not listed are NaN.
+    label_info_columns = ['Label', 'Condition']
+
+    # Label times are divided by this in create_label_bins to give the units
+    # of the samples index.
+    label_time_divisor = None
+
+    # Columns of the label bins whose distinct combinations pool samples. If
+    # set, every statistic is computed over the samples of all the bins of
+    # each combination, and given to each of those bins.
+    pool_by = None
 
     def __init__(self, config, schedule):
+        config = dict(config)
+        self.options = self._validate_options(config.pop('Options', {}))
         self.config = self._validate_config(config)
         self.schedule = self._validate_schedule(schedule)
-        self.output = pd.Panel()
+        self.output = concat_long([])
         self.data = {}
+        # SampleCache used by load_and_merge, if any
+        self.sample_cache = None
 
     def load(self, file_paths):
         """By default, loads all files as TSV."""
@@ -32,47 +64,275 @@ class DataSource(object):
         self.merge_data()
         self.bin_data()
 
+    def load_and_merge(self, file_paths, loaded=None):
+        """
+        Load and merge the given files. With a sample cache, the merged data
+        is read back from the cache when the files and the parameters of
+        self._cache_params are unchanged, and stored there otherwise.
+
+        Args:
+          file_paths (dict): the files to load, as from
+            Schedule.get_file_paths.
+          loaded (dict): if given, the data already loaded from file_paths,
+            as self.data after load, which is merged instead of reading the
+            files again. The sample cache is bypassed, since keying it would
+            read the files.
+        """
+        if loaded is not None:
+            self.data = loaded
+            self.merge_data()
+            return
+
+        if self.sample_cache is None:
+            self.load(file_paths)
+            self.merge_data()
+            return
+
+        key = self.sample_cache.key(self, file_paths)
+        data = self.sample_cache.get(key)
+        if data is None:
+            self.load(file_paths)
+            self.merge_data()
+            self.sample_cache.put(key, self.data)
+        else:
+            self.data = data
+
+    def _cache_params(self):
+        """The parameters, besides the files, which merge_data depends on."""
+        return {'config': self.config, 'options': self.options}
+
+    def create_label_bins(self, labels):
+        """
+        Replace the N_Bins column with Bin_Index and the Duration column with
+        End_Time. This procedure grows the number of rows in the labels data
+        frame: each label is cut into N_Bins equal bins spanning
+        [Start_Time + Left_Trim, Start_Time + Duration - Right_Trim].
+
+        Args:
+          labels (pandas DataFrame): the merged labels, with the N_Bins,
+            Start_Time, Duration, Left_Trim and Right_Trim columns and those
+            of self.label_info_columns.
+
+        Output:
+          label_bins (pandas DataFrame): a row per bin with the columns of
+            LABEL_BIN_COLUMNS. Order counts the bins of each (Label,
+            Bin_Index) pair and Bin_Order counts all bins.
+        """
+        n_bins = labels['N_Bins'].values.astype(np.int64)
+        total_bins = n_bins.sum()
+
+        # The label of each bin, and the position of each bin in its label
+        rows = np.repeat(np.arange(n_bins.size), n_bins)
+        offsets = np.cumsum(n_bins) - n_bins
+        bin_index = np.arange(total_bins) - offsets[rows]
+
+        # The cuts of each label, computed as np.linspace(start, stop,
+        # n_bins + 1) would.
+        start = (labels['Start_Time']
+                 + labels['Left_Trim']).values.astype(np.float64)
+        stop = (labels['Start_Time']
+                + labels['Duration']
+                - labels['Right_Trim']).values.astype(np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            step = (stop - start) / n_bins
+        start_time = bin_index * step[rows] + start[rows]
+        end_time = (bin_index + 1) * step[rows] + start[rows]
+        last_bins = (bin_index == n_bins[rows] - 1)
+        end_time[last_bins] = stop[rows][last_bins]
+
+        if self.label_time_divisor is not None:
+            start_time = start_time / self.label_time_divisor
+            end_time = end_time / self.label_time_divisor
+
+        label_bins = pd.DataFrame({'Bin_Order': np.arange(total_bins),
+                                   'Start_Time': start_time,
+                                   'End_Time': end_time,
+                                   'Bin_Index': bin_index},
+                                  columns=LABEL_BIN_COLUMNS)
+        for col in ['ID', 'Label', 'Condition']:
+            if col in self.label_info_columns:
+                label_bins[col] = labels[col].values[rows]
+            else:
+                label_bins[col] = np.full(total_bins, np.nan, dtype=object)
+
+        # Count the bins of each (Label, Bin_Index) pair in order
+        has_label = label_bins['Label'].notnull()
+        order = label_bins[has_label].groupby(['Label', 'Bin_Index'])\
+                                     .cumcount()
+        if has_label.all():
+            label_bins['Order'] = order
+        else:
+            label_bins.loc[has_label, 'Order'] = order
+
+        return label_bins
+
     def bin_data(self):
-        """Makes a dict of dicts of pd.Panels at self.output."""
+        """
+        Makes a long-format table of the statistics of every channel at
+        self.output. See output.LONG_COLUMNS.
+        """
         label_bins = self.create_label_bins(self.data['labels'])
-        major_axis = label_bins.index.values
-        minor_axis = label_bins.drop(['Start_Time', 'End_Time'], axis=1).columns
-        minor_axis = minor_axis.append(pd.Index(['stat']))
 
         raw = self.data['samples']
 
-        output = {channel: pd.Panel(items=statistics.keys(),
-                                    major_axis=major_axis,
-                                    minor_axis=minor_axis)
-                  for channel, statistics in self.panels.iteritems()}
+        # Bins are located on the time index, which must be sorted for the
+        # searchsorted lookup below.
+        if not raw.index.is_monotonic_increasing:
+            order = np.argsort(raw.index.values, kind='mergesort')
+            raw = raw.iloc[order]
+
+        first, last = bin_bounds(
+            raw.index.values,
+            label_bins['Start_Time'].values.astype(np.float64),
+            label_bins['End_Time'].values.astype(np.float64))
+        segments = Segments(first, last)
 
+        # Pooled statistics are computed once per group, on behalf of the
+        # group's first bin, and then given to every bin of the group.
+        segment_bins = label_bins
+        if self.pool_by is not None:
+            segments = PooledSegments(segments, pool_groups(
+                *[label_bins[col].values for col in self.pool_by]))
+            segment_bins = label_bins.iloc[segments.first_bins]
+
+        blocks = []
         for channel, statistics in self.panels.iteritems():
-            for stat_name, stat_fun in statistics.iteritems():
-                stats = []
-                new_panel = label_bins.copy(deep=True)
-                new_panel.drop(['Start_Time', 'End_Time'], axis=1, inplace=True)
-                for _, label_bin in label_bins.iterrows():
-                    selector = (raw.index.values >= label_bin['Start_Time']) \
-                        & (raw.index.values < label_bin['End_Time'])
-                    samples = raw[selector][channel]
-                    pos = raw.loc[selector, 'pos']
-                    stats.append(stat_fun(samples, pos, label_bin))
-
-                new_panel['stat'] = stats
-                output[channel][stat_name] = \
-                    new_panel.sort_values(by='Bin_Order', axis=0)
-
-        self.output = output
+            moments = SegmentMoments(raw[channel].values,
+                                     raw['pos'].values,
+                                     raw.index.values,
+                                     segments,
+                                     label_bins=segment_bins)
+            for stat_name, stat in statistics.iteritems():
+                statistic = get_statistic(stat)
+                if statistic.vectorized:
+                    stats = statistic.segment(moments)
+                else:
+                    stats = self._apply_per_bin(statistic.per_bin, raw,
+                                                channel, segment_bins,
+                                                segments)
+                if self.pool_by is not None:
+                    stats = segments.to_bins(stats)
+
+                blocks.append(long_block(label_bins, channel, stat_name,
+                                         stats))
+
+        self.output = concat_long(blocks)
+
+    def bin_chunks(self, chunks):
+        """
+        Make the output of bin_data from consecutive chunks of the merged
+        samples rather than from self.data['samples'], so that only one chunk
+        is held at a time. Only statistics computed from per-bin counts, sums
+        and sums of squares can be streamed (see binning.StreamedMoments), and
+        bins cannot be pooled.
+
+        Args:
+          chunks (iterable): the merged samples as pandas DataFrames, each
+            sorted by time and starting no earlier than the previous one ends.
+        """
+        if self.pool_by is not None:
+            raise Exception('Pooled statistics cannot be streamed.')
+        statistics = {}
+        for channel, channel_stats in self.panels.iteritems():
+            statistics[channel] = {}
+            for stat_name, stat in channel_stats.iteritems():
+                statistic = get_statistic(stat)
+                if not statistic.vectorized:
+                    raise Exception('Statistic {} cannot be streamed.'
+                                    .format(statistic.name))
+                statistics[channel][stat_name] = statistic
+
+        label_bins = self.create_label_bins(self.data['labels'])
+        start_times = label_bins['Start_Time'].values.astype(np.float64)
+        end_times = label_bins['End_Time'].values.astype(np.float64)
+        moments = {channel: StreamedMoments(len(label_bins), label_bins)
+                   for channel in self.panels.keys()}
+
+        last_time = -np.inf
+        for chunk in chunks:
+            index = chunk.index.values
+            if index.size == 0:
+                continue
+            if index[0] < last_time or \
+                    not chunk.index.is_monotonic_increasing:
+                raise Exception('Streamed samples must be sorted by time.')
+            last_time = index[-1]
+            segments = Segments(*bin_bounds(index, start_times, end_times))
+            for channel, channel_moments in moments.iteritems():
+                channel_moments.add(SegmentMoments(chunk[channel].values,
+                                                   chunk['pos'].values,
+                                                   index,
+                                                   segments))
+
+        blocks = []
+        for channel, channel_stats in self.panels.iteritems():
+            for stat_name in channel_stats.keys():
+                stats = statistics[channel][stat_name].segment(
+                    moments[channel])
+                blocks.append(long_block(label_bins, channel, stat_name,
+                                         stats))
+        self.output = concat_long(blocks)
+
+    def output_panels(self):
+        """The output as a dict of pd.Panels keyed by channel."""
+        return long_to_panels(self.output)
+
+    @staticmethod
+    def _apply_per_bin(stat_fun, raw, channel, label_bins, segments):
+        """
+        Call a per-bin statistic on the samples of every segment. This is the
+        slow path for statistics that have no vectorized form.
+        """
+        samples = raw[channel]
+        pos = raw['pos']
+        stats = []
+        for (_, label_bin), indexer in zip(label_bins.iterrows(),
+                                           segments.indexers()):
+            stats.append(stat_fun(samples.iloc[indexer],
+                                  pos.iloc[indexer],
+                                  label_bin))
+        return stats
 
     def validate_data(self):
         """Check that each data file has at least one record."""
         return {f: len(d) > 1 for f, d in self.data.iteritems()}
 
+    def check_files(self, file_paths):
+        """
+        Check each scheduled data file as validate_data would after load, but
+        reading only as much of each file as check_file needs. Files missing
+        from file_paths, and files which cannot be read, fail the check.
+
+        Output:
+          checks (dict): {file_type: bool}
+        """
+        checks = {}
+        for file_type in self.schedule.keys():
+            if file_type not in file_paths:
+                checks[file_type] = False
+                continue
+            try:
+                checks[file_type] = bool(
+                    self.check_file(file_type, file_paths[file_type]))
+            except Exception:
+                # Whatever stops a file from being read marks it as corrupt.
+                checks[file_type] = False
+        return checks
+
+    def check_file(self, file_type, file_path):
+        """By default, checks for a TSV header and more than one row."""
+        return has_rows(file_path, 2)
+
     @staticmethod
     def _validate_config(raw):
         """Placeholder method for validating configuration dicts."""
         return raw
 
+    @staticmethod
+    def _validate_options(raw):
+        """Placeholder method for validating options dicts."""
+        return raw
+
     @staticmethod
     def _validate_schedule(raw):
         """Placeholder method for validating schedule configuration dicts."""
@@ -7,16 +7,94 @@
 # interface
 import pandas as pd
 import io
+import re
 import numpy as np
 from data_source import DataSource
 from schema import Schema, Or
-from utils import merge_and_rename_columns
+from utils import coalesce_columns
+
+
+# A frame start marker, or a "key: value" line with the key and value stripped
+# of spaces, once tabs are dropped. Greedy groups which end on a non-space keep
+# the scan linear.
+_FRAME_START = u'^ *(\\*\\*\\* LogFrame Start \\*\\*\\*) *$'
+_KEY = u'[^:\\n]*[^:\\n ]'
+_KV_LINE = u'{}|^ *({})? *: *([^\\n]*[^\\n ])? *$'
+
+
+def _kv_regex(keys=None):
+    """Compile the line regex, matching only the given keys if any."""
+    if keys is None:
+        key = _KEY
+    else:
+        key = u'|'.join(re.escape(k) for k in sorted(keys, reverse=True))
+    return re.compile(_KV_LINE.format(_FRAME_START, key), re.MULTILINE)
 
 
 def _idem(x, pos, label_bin):
     return x.values[0]
 
 
+def _decoded_chunks(file_path, encoding, chunk_size=1 << 20):
+    """
+    Decode a file incrementally and yield it in chunks of whole lines, with
+    tabs dropped.
+    """
+    with io.open(file_path, 'r', encoding=encoding) as kv_file:
+        tail = u''
+        while True:
+            chunk = kv_file.read(chunk_size)
+            if not chunk:
+                break
+            chunk = tail + chunk.replace(u'\t', u'')
+            end = chunk.rfind(u'\n') + 1
+            tail = chunk[end:]
+            yield chunk[:end]
+        yield tail
+
+
+def read_kv_frames(file_path, keys=None, encoding='utf-16'):
+    """
+    Parse a Keyvalue-format edat file into one row per log frame.
+
+    The file is decoded in chunks and scanned with one regex, which also
+    picks out only the lines of the selected keys. Every "key: value" line is
+    appended to the column of its key, and each LogFrame Start marker starts a
+    new row, so the text before the first frame (the header) is the first row
+    and any lines between the end of a frame and the start of the next belong
+    to that frame. Tabs are dropped and keys and values are stripped of
+    spaces. Should a key appear twice in a frame, the last value is kept.
+
+    Args:
+      file_path (str): path of the edat text file.
+      keys (iterable): if given, only these keys are kept.
+      encoding (str): encoding of the file.
+
+    Output:
+      frames (pandas DataFrame): the value of each key (column) in each frame
+        (row), NaN where a frame does not have the key.
+    """
+    kv_regex = _kv_regex(keys)
+    columns = {}
+    n_frames = 1
+    for chunk in _decoded_chunks(file_path, encoding):
+        for start, key, value in kv_regex.findall(chunk):
+            if start:
+                n_frames += 1
+                continue
+            column = columns.setdefault(key, [])
+            if len(column) == n_frames:
+                column[-1] = value
+            else:
+                if len(column) < n_frames - 1:
+                    column.extend([np.nan] * (n_frames - 1 - len(column)))
+                column.append(value)
+
+    for column in columns.itervalues():
+        column.extend([np.nan] * (n_frames - len(column)))
+    return pd.DataFrame(columns, index=pd.RangeIndex(n_frames))
+
+
 class EPrime(DataSource):
     def __init__(self, config, schedule):
         """."""
@@ -30,21 +108,33 @@ class EPrime(DataSource):
                        for channel in channels}
 
     def load(self, file_paths):
-        """Load Keyvalue-format edat file."""
-        with io.open(file_paths['samples'], 'r', encoding="utf-16") as kv_file:
-            raw = kv_file.read()
-            raw = raw.replace('\t', '')
-            raw = raw.replace('*** LogFrame End ***', '')
-            arr = raw.split('*** LogFrame Start ***')
-            frames = []
-            for frame in arr:
-                lines = frame.split('\n')
-                lines = [line.split(':', 1) for line in lines]
-                d = {line[0].strip(' '): line[1].strip(' ')
-                     for line in lines
-                     if len(line) == 2}
-                frames.append(d)
-            self.data['samples'] = pd.DataFrame.from_dict(frames)
+        """
+        Load Keyvalue-format edat file, keeping only the keys named in the
+        configuration.
+        """
+        self.data['samples'] = read_kv_frames(file_paths['samples'],
+                                              keys=self._config_keys())
+
+    def _config_keys(self):
+        """The edat keys which the configuration draws columns from."""
+        keys = set()
+        for names in self.config.itervalues():
+            if isinstance(names, list):
+                keys.update(names)
+            else:
+                keys.add(names)
+        return keys
+
+    def check_file(self, file_type, file_path):
+        """
+        The edat file must have more than one row, i.e. at least one LogFrame
+        Start marker. Only as much of it as needed to find one is decoded.
+        """
+        start = re.compile(_FRAME_START, re.MULTILINE)
+        for chunk in _decoded_chunks(file_path, 'utf-16', chunk_size=1 << 14):
+            if start.search(chunk):
+                return True
+        return False
 
     def merge_data(self):
         """Clean the EPrime file data."""
@@ -71,11 +161,9 @@ class EPrime(DataSource):
         configuration.
         """
         samples.replace("nan", np.nan, inplace=True)
-        for key, names in self.config.iteritems():
-            samples = merge_and_rename_columns(samples, key, names)
 
-        # Pick out only the columns of interest
-        samples = samples.loc[:, self.config.keys()]
+        # Build only the columns of interest, all at once
+        samples = coalesce_columns(samples, self.config)
 
         # Pick out only the rows that are not all nan
         samples.dropna(how='all', axis=0, inplace=True)
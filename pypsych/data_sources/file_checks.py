@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Lightweight checks that a data file holds records, for validating files
+without loading them.
+
+Text files are read a block at a time from their start, only until enough
+records are seen, and .mat files are checked from the headers of their
+variables alone. See DataSource.check_files.
+"""
+from scipy.io import whosmat
+
+# Bytes read at a time from the start of a text file
+PEEK_BYTES = 1 << 16
+
+
+def peek_lines(file_path, n_lines, comment=None, block_size=PEEK_BYTES):
+    """
+    Read the first lines of a text file which hold anything besides blanks
+    and comments, reading no more of the file than needed.
+
+    Args:
+      file_path (str): path of the text file.
+      n_lines (int): number of lines to read.
+      comment (str): if given, the text of a line after this character is
+        ignored, as with pandas.read_csv.
+      block_size (int): bytes read at a time.
+
+    Output:
+      lines (list): up to n_lines lines, fewer if the file ends first.
+    """
+    lines = []
+    tail = b''
+    with open(file_path, 'rb') as f:
+        while len(lines) < n_lines:
+            block = f.read(block_size)
+            if block:
+                block_lines = (tail + block).split(b'\n')
+                tail = block_lines.pop()
+            else:
+                block_lines = [tail]
+            for line in block_lines:
+                if comment is not None:
+                    line = line.split(comment, 1)[0]
+                if line.strip():
+                    lines.append(line)
+            if not block:
+                break
+    return lines[:n_lines]
+
+
+def has_rows(file_path, n_rows, header=True, comment='#'):
+    """
+    Whether a delimited text file has a header row, if it should, and at
+    least n_rows rows below it.
+    """
+    n_lines = n_rows + (1 if header else 0)
+    return len(peek_lines(file_path, n_lines, comment=comment)) == n_lines
+
+
+def mat_rows(file_path, name):
+    """
+    The number of rows of a variable of a .mat file, read from the variable
+    headers only, or 0 if the file has no such variable.
+    """
+    for var_name, shape, _ in whosmat(file_path):
+        if var_name == name:
+            return shape[0] if len(shape) > 0 else 0
+    return 0
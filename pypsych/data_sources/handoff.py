@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Includes the HandoffCache class which keeps the data loaded while validating
+an experiment for Experiment.process, so that each file is read only once.
+
+Entries are held in memory, keyed by (subject, task, data source) group, and
+each is handed over once. The groups are processed in the order they were
+validated, so once the entries outgrow max_bytes the newest entries are
+evicted, rather than the oldest ones which are about to be consumed. Evicted
+groups are loaded again from disk by process.
+"""
+import pandas as pd
+
+# Bytes of loaded data kept by default
+DEFAULT_MAX_BYTES = 1 << 30
+
+
+def data_bytes(data):
+    """
+    The memory used by a dict of DataFrames, or None if it holds anything
+    else.
+    """
+    if not all(isinstance(frame, pd.DataFrame) for frame in data.itervalues()):
+        return None
+    return sum(int(frame.memory_usage(index=True, deep=True).sum())
+               for frame in data.itervalues())
+
+
+class HandoffCache(object):
+    """
+    In-memory hand-over of loaded data, from validation to processing.
+
+    Args:
+      max_bytes (int): total memory of the entries above which new entries
+        are evicted. None keeps every entry.
+
+    Attributes:
+      nbytes (int): memory used by the entries.
+      hits (int): number of entries handed over.
+      misses (int): number of lookups which found no entry.
+      evicted (int): number of entries not kept for lack of memory.
+
+    Methods:
+      put: keep the loaded data of a group.
+      pop: hand over the loaded data of a group, or None.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._entries = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __getstate__(self):
+        # The loaded data is not pickled along with an experiment.
+        state = self.__dict__.copy()
+        state['_entries'] = {}
+        state['nbytes'] = 0
+        return state
+
+    def put(self, key, data):
+        """
+        Keep a dict of DataFrames under a key. Data holding anything else, or
+        which does not fit in the remaining memory, is evicted.
+
+        Output:
+          kept (bool): whether the data was kept.
+        """
+        self.discard(key)
+        size = data_bytes(data)
+        if size is None or (self.max_bytes is not None and
+                            self.nbytes + size > self.max_bytes):
+            self.evicted += 1
+            return False
+        self._entries[key] = (dict(data), size)
+        self.nbytes += size
+        return True
+
+    def pop(self, key):
+        """Hand over the data kept under a key, or None if there is none."""
+        if key not in self._entries:
+            self.misses += 1
+            return None
+        data, size = self._entries.pop(key)
+        self.nbytes -= size
+        self.hits += 1
+        return data
+
+    def discard(self, key):
+        """Drop the data kept under a key, if any."""
+        if key in self._entries:
+            _, size = self._entries.pop(key)
+            self.nbytes -= size
+
+    def clear(self):
+        """Drop every entry."""
+        self._entries = {}
+        self.nbytes = 0
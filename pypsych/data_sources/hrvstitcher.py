@@ -7,39 +7,29 @@ Includes the HRV stitcher data source class
 import pandas as pd
 import numpy as np
 from scipy.io import loadmat
-from scipy.interpolate import UnivariateSpline
 from data_source import DataSource
+from triggers import trigger_labels
+from file_checks import has_rows, mat_rows
+from smoothers import get_smoother, DEFAULT_SMOOTHER, SMOOTHER_SCHEMA
 from schema import Schema, Or, Optional
 
 
-def _val(x, pos, label_bin):
-    return np.mean(x)
-
-
-def _std(x, pos, label_bin):
-    return x.std(axis=0)
-
-
-def _sem(x, pos, label_bin):
-    return x.sem(axis=0)
-
-
-def _var(x, pos, label_bin):
-    return np.var(x)
-
-
 class HRVStitcher(DataSource):
+    # Statistics pool the samples of all the bins of each condition of each
+    # label.
+    pool_by = ['Condition', 'Label']
+
     def __init__(self, config, schedule):
 
         # Call the parent class init
         super(HRVStitcher, self).__init__(config, schedule)
 
-        self.panels = {'bpm': {'VAL': _val,
-                               'SEM': _sem},
-                       'rr': {'VAL': _val,
-                              'STD': _std},
-                       'twave': {'VAL': _val,
-                                 'SEM': _sem}}
+        self.panels = {'bpm': {'VAL': 'mean',
+                               'SEM': 'sem'},
+                       'rr': {'VAL': 'mean',
+                              'STD': 'std'},
+                       'twave': {'VAL': 'mean',
+                                 'SEM': 'sem'}}
 
     def load(self, file_paths):
         """Override for load method to include .mat compatibility."""
@@ -56,6 +46,12 @@ class HRVStitcher(DataSource):
         self.data['labels'] = pd.DataFrame({'flag': events},
                                            index=np.arange(events.size))
 
+    def check_file(self, file_type, file_path):
+        """The samples have no header and the labels are a .mat file."""
+        if file_type == 'labels':
+            return mat_rows(file_path, 'events') > 1
+        return has_rows(file_path, 2, header=False)
+
     def merge_data(self):
         """
         Clean and merge the samples and labels data.
@@ -73,47 +69,6 @@ class HRVStitcher(DataSource):
             labels=self.data['labels'],
             config=self.label_config)
 
-    def bin_data(self):
-        """Makes a dict of dicts of pd.Panels at self.output."""
-        label_bins = self.create_label_bins(self.data['labels'])
-        major_axis = label_bins.index.values
-        minor_axis = label_bins.drop(['Start_Time', 'End_Time'], axis=1).columns
-        minor_axis = minor_axis.append(pd.Index(['stat']))
-
-        raw = self.data['samples']
-
-        output = {channel: pd.Panel(items=statistics.keys(),
-                                    major_axis=major_axis,
-                                    minor_axis=minor_axis)
-                  for channel, statistics in self.panels.iteritems()}
-
-        for channel, statistics in self.panels.iteritems():
-            for stat_name, stat_fun in statistics.iteritems():
-                new_panel = label_bins.copy(deep=True)
-                new_panel.drop(['Start_Time', 'End_Time'], axis=1, inplace=True)
-                new_panel['stat'] = np.nan
-
-                cond_lbls = pd.Series(data=zip(label_bins.loc[:, 'Condition'],
-                                               label_bins.loc[:, 'Label'])
-                                      ).unique()
-                for cond_lbl in cond_lbls:
-                    sel = (label_bins.loc[:, 'Condition'] == cond_lbl[0]) \
-                        & (label_bins.loc[:, 'Label'] == cond_lbl[1])
-                    sel_bins = label_bins.loc[sel, :]
-                    samples = pd.Series(name=channel)
-                    pos = pd.Series(name='pos')
-                    for _, label_bin in sel_bins.iterrows():
-                        selector = (raw.index.values >= label_bin['Start_Time']) \
-                            & (raw.index.values < label_bin['End_Time'])
-                        samples = samples.append(raw.loc[selector, channel])
-                        pos = pos.append(raw.loc[selector, 'pos'])
-                    stat = stat_fun(samples, pos)
-                    new_panel.loc[sel, 'stat'] = stat
-
-                output[channel][stat_name] = new_panel.sort('Bin_Order')
-
-        self.output = output
-
     @staticmethod
     def _label_config_to_df(config):
         """Convert the label configuration dictionary to a data frame."""
@@ -150,33 +105,19 @@ class HRVStitcher(DataSource):
         Turn the Biopac flag channel into a data frame of label flags and start
         times.
         """
-        # TODO(janmtl): finish this docstring
-        flags = labels['flag'].values
-        low_offset = np.append(-255, flags)
-        high_offset = np.append(flags, flags[-1])
-        event_flags = flags[(low_offset-high_offset) != 0]
-        start_times = np.where((low_offset-high_offset) != 0)[0]
-
-        labels = pd.DataFrame({'flag': event_flags,
-                               'Start_Time': start_times})
-
-        labels = labels[(labels['flag'] != 255)]
+        return trigger_labels(labels['flag'].values)
 
-        return labels
-
-    @staticmethod
-    def _clean_samples(samples):
+    def _clean_samples(self, samples):
         """
-        .
+        Smooth each channel with the smoother option, by default a degree-5
+        smoothing spline over the whole channel. See the smoothers module.
         """
-        scale = 0.55
+        smoother = get_smoother(self.options.get('smoother',
+                                                 DEFAULT_SMOOTHER))
 
         samples.index = samples.index*100
         for col_name, col in samples.iteritems():
-            x = col.index
-            y = col.values
-            spl = UnivariateSpline(x, y, k=5, s=scale*len(x))
-            samples[col_name] = spl(x)
+            samples[col_name] = smoother(col.index.values, col.values)
         samples['pos'] = True
         return samples
 
@@ -190,52 +131,6 @@ class HRVStitcher(DataSource):
         labels.sort('Start_Time', inplace=True)
         return labels
 
-    def create_label_bins(self, labels):
-        """Replace the N_Bins column with Bin_Index and the Duration column
-        with End_Time. This procedure grows the number of rows in the labels
-        data frame."""
-        total_bins = labels['N_Bins'].sum()
-        label_bins = pd.DataFrame(columns=['Order', 'ID', 'Label',
-                                           'Condition', 'Bin_Order',
-                                           'Start_Time', 'End_Time',
-                                           'Bin_Index'],
-                                  index=np.arange(0, total_bins))
-        idx = 0
-        for _, label in labels.iterrows():
-            n_bins = label['N_Bins']
-            cuts = np.linspace(start=label['Start_Time'] + label['Left_Trim'],
-                               stop=(label['Start_Time']
-                                     + label['Duration']
-                                     - label['Right_Trim']),
-                               num=n_bins+1)
-            label_info = np.tile(label.as_matrix(columns=['Label',
-                                                          'Condition']),
-                                 (n_bins, 1))
-
-            # Order and ID
-            label_bins.iloc[idx:idx+n_bins, 0:2] = np.nan
-            # Label, Condition
-            label_bins.iloc[idx:idx+n_bins, 2:4] = label_info
-            # Bin_Order
-            label_bins.iloc[idx:idx+n_bins, 4] = idx+np.arange(0, n_bins, 1)
-            # Start_Time
-            label_bins.iloc[idx:idx+n_bins, 5] = cuts[0:n_bins]
-            # End_Time
-            label_bins.iloc[idx:idx+n_bins, 6] = cuts[1:n_bins+1]
-            # Bin_Index
-            label_bins.iloc[idx:idx+n_bins, 7] = np.arange(0, n_bins, 1)
-
-            idx = idx + n_bins
-
-        # Add the Order by iterating over Labels and Bin indices
-        for lc, group in label_bins.groupby(['Label', 'Bin_Index']):
-            selector = (label_bins['Label'] == lc[0]) & \
-                       (label_bins['Bin_Index'] == lc[1])
-            label_bins.loc[selector, 'Order'] = \
-                np.arange(0, np.sum(selector), 1)
-
-        return label_bins
-
     @staticmethod
     def _validate_config(raw):
         """
@@ -260,6 +155,24 @@ class HRVStitcher(DataSource):
 
         return schema.validate(raw)
 
+    @staticmethod
+    def _validate_options(raw):
+        """
+        Validates the options dict passed to the Data Source.
+
+        Args:
+          raw (dict): must match the following schema
+            {
+              smoother (optional): {
+                method: name of a smoother in smoothers.SMOOTHERS,
+                parameters of the smoother (int or float)
+              }
+            }
+        """
+        schema = Schema({Optional('smoother'): SMOOTHER_SCHEMA})
+
+        return schema.validate(raw)
+
     @staticmethod
     def _validate_schedule(raw):
 
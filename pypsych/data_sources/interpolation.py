@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Gap filling for channels with runs of missing (NaN) samples, such as the
+pupil diameter of BeGaze during blinks.
+
+Gaps are filled with a smoothing spline of the valid samples, fit as
+Series.interpolate(method='spline') does. By default, one spline is fit over
+the whole channel. Given a window, each gap is instead filled from a spline of
+only the window valid samples on either side of it, so the cost of cleaning
+grows linearly with the length of the recording. Gaps whose windows overlap
+share one fit, over at most MAX_MERGED_WINDOWS windows, so that a run of close
+gaps cannot chain into a fit of the whole channel.
+
+With a window, a channel read in chunks can be filled chunk by chunk: no fit
+spans the cut given by chunk_cut, so the samples before it are filled exactly
+as in the whole channel.
+"""
+import numpy as np
+from scipy.interpolate import UnivariateSpline
+
+# Number of windows a shared fit of overlapping windows may span
+MAX_MERGED_WINDOWS = 4
+
+
+def nan_runs(values):
+    """
+    Locate the runs of NaN values.
+
+    Output:
+      starts, stops (numpy arrays): the [start, stop) positions of each run.
+    """
+    invalid = np.isnan(values).astype(np.int8)
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], invalid, [0]])))
+    return edges[0::2], edges[1::2]
+
+
+def fit_groups(lo, hi, max_fit=None):
+    """
+    Group the gaps whose ranges of valid samples overlap, so that each group
+    shares a fit over the union of their ranges.
+
+    Args:
+      lo, hi (numpy arrays): the ordered [lo, hi) range of each gap.
+      max_fit (int): if given, a group is closed before its range would span
+        more than this many valid samples, even if the next range overlaps
+        it.
+
+    Output:
+      firsts, lasts (numpy arrays): the first and last gap of each group.
+    """
+    # The ranges are ordered, so each group ends where the next range starts
+    # after it.
+    new_group = np.concatenate([[True], lo[1:] >= hi[:-1]])
+    firsts = np.flatnonzero(new_group)
+    lasts = np.concatenate([firsts[1:], [lo.size]]) - 1
+
+    if max_fit is not None:
+        # Only the gaps of the groups which are too long are visited.
+        for first, last in zip(firsts, lasts):
+            if hi[last] - lo[first] <= max_fit:
+                continue
+            for gap in range(first + 1, last + 1):
+                if hi[gap] - lo[first] > max_fit:
+                    new_group[gap] = True
+                    first = gap
+        firsts = np.flatnonzero(new_group)
+        lasts = np.concatenate([firsts[1:], [lo.size]]) - 1
+    return firsts, lasts
+
+
+def chunk_cut(y, window):
+    """
+    The last position at which a channel can be cut so that the gaps before
+    the cut are filled by interpolate_gaps with the given window exactly as
+    in the whole channel, whatever samples follow.
+
+    The cut lies window samples before the end of the last run of at least
+    2*window valid samples. The fits of the gaps before the run end within
+    it, and the gaps after it start new fits. Filling the rest of the channel
+    as a channel of its own is also exact if it keeps the window valid
+    samples before the cut.
+
+    Args:
+      y (numpy array): the channel, gaps not filled yet.
+      window (int): the window of interpolate_gaps.
+
+    Output:
+      cut (int): the position of the cut, or None if there is no such run.
+    """
+    valid = ~np.isnan(np.asarray(y, dtype=np.float64))
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], valid, [0]])))
+    starts, stops = edges[0::2], edges[1::2]
+    long_runs = np.flatnonzero(stops - starts >= 2 * window)
+    if long_runs.size == 0:
+        return None
+    return stops[long_runs[-1]] - window
+
+
+def interpolate_gaps(x, y, order=3, window=None, max_gap=None):
+    """
+    Fill the NaN runs of a channel with a smoothing spline of its valid
+    samples. NaNs before the first valid sample are not filled, as with
+    Series.interpolate.
+
+    Args:
+      x (numpy array): the sample times, in increasing order.
+      y (numpy array): the channel.
+      order (int): degree of the spline.
+      window (int): if given, fit each gap with only this many valid samples
+        on either side of it, and at least order + 1 in all. Otherwise fit
+        the whole channel at once, which is identical to
+        Series.interpolate(method='spline', order=order).
+      max_gap (float): if given, gaps spanning more than this time between the
+        valid samples around them are not filled.
+
+    Output:
+      filled (numpy array): a copy of y with the gaps filled.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    filled = np.array(y, dtype=np.float64)
+    starts, stops = nan_runs(filled)
+    valid_pos = np.flatnonzero(~np.isnan(filled))
+    if starts.size == 0 or valid_pos.size == 0:
+        return filled
+
+    # Leading NaNs are not filled.
+    if starts[0] == 0:
+        starts, stops = starts[1:], stops[1:]
+
+    if max_gap is not None:
+        # Trailing gaps are bounded by the last sample instead.
+        after = x[np.minimum(stops, x.size - 1)]
+        long_gaps = (after - x[starts - 1]) > max_gap
+        starts, stops = starts[~long_gaps], stops[~long_gaps]
+    if starts.size == 0:
+        return filled
+
+    # The valid samples to fit each gap with, as a range of valid_pos
+    n_valid = valid_pos.size
+    ranks = np.searchsorted(valid_pos, starts)
+    if window is None:
+        lo = np.zeros(starts.size, dtype=np.int64)
+        hi = np.full(starts.size, n_valid, dtype=np.int64)
+    else:
+        lo = np.maximum(ranks - window, 0)
+        hi = np.minimum(ranks + window, n_valid)
+        # Windows clipped at either end of the channel are widened to the
+        # order + 1 samples the spline needs.
+        hi = np.minimum(np.maximum(hi, lo + order + 1), n_valid)
+        lo = np.maximum(np.minimum(lo, hi - order - 1), 0)
+
+    if window is None:
+        max_fit = None
+    else:
+        max_fit = MAX_MERGED_WINDOWS * max(2 * window, order + 1)
+    group_firsts, group_lasts = fit_groups(lo, hi, max_fit)
+
+    # The positions of the gaps of each group, in one flat array
+    lengths = stops - starts
+    offsets = np.cumsum(lengths) - lengths
+    gap_pos = np.repeat(starts - offsets, lengths) \
+        + np.arange(lengths.sum(), dtype=np.int64)
+    gap_bounds = np.concatenate([offsets, [lengths.sum()]])
+
+    for first, last in zip(group_firsts, group_lasts):
+        fit_pos = valid_pos[lo[first]:hi[last]]
+        spl = UnivariateSpline(x[fit_pos], filled[fit_pos], k=order)
+        pos = gap_pos[gap_bounds[first]:gap_bounds[last + 1]]
+        filled[pos] = spl(x[pos])
+
+    return filled
@@ -4,39 +4,118 @@
 """
 Includes the Kubios data source class
 """
+import io
+import mmap
 import pandas as pd
 import numpy as np
-from io import StringIO
 from scipy.io import loadmat
 from data_source import DataSource
+from triggers import trigger_labels
+from file_checks import mat_rows
 from schema import Schema, Or, Optional
 
-
-def _val(x, pos, label_bin):
-    return np.mean(x)
-
-
-def _std(x, pos, label_bin):
-    return x.std(axis=0)
-
-
-def _sem(x, pos, label_bin):
-    return x.sem(axis=0)
-
-
-def _var(x, pos, label_bin):
-    return np.var(x)
-
-
-def _start_time(x, pos, label_bin):
-    return x.index.values[0]
-
-
-def _end_time(x, pos, label_bin):
-    return x.index.values[-1]
+SECTION_START = b'TIME-VARYING RESULTS'
+SECTION_END = b'RR INTERVAL DATA'
+
+# Lines of the section before the row of column names
+SECTION_SKIP_LINES = 3
+
+
+def section_range(report):
+    """
+    Find the byte range of the time-varying results section of a Kubios
+    report, from the start of the line naming it to the start of the line
+    naming the RR interval data (or the end of the report).
+
+    Args:
+      report (str or mmap): contents of the report.
+
+    Output:
+      start, end (int): the byte range, or None if there is no such section.
+    """
+    start = report.find(SECTION_START)
+    if start < 0:
+        return None
+    start = report.rfind(b'\n', 0, start) + 1
+    end = report.find(SECTION_END, start + len(SECTION_START))
+    if end < 0:
+        end = len(report)
+    else:
+        end = report.rfind(b'\n', 0, end) + 1
+    return start, end
+
+
+def _read_section(file_path):
+    """The bytes of the time-varying results section of a Kubios report."""
+    with open(file_path, 'rb') as f:
+        report = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            byte_range = section_range(report)
+            if byte_range is None:
+                raise ValueError('No time-varying results in the Kubios '
+                                 'report {}'.format(file_path))
+            return report[byte_range[0]:byte_range[1]]
+        finally:
+            report.close()
+
+
+def _header_lines(lines):
+    """
+    The number of lines of the section up to the column names and their
+    units, which are the first two non-blank lines after the skipped ones.
+    """
+    header = SECTION_SKIP_LINES
+    for _ in range(2):
+        while not lines[header].strip(b'\r'):
+            header += 1
+        header += 1
+    return header
+
+
+def read_time_varying(file_path):
+    """
+    Read the time-varying results of a Kubios report.
+
+    The section is located with one scan of the memory mapped report and only
+    its bytes are parsed. Its column names and units are read from the two
+    rows after the skipped lines, and the rows below them are parsed directly
+    as floats.
+
+    Output:
+      samples (pandas DataFrame): a column per result, named "{name} {unit}",
+        without the first and the last two fields of each row.
+    """
+    section = _read_section(file_path)
+    lines = section.split(b'\n')
+    header_bytes = sum(len(line) + 1 for line in lines[:_header_lines(lines)])
+
+    units = pd.read_csv(io.BytesIO(section[:header_bytes]),
+                        delimiter=";",
+                        skipinitialspace=True,
+                        index_col=False,
+                        skiprows=SECTION_SKIP_LINES)
+    n_fields = len(units.columns)
+    columns = ["{} {}".format(*col)
+               for col in zip(units.columns[1:-2],
+                              units.iloc[0, 1:-2].fillna(""))]
+
+    samples = pd.read_csv(io.BytesIO(section[header_bytes:]),
+                          delimiter=";",
+                          skipinitialspace=True,
+                          index_col=False,
+                          header=None,
+                          names=range(n_fields),
+                          usecols=range(1, n_fields - 2),
+                          dtype=np.float64)
+    samples.columns = columns
+    samples.index = pd.RangeIndex(1, len(samples) + 1)
+    return samples
 
 
 class Kubios(DataSource):
+    # Labels are in milliseconds and samples in seconds
+    label_time_divisor = 1000.0
+
     def __init__(self, config, schedule):
 
         # Call the parent class init
@@ -49,42 +128,32 @@ class Kubios(DataSource):
         #         'VLF power.1 (%)', 'LF power.1 (%)', 'HF power.1 (%)',
         #         'LF power.2 (n.u.)', 'HF power.2 (n.u.)', 'LF/HF ratio ',
         #         'ApEn ', 'SampEn ']
-        # self.panels = {col: {'VAL': _val, 'SEM': _sem} for col in cols}
-        self.panels = {"Time (s)": {'Start Time': _start_time,
-                                    'End Time': _end_time}}
+        # self.panels = {col: {'VAL': 'mean', 'SEM': 'sem'} for col in cols}
+        self.panels = {"Time (s)": {'Start Time': 'first_time',
+                                    'End Time': 'last_time'}}
 
     def load(self, file_paths):
         """Override for load method to include .mat compatibility."""
 
-        fbuffer = ""
-        with open(file_paths['samples'], 'r') as f:
-            reader = False
-            for line in f:
-                if "TIME-VARYING RESULTS" in line:
-                    reader = True
-                elif reader & ("RR INTERVAL DATA" in line):
-                    reader = False
-                if reader:
-                    fbuffer = fbuffer + line
-
-        df = pd.read_csv(StringIO(unicode(fbuffer)),
-                         delimiter=";",
-                         skipinitialspace=True,
-                         index_col=False,
-                         skiprows=3)
-        newcolumns = ["{} {}".format(*col)
-                      for col in zip(df.columns[1:-2],
-                                     df.iloc[0, 1:-2].fillna(""))]
-        df = df.iloc[1:, 1:-2]
-        df.columns = newcolumns
-        df = df.astype(np.float)
-        self.data['samples'] = df
+        self.data['samples'] = read_time_varying(file_paths['samples'])
 
         raw_mat = loadmat(file_paths['labels'])
         events = raw_mat['events'][:, 0]
         self.data['labels'] = pd.DataFrame({'flag': events},
                                            index=np.arange(events.size))
 
+    def check_file(self, file_type, file_path):
+        """
+        The samples must have more than one row of time-varying results, and
+        the labels are a .mat file.
+        """
+        if file_type == 'labels':
+            return mat_rows(file_path, 'events') > 1
+        lines = _read_section(file_path).split(b'\n')
+        rows = [line for line in lines[_header_lines(lines):]
+                if line.strip(b'\r')]
+        return len(rows) > 1
+
     def merge_data(self):
         """
         Clean and merge the samples and labels data.
@@ -138,19 +207,7 @@ class Kubios(DataSource):
         Turn the Biopac flag channel into a data frame of label flags and start
         times.
         """
-        # TODO(janmtl): finish this docstring
-        flags = labels['flag'].values
-        low_offset = np.append(-255, flags)
-        high_offset = np.append(flags, flags[-1])
-        sel = ((low_offset-high_offset) != 0)[:-1]
-        event_flags = flags[sel]
-        start_times = np.where((low_offset-high_offset) != 0)[0]
-
-        labels = pd.DataFrame({'flag': event_flags,
-                               'Start_Time': start_times})
-
-        labels = labels[(labels['flag'] != 255)]
-        return labels
+        return trigger_labels(labels['flag'].values)
 
     @staticmethod
     def _clean_samples(samples):
@@ -172,55 +229,6 @@ class Kubios(DataSource):
         labels = labels.sort_values(by='Start_Time', axis=0)
         return labels
 
-    def create_label_bins(self, labels):
-        """Replace the N_Bins column with Bin_Index and the Duration column
-        with End_Time. This procedure grows the number of rows in the labels
-        data frame."""
-        total_bins = labels['N_Bins'].sum()
-        label_bins = pd.DataFrame(columns=['Order', 'ID', 'Label',
-                                           'Condition', 'Bin_Order',
-                                           'Start_Time', 'End_Time',
-                                           'Bin_Index'],
-                                  index=np.arange(0, total_bins))
-        idx = 0
-        for _, label in labels.iterrows():
-            n_bins = label['N_Bins']
-            cuts = np.linspace(start=label['Start_Time'] + label['Left_Trim'],
-                               stop=(label['Start_Time']
-                                     + label['Duration']
-                                     - label['Right_Trim']),
-                               num=n_bins+1)
-            label_info = np.tile(label.as_matrix(columns=['Label',
-                                                          'Condition']),
-                                 (n_bins, 1))
-
-            # Order and ID
-            label_bins.iloc[idx:idx+n_bins, 0:2] = np.nan
-            # Label, Condition
-            label_bins.iloc[idx:idx+n_bins, 2:4] = label_info
-            # Bin_Order
-            label_bins.iloc[idx:idx+n_bins, 4] = idx+np.arange(0, n_bins, 1)
-            # Start_Time
-            label_bins.iloc[idx:idx+n_bins, 5] = cuts[0:n_bins]
-            # End_Time
-            label_bins.iloc[idx:idx+n_bins, 6] = cuts[1:n_bins+1]
-            # Bin_Index
-            label_bins.iloc[idx:idx+n_bins, 7] = np.arange(0, n_bins, 1)
-
-            idx = idx + n_bins
-
-        # Add the Order by iterating over Labels and Bin indices
-        for lc, group in label_bins.groupby(['Label', 'Bin_Index']):
-            selector = (label_bins['Label'] == lc[0]) & \
-                       (label_bins['Bin_Index'] == lc[1])
-            label_bins.loc[selector, 'Order'] = \
-                np.arange(0, np.sum(selector), 1)
-
-        label_bins[['Start_Time', 'End_Time']] = \
-            label_bins[['Start_Time', 'End_Time']] / 1000.0
-
-        return label_bins
-
     @staticmethod
     def _validate_config(raw):
         """
@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Includes the MaskStore class which keeps the coder bitmaps of BeGazeROI as
+bit-packed masks.
+
+Each bitmap is decoded once into a boolean mask of the mask pixels (in the
+layout used by BeGazeROI) and packed eight pixels to a byte with np.packbits.
+With a store directory, the packed masks of each ID are compiled into one .npy
+file the first time the ID is looked up, and the file is memory mapped when
+loaded, so every task and worker process using the same coders shares one copy
+of the masks in the page cache. Only the IDs actually looked up are compiled;
+MaskStore.warm_up compiles all of them ahead of time.
+
+The file of an ID is keyed by the mask size, the coders configuration and the
+name, size and mtime of each bitmap of the ID, so it is rebuilt as soon as one
+of these bitmaps is added, removed or modified.
+"""
+import os
+import re
+import json
+import hashlib
+from collections import OrderedDict
+import pandas as pd
+import numpy as np
+from scipy import ndimage
+
+# Bump when the layout of the compiled masks changes.
+MASK_STORE_VERSION = 3
+
+# Number of IDs whose masks are kept in memory by default
+DEFAULT_CACHE_SIZE = 64
+
+
+def read_mask(path, mask_size, color):
+    """
+    Decode a coder bitmap into a boolean mask of the pixels of the given
+    color. The pixel at column x and row y of the bitmap is at x + width*y,
+    as looked up by BeGazeROI.
+    """
+    mw, mh = mask_size
+    img = ndimage.imread(path)
+    img_vec = np.reshape(img, (mw * mh, 3))
+    return np.all((img_vec == color), axis=1)
+
+
+def mask_bits(packed, pixels):
+    """
+    Look up pixels in packed masks.
+
+    Args:
+      packed (numpy array): packed masks, one per row.
+      pixels (numpy array): integer pixel positions.
+
+    Output:
+      bits (numpy array): boolean array of shape (rows, pixels).
+    """
+    pixels = np.asarray(pixels, dtype=np.int64)
+    shifts = (7 - (pixels & 7)).astype(np.uint8)
+    return ((packed[:, pixels >> 3] >> shifts) & 1).astype(bool)
+
+
+def unpack_mask(packed, mask_size):
+    """The boolean mask of one row of packed masks."""
+    return np.unpackbits(packed)[:mask_size[0] * mask_size[1]].astype(bool)
+
+
+class MaskStore(object):
+    """
+    The packed masks of a BeGazeROI coders configuration, loaded on demand.
+
+    Only the bitmap files are listed on construction. The masks of an ID are
+    loaded on its first lookup, either by decoding its bitmaps or, with a
+    store directory, from the memory mapped compiled masks of the ID (which
+    are compiled and written on the first lookup if they do not exist yet).
+    The masks of the most recently looked up IDs are kept in a bounded LRU
+    cache.
+
+    Args:
+      coders (dict): the Coders configuration of BeGazeROI, as
+        {coder name: {'path': ..., 'pattern': ..., 'color': ...}}.
+      mask_size (list): width and height of the masks.
+      store_dir (str): if given, directory of the compiled masks. Otherwise
+        the bitmaps of each ID are decoded into memory.
+      cache_size (int): number of IDs whose masks are kept in memory. With
+        0, the masks are loaded again on every lookup.
+
+    Attributes:
+      files (pandas DataFrame): the pattern fields, Coder, Path, Size and
+        Mtime of each bitmap, ordered by ID.
+      compiled (int): number of IDs whose masks were compiled and written to
+        the store directory by this instance.
+      hits (int): number of lookups answered from the LRU cache.
+      misses (int): number of lookups which loaded the masks of an ID.
+
+    Methods:
+      get: the packed masks and areas of an ID.
+      mask_path: the path of the compiled masks of an ID.
+      warm_up: compile the masks of every ID into the store directory.
+    """
+
+    def __init__(self, coders, mask_size, store_dir=None,
+                 cache_size=DEFAULT_CACHE_SIZE):
+        self.coders = coders
+        self.mask_size = list(mask_size)
+        self.store_dir = store_dir
+        self.cache_size = cache_size
+        self.compiled = 0
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+
+        self.files = self._find_files()
+        if len(self.files) > 0:
+            self._rows = self.files.groupby('ID').indices
+        else:
+            self._rows = {}
+
+    def __getstate__(self):
+        # The masks, and their memory maps, are loaded again on demand after
+        # unpickling.
+        state = self.__dict__.copy()
+        state['_cache'] = OrderedDict()
+        return state
+
+    def _find_files(self):
+        """
+        List the bitmaps matching the pattern of each coder.
+
+        Output:
+          files (pandas DataFrame): the pattern fields, Coder, Path, Size and
+            Mtime of each bitmap, ordered by ID.
+        """
+        files = []
+        for coder_name in sorted(self.coders.keys()):
+            coder_config = self.coders[coder_name]
+            for filename in sorted(os.listdir(coder_config['path'])):
+                m = re.match(coder_config['pattern'], filename)
+                if m:
+                    path = os.path.join(coder_config['path'], filename)
+                    stat = os.stat(path)
+                    d = m.groupdict()
+                    d['Coder'] = coder_name
+                    d['Path'] = path
+                    d['Size'] = stat.st_size
+                    d['Mtime'] = stat.st_mtime
+                    files.append(d)
+
+        files = pd.DataFrame(files)
+        if len(files) > 0:
+            order = np.argsort(files['ID'].values, kind='mergesort')
+            files = files.iloc[order].reset_index(drop=True)
+        return files
+
+    def _key(self, files):
+        """Hash of everything the compiled masks of files depend on."""
+        coders = {name: {'path': os.path.abspath(config['path']),
+                         'pattern': config['pattern'],
+                         'color': list(config['color'])}
+                  for name, config in self.coders.iteritems()}
+        stamps = [(coder, os.path.basename(path), int(size), repr(mtime))
+                  for coder, path, size, mtime in zip(files['Coder'],
+                                                      files['Path'],
+                                                      files['Size'],
+                                                      files['Mtime'])]
+        sha = hashlib.sha1()
+        for part in [str(MASK_STORE_VERSION), json.dumps(self.mask_size),
+                     json.dumps(coders, sort_keys=True), json.dumps(stamps)]:
+            sha.update(part)
+            sha.update('\0')
+        return sha.hexdigest()
+
+    def _files(self, mask_id):
+        """The bitmaps of one ID, one per coder, or None."""
+        rows = self._rows.get(mask_id)
+        if rows is None:
+            return None
+        return self.files.iloc[rows]
+
+    def _compile(self, files):
+        """
+        Decode and pack the bitmaps of files.
+
+        Output:
+          packed (numpy array): the packed masks, one row per file.
+        """
+        n_bytes = (self.mask_size[0] * self.mask_size[1] + 7) // 8
+        packed = np.zeros((len(files), n_bytes), dtype=np.uint8)
+        for row, (coder_name, path) in enumerate(zip(files['Coder'],
+                                                     files['Path'])):
+            mask = read_mask(path,
+                             self.mask_size,
+                             self.coders[coder_name]['color'])
+            packed[row] = np.packbits(mask)
+        return packed
+
+    def _save(self, path, packed):
+        """Atomically write the compiled masks of an ID."""
+        if not os.path.isdir(self.store_dir):
+            os.makedirs(self.store_dir)
+        tmp_path = '{}.tmp{}'.format(path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            np.save(f, packed)
+        os.rename(tmp_path, path)
+        self.compiled += 1
+
+    def mask_path(self, mask_id):
+        """
+        The path of the compiled masks of an ID in the store directory, or
+        None without a store directory or if the ID has no masks.
+        """
+        files = self._files(mask_id)
+        if self.store_dir is None or files is None:
+            return None
+        return os.path.join(self.store_dir,
+                            'masks_{}.npy'.format(self._key(files)))
+
+    def warm_up(self):
+        """
+        Compile the masks of every ID which are not in the store directory
+        yet, without loading them. Does nothing without a store directory.
+
+        Output:
+          n_compiled (int): number of IDs compiled.
+        """
+        n_compiled = 0
+        if self.store_dir is None:
+            return n_compiled
+        for mask_id in sorted(self._rows.keys()):
+            path = self.mask_path(mask_id)
+            if not os.path.isfile(path):
+                self._save(path, self._compile(self._files(mask_id)))
+                n_compiled += 1
+        return n_compiled
+
+    def get(self, mask_id):
+        """
+        The masks of one ID, one row per coder.
+
+        Output:
+          masks (tuple): (packed masks (numpy array), areas (numpy array)), or
+            None if the ID has no masks.
+        """
+        if mask_id in self._cache:
+            self.hits += 1
+            masks = self._cache.pop(mask_id)
+        else:
+            self.misses += 1
+            masks = self._load(mask_id)
+            if self.cache_size < 1:
+                return masks
+            if len(self._cache) >= self.cache_size:
+                self._cache.popitem(last=False)
+        self._cache[mask_id] = masks
+        return masks
+
+    def _load(self, mask_id):
+        """Load the masks of one ID, compiling them if needed."""
+        files = self._files(mask_id)
+        if files is None:
+            return None
+        if self.store_dir is None:
+            packed = self._compile(files)
+        else:
+            path = self.mask_path(mask_id)
+            if not os.path.isfile(path):
+                self._save(path, self._compile(files))
+            packed = np.load(path, mmap_mode='r')
+        areas = np.unpackbits(packed, axis=1).sum(axis=1)
+        return packed, areas.astype(np.float64)
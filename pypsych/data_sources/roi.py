@@ -7,90 +7,116 @@ Includes the BeGazeROI data source class
 import pandas as pd
 import numpy as np
 from begaze import BeGaze
-from scipy import ndimage
-import os
-import re
+from binning import Segments
+from statistics import Statistic
+from mask_store import MaskStore, DEFAULT_CACHE_SIZE, mask_bits
+from schema import Schema, And
 
 
 class BeGazeROI(BeGaze):
+    # Columns of the samples file used by _clean_samples, and their dtypes
+    samples_dtypes = {'Time': np.float64,
+                      'L POR X [px]': np.float64,
+                      'L POR Y [px]': np.float64,
+                      'L Event Info': 'category'}
+
     def __init__(self, config, schedule):
 
         # Call the parent class init
-        super(BeGazeROI, self).__init__(config['Labels'], schedule)
+        labels_config = dict(config['Labels'])
+        if 'Options' in config:
+            labels_config['Options'] = config['Options']
+        super(BeGazeROI, self).__init__(labels_config, schedule)
 
         # Position channel statistics
-        self.panels = {'XY': {'CODEDRATE': self._coded_rate,
-                              'ONMASKRATE': self._onmask_rate}}
+        self.panels = {'XY': {
+            'CODEDRATE': Statistic('CODEDRATE', segment=self._coded_rates),
+            'ONMASKRATE': Statistic('ONMASKRATE',
+                                    segment=self._onmask_rates)}}
 
         self.screen_size = config['ScreenSize']
         self.mask_size = config['MaskSize']
         self.mask_position = config['MaskPosition']
-        self.masks = self._create_masks(config['Coders'])
-
-    def _coded_rate(self, xy, pos, label_bin):
-        # Fetch the masks for this ID
-        sel = (self.masks['ID'] == label_bin['ID'])
-        coded_rates = []
-        for _, mask in self.masks.loc[sel, :].iterrows():
-            x = np.remainder(xy, self.screen_size[0]) \
-                - self.mask_position[0]
-            y = np.floor(np.divide(xy, self.screen_size[0])) \
-                - self.mask_position[1]
-            sel_onmask = (x > 0) & (x < self.mask_size[0]) & \
-                         (y > 0) & (y < self.mask_size[1])
-                         
-            mxy = (x + self.mask_size[0] * y)[sel_onmask]
-            hits = 0.0
-            for p in mxy:
-                if mask['Mask'][p]:
-                    hits = hits + 1.0
-            coded_rate = hits / float(mask['Area'] * (np.sum(pos)+1))
-            coded_rates.append(coded_rate)
-
-        # Use the mean rate from the two coders
-        rate = np.mean(coded_rates)
-        return rate
-
-    def _onmask_rate(self, xy, pos, label_bin):
-        sel = (self.masks['ID'] == label_bin['ID'])
-        onmask_rates = []
-        for _, mask in self.masks.loc[sel, :].iterrows():
-            x = np.remainder(xy, self.screen_size[0]) \
-                - self.mask_position[0]
+        mask_cache_size = Schema(And(int, lambda n: n >= 0)).validate(
+            config.get('MaskCacheSize', DEFAULT_CACHE_SIZE))
+        self.mask_store = MaskStore(config['Coders'],
+                                    self.mask_size,
+                                    config.get('MaskStore'),
+                                    mask_cache_size)
+
+    def _cache_params(self):
+        """The screen size is used in cleaning the samples."""
+        params = super(BeGazeROI, self)._cache_params()
+        params['screen_size'] = self.screen_size
+        return params
+
+    def _coded_rates(self, moments):
+        """
+        The mean over coders of the rate of hits on each coder's mask, per
+        bin and per valid sample.
+        """
+        return self._roi_rates(moments)[0]
+
+    def _onmask_rates(self, moments):
+        """The fraction of the samples of each bin that are on the mask."""
+        return self._roi_rates(moments)[1]
+
+    def _roi_rates(self, moments):
+        """
+        CODEDRATE and ONMASKRATE of every bin, computed in one pass which is
+        shared by the two statistics.
+
+        The gaze positions of all bins are decomposed into mask pixels once.
+        Then, for each ID, the masks of all of its coders are loaded from the
+        mask store and looked up with one gather.
+        """
+        return moments.memo('roi_rates',
+                            lambda: self._compute_roi_rates(moments))
+
+    def _compute_roi_rates(self, moments):
+        segments = moments.segments
+        n_bins = len(segments)
+        mw, mh = self.mask_size
+
+        # Mask pixel of every gathered sample
+        xy = moments.gathered()
+        with np.errstate(invalid='ignore'):
+            x = np.remainder(xy, self.screen_size[0]) - self.mask_position[0]
             y = np.floor(np.divide(xy, self.screen_size[0])) \
                 - self.mask_position[1]
-            sel_onmask = (x > 0) & (x < self.mask_size[0]) & \
-                         (y > 0) & (y < self.mask_size[1])
-            onmask_rates.append(np.mean(sel_onmask))
-
-        # Use the mean rate from the two coders
-        rate = np.mean(onmask_rates)
-        return rate
-
-    def _create_masks(self, config):
-        mw = self.mask_size[0]
-        mh = self.mask_size[1]
-        ml = mw * mh
-        masks = []
-        for coder_name, coder_config in config.iteritems():
-            filenames = os.listdir(coder_config['path'])
-            for filename in filenames:
-                m = re.match(coder_config['pattern'], filename)
-                if m:
-                    d = m.groupdict()
-                    path = os.path.join(coder_config['path'], filename)
-                    d['Coder'] = coder_name
-                    img = ndimage.imread(path)
-                    img = np.transpose(img, (1, 0, 2))
-                    img_vec = np.reshape(img, (ml, 3))
-                    mask_vec = np.all((img_vec == coder_config['color']),
-                                      axis=1)
-                    d['Mask'] = mask_vec
-                    d['Area'] = mask_vec.sum()
-                    masks.append(d)
-
-        Masks = pd.DataFrame(masks)
-        return Masks
+            onmask = (x > 0) & (x < mw) & (y > 0) & (y < mh)
+        # Mask pixels are truncated to integers, as int() would.
+        pixels = np.where(onmask, x + mw * y, 0).astype(np.int64)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            all_onmask_rates = segments.reduce(onmask) / segments.lengths
+        n_pos = segments.reduce(segments.gather(
+            np.asarray(moments.pos, dtype=bool)))
+
+        coded_rates = np.full(n_bins, np.nan)
+        onmask_rates = np.full(n_bins, np.nan)
+        bin_ids = moments.label_bins['ID'].values
+        for mask_id in pd.unique(bin_ids):
+            masks = self.mask_store.get(mask_id)
+            if masks is None:
+                continue
+            packed, areas = masks
+            bins = np.flatnonzero(bin_ids == mask_id)
+            onmask_rates[bins] = all_onmask_rates[bins]
+
+            # The gathered samples of these bins, as segments of their own
+            starts = segments.offsets[bins]
+            id_segments = Segments(starts, starts + segments.lengths[bins])
+            id_pixels = id_segments.gather(pixels)
+            id_hits = mask_bits(packed, id_pixels) & \
+                id_segments.gather(onmask)
+
+            hits = id_segments.reduce(id_hits)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                rates = hits / (areas[:, np.newaxis] * (n_pos[bins] + 1))
+            coded_rates[bins] = np.mean(rates, axis=0)
+
+        return coded_rates, onmask_rates
 
     def _clean_samples(self, samples):
         """
@@ -135,3 +161,14 @@ class BeGazeROI(BeGaze):
         samples.drop(['X', 'Y'], axis=1, inplace=True)
 
         return samples
+
+    @staticmethod
+    def _validate_options(raw):
+        """
+        Validates the options as BeGaze does, except chunksize: the ROI
+        rates need the samples of each bin at once, so they are not streamed.
+        """
+        options = BeGaze._validate_options(raw)
+        Schema(lambda d: 'chunksize' not in d,
+               error='BeGazeROI samples cannot be streamed.').validate(options)
+        return options
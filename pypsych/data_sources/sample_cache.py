@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Includes the SampleCache class which keeps the merged data of each data source
+on disk between runs.
+
+Entries are content addressed: the key of an entry hashes the contents of the
+loaded files together with the data source class and the parameters which
+affect cleaning (see DataSource._cache_params), so an entry is reused only if
+neither the raw files nor the configuration changed. Each DataFrame of an
+entry is stored column by column as .npy files, which are memory mapped when
+read back, with its column names, index and categorical dtypes kept in a small
+pickle. Once the entries outgrow max_bytes, the least recently used ones are
+evicted.
+"""
+import os
+import json
+import shutil
+import pickle
+import hashlib
+import pandas as pd
+import numpy as np
+
+# Bump when the layout of the entries, or the cleaning of any data source,
+# changes in a way that invalidates existing entries.
+CACHE_VERSION = 2
+
+
+class SampleCache(object):
+    """
+    On-disk cache of the post-merge_data samples and labels of data sources.
+
+    Args:
+      cache_dir (str): directory holding the entries.
+      max_bytes (int): if given, total size of the entries above which the
+        least recently used entries are evicted.
+
+    Attributes:
+      hits (int): number of entries read back.
+      misses (int): number of lookups which found no entry.
+
+    Methods:
+      key: the key of a data source's merged data for the given files.
+      get: the merged data stored under a key, or None.
+      put: store merged data under a key.
+    """
+
+    def __init__(self, cache_dir, max_bytes=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._file_hashes = {}
+
+    def __getstate__(self):
+        # Workers of Experiment.process each hash their own files.
+        state = self.__dict__.copy()
+        state['_file_hashes'] = {}
+        return state
+
+    def file_hash(self, file_path):
+        """SHA-1 of a file's contents, memoized on its size and mtime."""
+        stat = os.stat(file_path)
+        memo_key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime)
+        if memo_key not in self._file_hashes:
+            sha = hashlib.sha1()
+            with open(file_path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    sha.update(block)
+            self._file_hashes[memo_key] = sha.hexdigest()
+        return self._file_hashes[memo_key]
+
+    def key(self, data_source, file_paths):
+        """
+        The key of a data source's merged data for the given files.
+
+        Args:
+          data_source (DataSource): the data source loading the files.
+          file_paths (dict): the files to load, as from
+            Schedule.get_file_paths.
+        """
+        files = sorted((file_type, self.file_hash(file_path))
+                       for file_type, file_path in file_paths.iteritems())
+        params = json.dumps(data_source._cache_params(),
+                            sort_keys=True,
+                            default=repr)
+        sha = hashlib.sha1()
+        for part in [str(CACHE_VERSION), type(data_source).__name__, params,
+                     json.dumps(files)]:
+            sha.update(part)
+            sha.update('\0')
+        return sha.hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, key):
+        """Read back the data stored under a key, or None if there is none."""
+        entry_path = self._entry_path(key)
+        try:
+            with open(os.path.join(entry_path, 'entry.pkl'), 'rb') as f:
+                names = pickle.load(f)
+            data = {name: self._read_frame(os.path.join(entry_path, name))
+                    for name in names}
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+
+        # The mtime of an entry records its last use, for eviction.
+        try:
+            os.utime(entry_path, None)
+        except OSError:
+            pass
+        self.hits += 1
+        return data
+
+    def put(self, key, data):
+        """
+        Store a dict of DataFrames under a key. Data holding anything else is
+        not cached.
+        """
+        if not all(isinstance(frame, pd.DataFrame)
+                   for frame in data.itervalues()):
+            return
+
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        entry_path = self._entry_path(key)
+        tmp_path = '{}.tmp{}'.format(entry_path, os.getpid())
+        if os.path.isdir(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+        for name, frame in data.iteritems():
+            self._write_frame(os.path.join(tmp_path, name), frame)
+        with open(os.path.join(tmp_path, 'entry.pkl'), 'wb') as f:
+            pickle.dump(sorted(data.keys()), f, pickle.HIGHEST_PROTOCOL)
+
+        try:
+            os.rename(tmp_path, entry_path)
+        except OSError:
+            # Another process stored the same entry first.
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+        if self.max_bytes is not None:
+            self.evict(self.max_bytes)
+
+    def evict(self, max_bytes):
+        """Remove the least recently used entries until max_bytes remain."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            entry_path = self._entry_path(name)
+            if '.tmp' in name or not os.path.isdir(entry_path):
+                continue
+            size = sum(os.path.getsize(os.path.join(root, filename))
+                       for root, _, filenames in os.walk(entry_path)
+                       for filename in filenames)
+            entries.append((os.path.getmtime(entry_path), size, entry_path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry_path in sorted(entries):
+            if total <= max_bytes:
+                break
+            shutil.rmtree(entry_path, ignore_errors=True)
+            total -= size
+
+    @staticmethod
+    def _write_frame(path, frame):
+        """Write a DataFrame as one .npy file per column."""
+        os.makedirs(path)
+        meta = {'columns': list(frame.columns),
+                'index_name': frame.index.name,
+                'categories': {}}
+        np.save(os.path.join(path, 'index.npy'), frame.index.values)
+        for pos, col in enumerate(frame.columns):
+            series = frame.iloc[:, pos]
+            if str(series.dtype) == 'category':
+                meta['categories'][pos] = (series.cat.categories,
+                                           series.cat.ordered)
+                values = series.cat.codes.values
+            else:
+                values = series.values
+            np.save(os.path.join(path, 'c{}.npy'.format(pos)), values)
+        with open(os.path.join(path, 'meta.pkl'), 'wb') as f:
+            pickle.dump(meta, f, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _read_frame(path):
+        """Read back a DataFrame written by _write_frame."""
+        with open(os.path.join(path, 'meta.pkl'), 'rb') as f:
+            meta = pickle.load(f)
+
+        def read(filename):
+            file_path = os.path.join(path, filename)
+            try:
+                return np.load(file_path, mmap_mode='r')
+            except ValueError:
+                # Columns of Python objects cannot be memory mapped
+                return np.load(file_path, allow_pickle=True)
+
+        index = pd.Index(read('index.npy'), name=meta['index_name'])
+        frame = pd.DataFrame(index=index)
+        for pos, col in enumerate(meta['columns']):
+            values = read('c{}.npy'.format(pos))
+            if pos in meta['categories']:
+                categories, ordered = meta['categories'][pos]
+                values = pd.Categorical.from_codes(values, categories,
+                                                   ordered=ordered)
+            frame[col] = values
+        return frame
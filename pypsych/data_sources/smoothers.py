@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Smoothers for the channels of the Biopac and HRVStitcher data sources.
+
+Each smoother is a function smoother(x, y, **params) of the sample times x and
+the channel y which returns the smoothed channel. They are chosen by the
+smoother option of the data source:
+
+  Options:
+    smoother:
+      method: name of a smoother in SMOOTHERS
+      any parameters of that smoother, e.g. window: 6000
+
+spline
+  The degree-5 smoothing spline with s = scale*len(x) fit over the whole
+  channel. This is the default and the reference for the other smoothers.
+windowed_spline
+  The same spline fit on overlapping windows of the channel, blended linearly
+  across the overlaps. Each fit is small, so the cost grows linearly with the
+  length of the recording.
+savgol
+  A Savitzky-Golay filter, i.e. a moving local polynomial fit. O(n).
+whittaker
+  The Whittaker smoother, the penalized least squares fit with a second
+  difference penalty weighted by lam, solved as a banded system. O(n).
+
+The filters assume evenly spaced samples, as written by Biopac. See
+benchmarks/bench_smoothers.py for their speed and agreement with the spline.
+"""
+import numpy as np
+from scipy.interpolate import UnivariateSpline
+from scipy.signal import savgol_filter
+from scipy.linalg import solveh_banded
+from schema import And, Or, Optional
+
+
+def spline(x, y, scale=0.55):
+    """Degree-5 smoothing spline over the whole channel."""
+    spl = UnivariateSpline(x, y, k=5, s=scale*len(x))
+    return spl(x)
+
+
+def windowed_spline(x, y, scale=0.55, window=6000, overlap=600):
+    """
+    Degree-5 smoothing splines over overlapping windows of window samples.
+    Neighbouring fits overlap by at least overlap samples, and are blended
+    with linear weights there.
+    """
+    n_samples = len(y)
+    if n_samples <= window:
+        return spline(x, y, scale=scale)
+
+    # Spread the windows evenly so that they all have the same length
+    n_windows = int(np.ceil(float(n_samples - overlap) / (window - overlap)))
+    starts = np.round(np.linspace(0, n_samples - window, n_windows))
+    ramp = np.linspace(0, 1, overlap + 2)[1:-1]
+
+    smoothed = np.zeros(n_samples)
+    weights = np.zeros(n_samples)
+    for start in starts.astype(np.int64):
+        stop = start + window
+        fit = spline(x[start:stop], y[start:stop], scale=scale)
+        weight = np.ones(window)
+        if start > 0:
+            weight[:overlap] = ramp
+        if stop < n_samples:
+            weight[window-overlap:] = ramp[::-1]
+        smoothed[start:stop] += weight * fit
+        weights[start:stop] += weight
+    return smoothed / weights
+
+
+def savgol(x, y, window=61, polyorder=3):
+    """Savitzky-Golay filter of window samples and the given order."""
+    if len(y) <= polyorder:
+        return np.asarray(y, dtype=np.float64)
+    # The window must be odd and no longer than the channel
+    window = min(window, len(y) - (len(y) + 1) % 2)
+    window = window - (window + 1) % 2
+    return savgol_filter(np.asarray(y, dtype=np.float64),
+                         window_length=window,
+                         polyorder=min(polyorder, window - 1),
+                         mode='interp')
+
+
+def whittaker(x, y, lam=1000.0):
+    """
+    Whittaker smoother, minimizing |y - z|^2 + lam*|D2 z|^2 where D2 takes
+    second differences. The normal equations are pentadiagonal.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n_samples = len(y)
+    if n_samples < 3:
+        return y.copy()
+
+    # Upper bands of (I + lam*D2'D2) in the layout of solveh_banded
+    diagonal = np.full(n_samples, 6.0)
+    diagonal[[0, -1]] = 1.0
+    diagonal[[1, -2]] = 5.0
+    first = np.full(n_samples - 1, -4.0)
+    first[[0, -1]] = -2.0
+    second = np.ones(n_samples - 2)
+    if n_samples == 3:
+        diagonal[1] = 4.0
+    bands = np.zeros((3, n_samples))
+    bands[0, 2:] = lam * second
+    bands[1, 1:] = lam * first
+    bands[2, :] = 1.0 + lam * diagonal
+    return solveh_banded(bands, y)
+
+
+SMOOTHERS = {'spline': spline,
+             'windowed_spline': windowed_spline,
+             'savgol': savgol,
+             'whittaker': whittaker}
+
+# Positive scale and penalty parameters
+_POSITIVE = And(Or(int, float), lambda v: v > 0)
+
+
+def _valid_windows(params):
+    """Windows of windowed_spline must overlap by less than their length."""
+    window = params.get('window', 6000)
+    overlap = params.get('overlap', 600)
+    return 0 <= overlap < window
+
+
+# Schema of the smoother option of a data source, with the parameters each
+# smoother accepts
+SMOOTHER_SCHEMA = Or({'method': 'spline',
+                      Optional('scale'): _POSITIVE},
+                     And({'method': 'windowed_spline',
+                          Optional('scale'): _POSITIVE,
+                          Optional('window'): int,
+                          Optional('overlap'): int},
+                         _valid_windows),
+                     {'method': 'savgol',
+                      Optional('window'): And(int, lambda n: n > 0),
+                      Optional('polyorder'): And(int, lambda n: n >= 0)},
+                     {'method': 'whittaker',
+                      Optional('lam'): _POSITIVE})
+
+DEFAULT_SMOOTHER = {'method': 'spline'}
+
+
+def get_smoother(options):
+    """
+    Resolve the smoother option of a data source to a function smoother(x,
+    y) of the sample times and the channel.
+    """
+    params = dict(options)
+    method = SMOOTHERS[params.pop('method')]
+    return lambda x, y: method(x, y, **params)
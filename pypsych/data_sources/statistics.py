@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Registry of the bin statistics available to the pypsych data sources.
+
+Each statistic declares a vectorized segment form: a function of the
+SegmentMoments of a channel (count, NaN count, sum and sum of squares over the
+bin segments) that computes the statistic of all bins in one NumPy pass.
+Statistics may instead give only a legacy per-bin callable,
+per_bin(samples, pos, label_bin), which is called once per bin.
+
+Data sources refer to statistics in their panels either by registry name or by
+a per-bin callable:
+
+  self.panels = {channel (str): {stat_name (str): name (str) or callable}}
+"""
+import numpy as np
+
+
+class Statistic(object):
+    """
+    A bin statistic.
+
+    Args:
+      name (str): name of the statistic in the registry.
+      segment (callable): vectorized form, segment(moments) -> numpy array.
+      per_bin (callable): legacy form, per_bin(samples, pos, label_bin).
+    """
+
+    def __init__(self, name, segment=None, per_bin=None):
+        if segment is None and per_bin is None:
+            raise Exception(
+                'Statistic {} needs a segment or per_bin form.'.format(name))
+        self.name = name
+        self.segment = segment
+        self.per_bin = per_bin
+
+    @property
+    def vectorized(self):
+        return self.segment is not None
+
+
+STATISTICS = {}
+
+
+def register_statistic(name, segment=None, per_bin=None):
+    """Add a statistic to the registry under the given name."""
+    STATISTICS[name] = Statistic(name, segment=segment, per_bin=per_bin)
+    return STATISTICS[name]
+
+
+def get_statistic(stat):
+    """
+    Resolve a panels entry (a registry name, a Statistic or a legacy per-bin
+    callable) to a Statistic.
+    """
+    if isinstance(stat, Statistic):
+        return stat
+    elif isinstance(stat, basestring):
+        if stat not in STATISTICS:
+            raise Exception('Unknown statistic {}'.format(stat))
+        return STATISTICS[stat]
+    elif callable(stat):
+        return Statistic(getattr(stat, '__name__', repr(stat)), per_bin=stat)
+    else:
+        raise Exception('Bad statistic {}'.format(stat))
+
+
+def _divide(num, den):
+    """Elementwise num/den with NaN wherever den is not positive."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        res = num / den
+    res[den <= 0] = np.nan
+    return res
+
+
+def _mean(m):
+    return _divide(m.sum(), m.n())
+
+
+def _var(m, ddof):
+    return _divide(m.sumsq(), m.n() - ddof)
+
+
+def _sem(m):
+    with np.errstate(invalid='ignore'):
+        return _divide(np.sqrt(_var(m, ddof=1)), np.sqrt(m.n()))
+
+
+# NaN-skipping statistics, matching pandas.Series.mean, .std, .sem and
+# numpy.var applied to a Series.
+register_statistic('mean', segment=_mean)
+register_statistic('std', segment=lambda m: np.sqrt(_var(m, ddof=1)))
+register_statistic('sem', segment=_sem)
+register_statistic('var', segment=lambda m: _var(m, ddof=0))
+
+# Sample counts
+register_statistic('count', segment=lambda m: m.count())
+register_statistic('nans', segment=lambda m: m.nans())
+
+# Sample times at the edges of each bin
+register_statistic('first_time', segment=lambda m: m.first_index())
+register_statistic('last_time', segment=lambda m: m.last_index())
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Trigger-edge detection for the flag channels recorded alongside Biopac
+sessions, shared by the Biopac, Kubios and HRVStitcher data sources.
+
+A flag channel holds one event code per sample. Every run of equal codes is
+one event which starts at the first sample of the run, and runs of the idle
+code (255) between events are not labels.
+"""
+import pandas as pd
+import numpy as np
+
+# Code written to the flag channel between events
+IDLE_FLAG = 255
+
+
+def trigger_edges(flags):
+    """
+    Find the sample positions at which the flag channel changes code.
+
+    Args:
+      flags (numpy array): the flag channel.
+
+    Output:
+      edges (numpy array): position of the first sample of every run of equal
+        codes. The first sample always starts a run.
+    """
+    flags = np.asarray(flags)
+    if flags.size == 0:
+        return np.array([], dtype=np.int64)
+    changes = np.flatnonzero(flags[1:] != flags[:-1]) + 1
+    return np.concatenate([[0], changes])
+
+
+def trigger_labels(flags, idle_flag=IDLE_FLAG):
+    """
+    Turn a flag channel into a data frame of label flags and start times.
+
+    Args:
+      flags (numpy array): the flag channel.
+      idle_flag (int): code of the samples between events.
+
+    Output:
+      labels (pandas DataFrame): the flag and Start_Time (sample position) of
+        each event, indexed by the position of the run among all runs.
+    """
+    flags = np.asarray(flags)
+    edges = trigger_edges(flags)
+    labels = pd.DataFrame({'flag': flags[edges],
+                           'Start_Time': edges})
+    return labels[(labels['flag'] != idle_flag)]
@@ -5,18 +5,23 @@
 Includes the Experiment class.
 """
 import pandas as pd
-import numpy as np
 import yaml
 import pickle
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pkg_resources import resource_filename
 from config import Config
 from schedule import Schedule
+from output import OutputBuilder, long_to_panels, pivot_long
+from validation import file_counts, status_table, status_matrix, \
+    VALIDATION_COLUMNS
 from data_sources.begaze import BeGaze
 from data_sources.biopac import Biopac
 from data_sources.eprime import EPrime
 from data_sources.hrvstitcher import HRVStitcher
 from data_sources.roi import BeGazeROI
 from data_sources.kubios import Kubios
+from data_sources.sample_cache import SampleCache
+from data_sources.handoff import HandoffCache, DEFAULT_MAX_BYTES
 
 pd.set_option('display.max_colwidth', 1000)
 
@@ -27,6 +32,30 @@ DATA_SOURCES = {'BeGaze': BeGaze,
                 'BeGazeROI': BeGazeROI,
                 'Kubios': Kubios}
 
+# Threads checking files in Experiment.validate_files. Checks are I/O bound.
+VALIDATION_WORKERS = 16
+
+# Data sources created inside a worker process of Experiment.process, reused
+# across the groups that the worker is handed.
+_WORKER_DATA_SOURCES = {}
+
+
+def _process_group(ds_id, subconfig, subschedule, file_paths,
+                   sample_cache=None, loaded=None):
+    """
+    Load and process one (subject, task, data source) group in a worker
+    process and return the data source output. See
+    DataSource.load_and_merge for loaded.
+    """
+    if ds_id not in _WORKER_DATA_SOURCES:
+        _WORKER_DATA_SOURCES[ds_id] = \
+            DATA_SOURCES[ds_id[1]](subconfig, subschedule)
+    data_source = _WORKER_DATA_SOURCES[ds_id]
+    data_source.sample_cache = sample_cache
+    data_source.load_and_merge(file_paths, loaded=loaded)
+    data_source.bin_data()
+    return data_source.output
+
 
 class Experiment(object):
     """
@@ -40,15 +69,26 @@ class Experiment(object):
         self.data_paths = global_config['data_paths']
         self.pickle_path = global_config['pickle_path']
         self.excluded_subjects = global_config['excluded_subjects']
+        self.index_cache_path = global_config.get('index_cache_path')
+        self.sample_cache_path = global_config.get('sample_cache_path')
+        self.sample_cache_max_bytes = \
+            global_config.get('sample_cache_max_bytes')
+        self.handoff_max_bytes = \
+            global_config.get('handoff_max_bytes', DEFAULT_MAX_BYTES)
 
         self.config = Config(raw_config)
         self.schedule = Schedule(raw_sched)
 
         self.output = {}
+        self.sample_cache = None
+        # HandoffCache of the data loaded by validate_files, if any
+        self.handoff = None
 
         self.invalid_subjects = []
         self.valid_subjects = []
         self.validation = pd.DataFrame()
+        # Long table of the validation statuses, see validation.status_table
+        self.validation_table = pd.DataFrame(columns=VALIDATION_COLUMNS)
 
         # Data sources will be preserved in memory across trials. This is to
         # ensure that the future Masker data source does not read hundreds of
@@ -60,12 +100,22 @@ class Experiment(object):
             path = self.pickle_path
         pickle.dump(self, open(path, 'wb'))
 
-    def compile(self, validate=False):
+    def compile(self, validate=False, rebuild_index=False, handoff=False):
         """
         Compile the schedule on the data_paths and spin-up the data sources
         for each task_name.
+
+        Args:
+          validate (bool): validate the scheduled files.
+          rebuild_index (bool): ignore the persistent file index kept at the
+            index_cache_path of the global configuration, if any, and rescan
+            the data paths.
+          handoff (bool): validate by loading every file, and keep the loaded
+            data for process. See validate_files.
         """
-        self.schedule.compile(self.data_paths)
+        self.schedule.compile(self.data_paths,
+                              cache_dir=self.index_cache_path,
+                              rebuild=rebuild_index)
 
         task_datas = self.schedule\
                          .sched_df[['Task_Name', 'Data_Source_Name']]\
@@ -82,154 +132,226 @@ class Experiment(object):
 
         if validate:
             self.validation, self.valid_subjects, self.invalid_subjects = \
-                self.validate_files()
+                self.validate_files(handoff=handoff)
         else:
             self.validation = pd.DataFrame()
+            self.validation_table = pd.DataFrame(columns=VALIDATION_COLUMNS)
             self.valid_subjects = self.schedule.subjects
             self.invalid_subjects = []
 
-    def process(self):
+    def process(self, workers=None, use_cache=True):
         """
         Iterate over the (subject, task) pairs and process each data source.
+
+        Args:
+          workers (int): if given, process the (subject, task, data source)
+            groups in a pool of this many worker processes. Outputs are still
+            merged in schedule order, so the result is identical to a serial
+            run.
+          use_cache (bool): read and store the merged data of the data sources
+            in the sample cache at the sample_cache_path of the global
+            configuration, if any. Set to False to bypass the cache.
+
+        Groups whose data was kept by validate_files(handoff=True) are merged
+        from that data instead of being loaded again.
         """
+        if use_cache and self.sample_cache_path is not None:
+            self.sample_cache = SampleCache(self.sample_cache_path,
+                                            self.sample_cache_max_bytes)
+        else:
+            self.sample_cache = None
+
         if hasattr(self, 'validation'):
-            self.schedule.sched_df = self.schedule.sched_df[
-                self.schedule.sched_df['Subject'].isin(self.valid_subjects)]
+            self.schedule.isolate_subjects(self.valid_subjects)
 
         grouped = self.schedule.sched_df.groupby(['Subject',
                                                   'Task_Name',
                                                   'Data_Source_Name'])
+        idxs = [idx for idx, _ in grouped]
 
-        self.output = {task_name: {} for task_name in self.config.task_names}
+        builder = OutputBuilder(self.config.task_names,
+                                subjects=self.schedule.subjects)
+
+        if workers is None:
+            outputs = self._process_serial(idxs)
+        else:
+            outputs = self._process_parallel(idxs, workers)
 
         # Iterate over subjects, tasks, and data sources
-        for idx, _ in grouped:
+        for idx, ds_out in outputs:
             print idx
+            subject_id, task_name, data_source_name = idx
+
+            # Insert a column for the subject id since the data sources are
+            # ignorant of this, and collect the outputs to be concatenated
+            # once all subjects have been processed
+            ds_out.insert(0, 'Subject', subject_id)
+            builder.add(task_name, subject_id, ds_out)
+
+        self.output = builder.build()
+
+        # Entries of groups which were not processed are not needed anymore
+        if self.handoff is not None:
+            self.handoff.clear()
+
+    def output_panels(self):
+        """
+        The output in the layout used before the long-format tables: a dict
+        of dicts of pd.Panels keyed by task name and channel.
+        """
+        return {task_name: long_to_panels(output)
+                for task_name, output in self.output.iteritems()}
+
+    def _process_serial(self, idxs):
+        """Process each group with the data sources held by the experiment."""
+        for idx in idxs:
             # Fetch the file paths from the schedule for this trial
             file_paths = self.schedule.get_file_paths(*idx)
             subject_id, task_name, data_source_name = idx
             ds_id = tuple([task_name, data_source_name])
 
             # Load and process the data source in question
-            self.data_sources[ds_id].load(file_paths)
-            self.data_sources[ds_id].process()
-
-            # Iterate over the outputs and append them to existing output
-            # data frames if possible
-            ds_out = self.data_sources[ds_id].output
-            panels = self.data_sources[ds_id].panels
-
-            for channel, statistics in panels.iteritems():
-                # Insert a column for the subject id since the data
-                # sources are ignorant of this
-                ds_out[channel].loc[:, :, 'Subject'] = subject_id
-
-                # If the channel already exists, append to it, otherwise
-                # save it
-                if channel in self.output[task_name].keys():
-                    self.output[task_name][channel] = pd.concat(
-                        [self.output[task_name][channel], ds_out[channel]],
-                        ignore_index=True,
-                        axis=1)
-                else:
-                    self.output[task_name][channel] = ds_out[channel]
-
-    def validate_files(self):
+            data_source = self.data_sources[ds_id]
+            data_source.sample_cache = self.sample_cache
+            data_source.load_and_merge(file_paths,
+                                       loaded=self._handed_over(idx))
+            data_source.bin_data()
+            yield idx, data_source.output
+
+    def _process_parallel(self, idxs, workers):
         """
-        Iterate over the (subject, task) pairs and validate each data source.
+        Process each group in a pool of worker processes. Each worker creates
+        its own data sources from the task configuration rather than receiving
+        the experiment's instances. Outputs are yielded in the order of idxs,
+        regardless of the order in which the workers finish.
         """
+        executor = ProcessPoolExecutor(max_workers=workers)
+        try:
+            futures = []
+            for idx in idxs:
+                subject_id, task_name, data_source_name = idx
+                ds_id = tuple([task_name, data_source_name])
+                futures.append((idx, executor.submit(
+                    _process_group,
+                    ds_id,
+                    self.config.get_subconfig(*ds_id),
+                    self.schedule.get_subschedule(*ds_id),
+                    self.schedule.get_file_paths(*idx),
+                    self.sample_cache,
+                    self._handed_over(idx))))
+
+            for idx, future in futures:
+                yield idx, future.result()
+        finally:
+            executor.shutdown(wait=True)
+
+    def _handed_over(self, idx):
+        """The data of a group kept by validate_files, or None."""
+        if self.handoff is None:
+            return None
+        return self.handoff.pop(idx)
+
+    def validate_files(self, workers=VALIDATION_WORKERS, full=False,
+                       handoff=False):
+        """
+        Iterate over the (subject, task) pairs and validate each data source.
 
-        # First, run the normal validation on the Schedule
-        vf = self.schedule.validate_files()
-
+        By default, each data file is checked with DataSource.check_files,
+        which reads only the start of the file, in a pool of threads.
+
+        Args:
+          workers (int): number of threads checking files.
+          full (bool): instead, load every data file serially and check it
+            with DataSource.validate_data.
+          handoff (bool): load every data file, as with full, and keep the
+            data of the groups found valid in self.handoff for process, up to
+            the handoff_max_bytes of the global configuration.
+
+        The status of every scheduled file is also kept in the long table
+        self.validation_table, see validation.status_table.
+
+        Output:
+          validation (pandas DataFrame): the wide matrix of statuses, with a
+            row per subject and a column per (data source, task, file).
+          valid_subjects (list): subjects whose files are all Found.
+          invalid_subjects (list): the other subjects.
+        """
         grouped = self.schedule.sched_df.groupby(['Subject',
                                                   'Task_Name',
                                                   'Data_Source_Name'])
+        idxs = [idx for idx, _ in grouped]
 
-        validation = {}
-
-        # Iterate over subjects, tasks, and data sources
-        for idx, _ in grouped:
-            # Fetch the file paths from the schedule for this trial
-            file_paths = self.schedule.get_file_paths(*idx)
-            subject_id, task_name, data_source_name = idx
-            ds_id = tuple([task_name, data_source_name])
+        if handoff:
+            self.handoff = HandoffCache(self.handoff_max_bytes)
+        else:
+            self.handoff = None
 
-            # Load and process the data source in question
+        if full or handoff:
+            validation = {idx: self._validate_loaded(idx) for idx in idxs}
+        else:
+            executor = ThreadPoolExecutor(max_workers=workers)
             try:
-                self.data_sources[ds_id].load(file_paths)
-            except KeyError as e:
-                validation[idx] = {str(e)[1:-1]: False}
-            else:
-                validation[idx] = self.data_sources[ds_id].validate_data()
-
-            # TODO(janmtl): The above will not report a samples file that is
-            # empty when a labels file is missing
-
-        # Now we take the newly found validation informaiton (that pertains to
-        # corrupt, rather than missing files) and transform the schedule
-        # validation matrix
-        ef = [{'Subject': subject,
-               'Task_Name': task,
-               'File': file_type,
-               'Data_Source_Name': ds_name,
-               'Status': status}
-              for (subject, task, ds_name), sub in validation.iteritems()
-              for file_type, status in sub.iteritems()]
-        ef = pd.DataFrame.from_dict(ef)
-        ef = ef.pivot_table(index='Subject',
-                            columns=['Data_Source_Name',
-                                     'Task_Name',
-                                     'File'],
-                            values='Status',
-                            aggfunc=lambda x: x).replace(np.nan, True)
-        ef = ef.as_matrix()
-        zf = vf.as_matrix()
-        yf = np.copy(zf).astype(np.object)
-        yf[zf] = 'Found'
-        yf[~ef] = 'Corrupt'
-        yf[~zf] = 'Missing'
-        vf.loc[:, :] = yf
+                validation = dict(zip(idxs, executor.map(self._check_group,
+                                                         idxs)))
+            finally:
+                executor.shutdown(wait=True)
+
+        # Now we take the newly found validation information (that pertains to
+        # corrupt, rather than missing files), one row per checked file, and
+        # combine it with the files found by the schedule
+        checks = pd.DataFrame.from_records(
+            [(subject, ds_name, task, file_type, passed)
+             for (subject, task, ds_name), sub in validation.iteritems()
+             for file_type, passed in sub.iteritems()],
+            columns=['Subject', 'Data_Source_Name', 'Task_Name', 'File',
+                     'Passed'])
+        self.validation_table = status_table(
+            file_counts(self.schedule.sched_df), checks)
+        vf = status_matrix(self.validation_table)
 
         sel = (vf == 'Found').all(axis=1)
-        nsel = (vf != 'Found').any(axis=1)
         valid_subjects = list(vf.index[sel])
-        invalid_subjects = list(vf.index[nsel])
+        invalid_subjects = list(vf.index[~sel])
 
         return vf, valid_subjects, invalid_subjects
 
+    def _check_group(self, idx):
+        """Check the files of one (subject, task, data source) group."""
+        subject_id, task_name, data_source_name = idx
+        return self.data_sources[(task_name, data_source_name)].check_files(
+            self.schedule.get_file_paths(*idx))
+
+    def _validate_loaded(self, idx):
+        """Load the files of one group and validate the loaded data."""
+        # Fetch the file paths from the schedule for this trial
+        file_paths = self.schedule.get_file_paths(*idx)
+        subject_id, task_name, data_source_name = idx
+        ds_id = tuple([task_name, data_source_name])
+
+        # Load and process the data source in question
+        # TODO(janmtl): This will not report a samples file that is empty
+        # when a labels file is missing
+        data_source = self.data_sources[ds_id]
+        try:
+            data_source.load(file_paths)
+        except KeyError as e:
+            return {str(e)[1:-1]: False}
+
+        status = data_source.validate_data()
+        if self.handoff is not None and all(status.itervalues()):
+            self.handoff.put(idx, data_source.data)
+        return status
+
     def pivot_outputs(self):
-        """Pivot."""
-        # TODO(janmtl): improve this docstring
-
-        pivot_out = {}
-
-        for task_name in self.config.task_names:
-            pivot_out[task_name] = {}
-            for channel, stats in self.output[task_name].iteritems():
-                pivot_out[task_name][channel] = {}
-                stats.loc[:, :, 'Event'] = stats.loc[:, :, 'Label'] \
-                    + stats.loc[:, :, 'Bin_Index'].astype(str)
-                for stat_name, stat in stats.iteritems():
-                    # Only allow for indices which are filled and discard the
-                    # rest
-                    full_cols = stat[['Subject', 'Condition',
-                                      'ID', 'Order']].dropna(how='all', axis=1)\
-                                                     .columns
-
-                    if ('ID' in full_cols) & ('Order' in full_cols):
-                        full_cols.drop('Order')
-
-                    stat_piv = pd.pivot_table(
-                        stat,
-                        values='stat',
-                        index=list(full_cols),
-                        columns='Event',
-                        aggfunc=lambda x: x)
-
-                    pivot_out[task_name][channel][stat_name] = stat_piv
-
-        return pivot_out
+        """
+        Pivot the output of each task into wide tables with a column per
+        Event (the Label followed by the Bin_Index). See output.pivot_long.
+
+        Output:
+          pivot_out (dict): {task name: {channel: {stat name: DataFrame}}}
+        """
+        return {task_name: pivot_long(self.output[task_name])
+                for task_name in self.config.task_names}
 
     def report_to_html(self, path):
         """Create an HTML report of the experiment at `path`."""
@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Includes the FileIndexer class which searches the data paths for the files
+named in a schedule.
+
+Each data path is walked exactly once with scandir and every file name is
+dispatched against all of the schedule's file patterns at once. The patterns
+are compiled up front, and each carries the literal text that any match must
+contain, so most patterns are ruled out with a substring test before the
+regex is tried.
+
+With a cache directory, the index of each data path is kept on disk between
+compiles, keyed by the data path and a hash of the schedule. It records the
+mtime, subdirectories and matches of every directory, and on the next search
+only directories whose mtime has changed are listed again.
+"""
+import os
+import re
+import json
+import pickle
+import hashlib
+import sre_parse
+import sre_constants
+import time
+import pandas as pd
+import numpy as np
+try:
+    from os import scandir
+except ImportError:
+    from scandir import scandir
+
+
+def required_literals(pattern):
+    """
+    List the runs of literal text at the top level of a regex pattern. Every
+    string matched by the pattern contains all of them.
+    """
+    compiled = re.compile(pattern)
+    if compiled.flags & re.IGNORECASE:
+        return []
+
+    literals = []
+    run = []
+    for op, arg in sre_parse.parse(pattern):
+        if op == sre_constants.LITERAL:
+            run.append(unichr(arg) if arg > 127 else chr(arg))
+        else:
+            if run:
+                literals.append(''.join(run))
+            run = []
+    if run:
+        literals.append(''.join(run))
+    return literals
+
+
+class FilePattern(object):
+    """
+    A compiled schedule file pattern.
+
+    Args:
+      seq (int): position of the pattern in the schedule.
+      task_name (str): task the pattern belongs to.
+      data_source_name (str): data source the pattern belongs to.
+      file_type (str): name of the file in the data source schedule.
+      pattern (str): regex to match file names against.
+    """
+
+    def __init__(self, seq, task_name, data_source_name, file_type, pattern):
+        self.seq = seq
+        self.task_name = task_name
+        self.data_source_name = data_source_name
+        self.file_type = file_type
+        self.regex = re.compile(pattern)
+        self.literals = required_literals(pattern)
+
+    def match(self, filename):
+        """Match a file name, as re.match(pattern, filename)."""
+        for literal in self.literals:
+            if literal not in filename:
+                return None
+        return self.regex.match(filename)
+
+
+# A directory modified this close to the time it was scanned may have changed
+# again within the resolution of its mtime, so its listing is not reused.
+RACY_MTIME_SECONDS = 2.0
+
+
+class FileIndexer(object):
+    """
+    Searches data paths for all files matching the patterns of a schedule.
+
+    Args:
+      raw (dict): the schedule configuration, see Schedule.
+      cache_dir (str): if given, directory holding the persistent index of
+        each data path.
+      rebuild (bool): ignore any persistent index and rescan everything.
+
+    Attributes:
+      patterns (list): the compiled FilePatterns in schedule order.
+      timings (dict): seconds spent walking and matching each data path.
+      report (dict): number of directories reused from the persistent index
+        and rescanned for each data path, as {'reused': n, 'rescanned': n}.
+    """
+
+    def __init__(self, raw, cache_dir=None, rebuild=False):
+        self.cache_dir = cache_dir
+        self.rebuild = rebuild
+        self.schedule_hash = hashlib.sha1(
+            json.dumps(raw, sort_keys=True)).hexdigest()
+        self.patterns = []
+        for task_name, task in raw.iteritems():
+            for data_source_name, file_patterns in task.iteritems():
+                for file_type, pattern in file_patterns.iteritems():
+                    self.patterns.append(FilePattern(len(self.patterns),
+                                                     task_name,
+                                                     data_source_name,
+                                                     file_type,
+                                                     pattern))
+        self.timings = {}
+        self.report = {}
+
+    def match_files(self, root, filenames):
+        """
+        Dispatch file names against every pattern.
+
+        Output:
+          entries (list): (pattern seq, file position, fields) of each match.
+        """
+        entries = []
+        for pos, filename in enumerate(filenames):
+            for file_pattern in self.patterns:
+                file_match = file_pattern.match(filename)
+                if file_match:
+                    fd = file_match.groupdict()
+                    fd['Task_Name'] = file_pattern.task_name
+                    fd['Data_Source_Name'] = file_pattern.data_source_name
+                    fd['File'] = file_pattern.file_type
+                    fd['Path'] = os.path.join(root, filename)
+                    entries.append((file_pattern.seq, pos, fd))
+        return entries
+
+    def scan_directory(self, root):
+        """
+        List the files and the subdirectories to descend into of one
+        directory, in the same order and with the same rules as os.walk.
+        """
+        filenames = []
+        subdirs = []
+        try:
+            entries = list(scandir(root))
+        except OSError:
+            return filenames, subdirs
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if not is_dir:
+                filenames.append(entry.name)
+            elif not entry.is_symlink():
+                subdirs.append(entry.name)
+        return filenames, subdirs
+
+    def index_path(self, data_path):
+        """
+        Walk one data path top-down and match every file. Directories whose
+        mtime matches the persistent index are not listed again.
+
+        Output:
+          entries (list): (pattern seq, walk position, fields) of each match.
+        """
+        if self.cache_dir is not None and not self.rebuild:
+            cache = self._load_cache(data_path)
+        else:
+            cache = {}
+        new_cache = {}
+        report = {'reused': 0, 'rescanned': 0}
+
+        entries = []
+        stack = [data_path]
+        walked = 0
+        while stack:
+            root = stack.pop()
+            try:
+                mtime = os.stat(root).st_mtime
+            except OSError:
+                continue
+
+            cached = cache.get(root)
+            if cached is not None and cached['mtime'] == mtime:
+                report['reused'] += 1
+            else:
+                report['rescanned'] += 1
+                filenames, subdirs = self.scan_directory(root)
+                cached = {'mtime': mtime,
+                          'n_files': len(filenames),
+                          'subdirs': subdirs,
+                          'matches': self.match_files(root, filenames)}
+                if time.time() - mtime < RACY_MTIME_SECONDS:
+                    cached['mtime'] = None
+            new_cache[root] = cached
+
+            for seq, pos, fd in cached['matches']:
+                entries.append((seq, walked + pos, dict(fd)))
+            walked += cached['n_files']
+            stack.extend(os.path.join(root, subdir)
+                         for subdir in reversed(cached['subdirs']))
+
+        if self.cache_dir is not None:
+            self._save_cache(data_path, new_cache)
+        self.report[data_path] = report
+        return entries
+
+    def _cache_path(self, data_path):
+        """Path of the persistent index of a data path for this schedule."""
+        key = hashlib.sha1(os.path.abspath(data_path) + '\0'
+                           + self.schedule_hash).hexdigest()
+        return os.path.join(self.cache_dir, 'index_{}.pkl'.format(key))
+
+    def _load_cache(self, data_path):
+        """Load the persistent index of a data path, or {} if there is none."""
+        try:
+            with open(self._cache_path(data_path), 'rb') as f:
+                return pickle.load(f)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            return {}
+
+    def _save_cache(self, data_path, cache):
+        """Atomically replace the persistent index of a data path."""
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        path = self._cache_path(data_path)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(cache, f, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_path, path)
+
+    def search(self, data_paths):
+        """
+        Search the data paths for matching file patterns and return a pandas
+        DataFrame of the results, as Schedule.search.
+        """
+        keyed = []
+        for path_pos, data_path in enumerate(data_paths):
+            start = time.time()
+            for seq, pos, fd in self.index_path(data_path):
+                keyed.append(((seq, path_pos, pos), fd))
+            self.timings[data_path] = time.time() - start
+
+        # Order the matches as if each pattern had walked each data path in
+        # turn.
+        keyed.sort(key=lambda key_fd: key_fd[0])
+        files_df = pd.DataFrame([fd for _, fd in keyed])
+        files_df.fillna({'Task_Order': 0}, inplace=True)
+        files_df[['Subject', 'Task_Order']] = \
+            files_df[['Subject', 'Task_Order']].astype(np.int64)
+        return files_df
@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Includes the long-format output model of pypsych and the OutputBuilder class
+which assembles the per-subject outputs of the data sources into the
+Experiment output.
+
+Each task's output is one long table with a row per (Subject, Channel, Stat,
+bin) and the columns of LONG_COLUMNS. Labels are stored as categoricals and
+bin positions and values as numeric columns. long_to_panels and
+panels_to_long convert to and from the older {channel: pd.Panel} layout, and
+pivot_long spreads the bins of each channel statistic into wide tables.
+"""
+import pandas as pd
+import numpy as np
+
+LONG_COLUMNS = ['Subject', 'Channel', 'Stat', 'Label', 'Condition', 'ID',
+                'Order', 'Bin_Index', 'Bin_Order', 'value']
+
+CATEGORICAL_COLUMNS = ['Channel', 'Stat', 'Label', 'Condition', 'ID']
+
+NUMERIC_COLUMNS = ['Subject', 'Order', 'Bin_Index', 'Bin_Order', 'value']
+
+# Minor axis of the Panel views, as built by DataSource.bin_data before the
+# long-format output.
+PANEL_COLUMNS = ['Order', 'ID', 'Label', 'Condition', 'Bin_Order', 'Bin_Index',
+                 'stat', 'Subject']
+
+# Columns identifying the rows of the wide tables of pivot_long, where they
+# are not all NaN.
+PIVOT_INDEX_COLUMNS = ['Subject', 'Condition', 'ID', 'Order']
+
+
+def long_block(label_bins, channel, stat_name, values):
+    """
+    Build the long-format rows of one channel statistic.
+
+    Args:
+      label_bins (pandas DataFrame): the bins, as from create_label_bins.
+      channel (str): name of the channel.
+      stat_name (str): name of the statistic.
+      values (array-like): the statistic of each bin of label_bins.
+    """
+    block = pd.DataFrame({'Channel': channel,
+                          'Stat': stat_name,
+                          'value': values},
+                         index=label_bins.index)
+    for col in ['Label', 'Condition', 'ID', 'Order', 'Bin_Index',
+                'Bin_Order']:
+        block[col] = label_bins[col]
+    block = block.sort_values(by='Bin_Order', axis=0)
+    return block
+
+
+def typed_long(long_df):
+    """
+    Order the columns of a long-format table and give each column its dtype.
+    Values that are not numeric (e.g. EPrime text fields) stay as objects.
+    """
+    columns = [col for col in LONG_COLUMNS if col in long_df.columns]
+    long_df = long_df.loc[:, columns]
+    for col in NUMERIC_COLUMNS:
+        if col in long_df.columns:
+            long_df[col] = pd.to_numeric(long_df[col], errors='ignore')
+    for col in CATEGORICAL_COLUMNS:
+        long_df[col] = long_df[col].astype('category')
+    return long_df.reset_index(drop=True)
+
+
+def concat_long(blocks):
+    """Concatenate long-format blocks into one typed table."""
+    if not blocks:
+        return pd.DataFrame(columns=LONG_COLUMNS)
+    # Categorical columns with different categories concatenate as objects,
+    # so the dtypes are applied to the result.
+    return typed_long(pd.concat(blocks, ignore_index=True))
+
+
+def panels_to_long(panels):
+    """Convert a {channel: pd.Panel} output to a long-format table."""
+    blocks = []
+    for channel, panel in panels.iteritems():
+        for stat_name in panel.items:
+            frame = panel[stat_name]
+            block = frame.drop('stat', axis=1)
+            block['Channel'] = channel
+            block['Stat'] = stat_name
+            block['value'] = frame['stat']
+            blocks.append(block)
+    return concat_long(blocks)
+
+
+def long_to_panels(long_df):
+    """
+    Convert a long-format table to a {channel: pd.Panel} view, with one Panel
+    item per statistic as produced by DataSource.bin_data before the
+    long-format output.
+    """
+    columns = [col for col in PANEL_COLUMNS
+               if col == 'stat' or col in long_df.columns]
+    panels = {}
+    for channel, channel_df in long_df.groupby(
+            long_df['Channel'].astype(object), sort=False):
+        frames = {}
+        for stat_name, stat_df in channel_df.groupby(
+                channel_df['Stat'].astype(object), sort=False):
+            frame = stat_df.rename(columns={'value': 'stat'})
+            frame = frame.loc[:, columns].reset_index(drop=True)
+            for col in CATEGORICAL_COLUMNS:
+                if col in frame.columns:
+                    frame[col] = frame[col].astype(object)
+            frames[stat_name] = frame
+        panels[channel] = pd.Panel(frames)
+    return panels
+
+
+def _sorted_codes(series):
+    """
+    Integer codes of a column in the sorted order of its distinct values,
+    with -1 for NaN.
+
+    Output:
+      codes (numpy array), levels (numpy array): the code of each row and
+        the value of each code.
+    """
+    if str(series.dtype) == 'category':
+        categories = series.cat.categories.values
+        perm = np.argsort(categories, kind='mergesort')
+        rank = np.empty(len(perm), dtype=np.int64)
+        rank[perm] = np.arange(len(perm))
+        codes = series.cat.codes.values.astype(np.int64)
+        codes = np.where(codes >= 0, rank[codes], -1)
+        return codes, categories[perm]
+    codes, levels = pd.factorize(series.values, sort=True)
+    return codes.astype(np.int64), np.asarray(levels)
+
+
+def _event_codes(long_df):
+    """
+    The Event of each row, the Label followed by the Bin_Index, as codes in
+    the sorted order of the event names. Rows without a Label have code -1.
+
+    Output:
+      codes (numpy array), events (numpy array): the code of each row and
+        the name of each code.
+    """
+    label_codes, labels = _sorted_codes(long_df['Label'])
+    bin_codes, bins = _sorted_codes(long_df['Bin_Index'])
+    valid = (label_codes >= 0) & (bin_codes >= 0)
+
+    # Name each distinct (Label, Bin_Index) pair once. Pairs whose names
+    # coincide are the same event.
+    pairs = label_codes * max(len(bins), 1) + bin_codes
+    pairs, pair_codes = np.unique(pairs[valid], return_inverse=True)
+    names = np.array([labels[pair // max(len(bins), 1)] +
+                      str(bins[pair % max(len(bins), 1)])
+                      for pair in pairs], dtype=np.object)
+    events, name_codes = np.unique(names, return_inverse=True)
+
+    codes = np.full(len(long_df), -1, dtype=np.int64)
+    codes[valid] = name_codes[pair_codes]
+    return codes, events
+
+
+def pivot_long(long_df):
+    """
+    Spread the bins of each channel statistic of a long-format table into a
+    wide table with a column per Event (the Label followed by the Bin_Index)
+    and a row per combination of the PIVOT_INDEX_COLUMNS which are not all NaN
+    for that statistic. As with pd.pivot_table, rows with NaN in those
+    columns or in the Label are left out, and each table has the Events of
+    its own rows only. Of rows sharing a cell, the first value which is not
+    NaN is kept.
+
+    All the wide tables are unstacked at once, from the integer codes of
+    their row keys.
+
+    Output:
+      pivots (dict): {channel: {stat name: pandas DataFrame}}
+    """
+    if len(long_df) == 0:
+        return {}
+
+    channel_codes, channels = _sorted_codes(long_df['Channel'])
+    stat_codes, stats = _sorted_codes(long_df['Stat'])
+    event_codes, events = _event_codes(long_df)
+    key_codes = {}
+    key_levels = {}
+    for col in PIVOT_INDEX_COLUMNS:
+        key_codes[col], key_levels[col] = _sorted_codes(long_df[col])
+
+    # Whether each index column has any value within each channel statistic
+    table_codes = channel_codes * len(stats) + stat_codes
+    n_tables = len(channels) * len(stats)
+    used = {}
+    for col in PIVOT_INDEX_COLUMNS:
+        used[col] = np.bincount(table_codes[key_codes[col] >= 0],
+                                minlength=n_tables) > 0
+
+    # Rows missing a value of an index column in use are left out, as by
+    # the groupby of pd.pivot_table. Unused columns are all -1.
+    keep = event_codes >= 0
+    for col in PIVOT_INDEX_COLUMNS:
+        keep &= (key_codes[col] >= 0) | ~used[col][table_codes]
+    if not keep.any():
+        return {}
+
+    keys = [table_codes[keep]] + \
+        [key_codes[col][keep] for col in PIVOT_INDEX_COLUMNS] + \
+        [event_codes[keep]]
+    values = pd.Series(long_df['value'].values[keep])
+    wide = values.groupby(keys).first().unstack(-1)
+    wide_keys = [wide.index.get_level_values(level).values
+                 for level in range(len(keys) - 1)]
+    wide_values = wide.values
+    wide_events = events[wide.columns.values]
+
+    # The events of each table, as positions in the columns of wide
+    pairs = np.unique(table_codes[keep] * len(events) + event_codes[keep])
+    pair_bounds = np.searchsorted(pairs // len(events),
+                                  np.arange(n_tables + 1))
+    pair_cols = np.searchsorted(wide.columns.values, pairs % len(events))
+
+    pivots = {}
+    bounds = np.searchsorted(wide_keys[0], np.arange(n_tables + 1))
+    for table in range(n_tables):
+        rows = slice(bounds[table], bounds[table + 1])
+        if rows.start == rows.stop:
+            continue
+        index_cols = [col for col in PIVOT_INDEX_COLUMNS
+                      if used[col][table]]
+        arrays = [key_levels[col][wide_keys[1 + pos][rows]]
+                  for pos, col in enumerate(PIVOT_INDEX_COLUMNS)
+                  if used[col][table]]
+        if len(index_cols) == 1:
+            index = pd.Index(arrays[0], name=index_cols[0])
+        else:
+            index = pd.MultiIndex.from_arrays(arrays, names=index_cols)
+        event_cols = pair_cols[pair_bounds[table]:pair_bounds[table + 1]]
+        frame = pd.DataFrame(wide_values[rows][:, event_cols],
+                             index=index,
+                             columns=pd.Index(wide_events[event_cols],
+                                              name='Event'))
+        channel = channels[table // len(stats)]
+        pivots.setdefault(channel, {})[stats[table % len(stats)]] = frame
+    return pivots
+
+
+class OutputBuilder(object):
+    """
+    Collects the per-subject long-format outputs of each task and
+    concatenates them once, instead of growing the output with one pd.concat
+    per subject.
+
+    Args:
+      task_names (list): tasks to collect outputs for.
+      subjects (list): if given, the subjects in the order their blocks should
+        appear. One slot per subject is preallocated for each task.
+
+    Methods:
+      add: add one subject's long-format output for a task.
+      build: concatenate the collected outputs into {task: DataFrame}.
+    """
+
+    def __init__(self, task_names, subjects=None):
+        self.task_names = task_names
+        self.subjects = subjects
+        if subjects is not None:
+            self._slots = {subject_id: pos
+                           for pos, subject_id in enumerate(subjects)}
+            self.blocks = {task_name: [[] for _ in subjects]
+                           for task_name in task_names}
+        else:
+            self.blocks = {task_name: [] for task_name in task_names}
+
+    def add(self, task_name, subject_id, long_df):
+        """Add the output of one subject and data source for a task."""
+        slots = self.blocks[task_name]
+        if self.subjects is not None and subject_id in self._slots:
+            # A task may have several data sources, so each subject slot
+            # holds a list of outputs.
+            slots[self._slots[subject_id]].append(long_df)
+        else:
+            slots.append([long_df])
+
+    def build(self):
+        """Concatenate each task's outputs into one long-format table."""
+        return {task_name: concat_long([block
+                                        for slot in self.blocks[task_name]
+                                        for block in slot])
+                for task_name in self.task_names}
@@ -14,7 +14,8 @@ Methods:
     get_file_paths: return a dictionary of files for a given subject, task, and
       data source.
 
-    search: search the data_path for all files matching the patterns.
+    search: search the data_path for all files matching the patterns. See
+      indexer.FileIndexer.
 
     validate_schema: validate yaml contents against the schedule configuration
       schema.
@@ -33,11 +34,12 @@ Configuration schema (YAML):
   }
 """
 from schema import Schema
-import os
 import re
 import pandas as pd
 import numpy as np
 import functools
+from indexer import FileIndexer
+from validation import file_counts
 
 
 def memoize(obj):
@@ -65,6 +67,12 @@ class Schedule(object):
       path (str): path to YAML schedule configuration file.
       raw (dict): the dictionary resulting from the YAML configuration.
       sched_df (pands.DataFrame): a Pandas DataFrame listing all files found
+      search_timings (dict): seconds spent searching each data path during
+        the last compile.
+      index_report (dict): directories reused from the persistent index and
+        rescanned for each data path during the last compile.
+      file_index (dict): files dict of each (Subject, Task_Name,
+        Data_Source_Name) in sched_df, as returned by get_file_paths.
     """
 
     def __init__(self, raw):
@@ -73,25 +81,40 @@ class Schedule(object):
         self.subjects = []
         self.valid_subjects = []
         self.invalid_subjects = []
+        self.search_timings = {}
+        self.index_report = {}
+        self.file_index = {}
 
     @memoize
     def get_subschedule(self, task_name, data_source_name):
         """Fetches the schedule for a given task and data source."""
         return self.raw[task_name][data_source_name]
 
-    def compile(self, data_paths):
-        """Search the data path for the files to add to the schedule."""
+    def compile(self, data_paths, cache_dir=None, rebuild=False):
+        """
+        Search the data path for the files to add to the schedule.
+
+        Args:
+          data_paths (list): paths to search for files.
+          cache_dir (str): if given, keep a persistent index of each data path
+            here so that later compiles only rescan changed directories.
+          rebuild (bool): ignore the persistent index and rescan everything.
+        """
         # TODO(janmtl): this should accept globs
         # TODO(janmtl): should be able to pass a list of excluded subjects
 
         if not isinstance(data_paths, list):
             data_paths = list(data_paths)
 
-        files_df = self.search(self.raw, data_paths)
+        indexer = FileIndexer(self.raw, cache_dir=cache_dir, rebuild=rebuild)
+        files_df = indexer.search(data_paths)
+        self.search_timings = indexer.timings
+        self.index_report = indexer.report
         self.sched_df = self._resolve(files_df)
         self.sched_df[['Subject', 'Task_Order']] = \
             self.sched_df[['Subject', 'Task_Order']].astype(np.int64)
         self.subjects = list(np.unique(self.sched_df['Subject']))
+        self.file_index = self._build_file_index(self.sched_df)
 
     # TODO(janmtl): The function that checks the integrity of a subject's data
     # should also return which subjects are broken and why
@@ -99,76 +122,71 @@ class Schedule(object):
     def validate_files(self):
         """Iterate over subjects and make sure that they all have all the files
         they need."""
-        cf = (self.sched_df.pivot_table(index='Subject',
-                                        columns=['Data_Source_Name',
-                                                 'Task_Name',
-                                                 'File'],
-                                        values='Path',
-                                        aggfunc=lambda x: len(x)) == 1)
-        return cf
+        return file_counts(self.sched_df) == 1
 
     def remove_subject(self, subject_id):
         self.sched_df = self.sched_df[self.sched_df['Subject'] != subject_id]
+        self._filter_file_index(lambda idx: idx[0] != subject_id)
         if subject_id in self.subjects:
             self.subjects.remove(subject_id)
 
     def isolate_subjects(self, subject_ids):
         self.sched_df = self.sched_df[self.sched_df['Subject']
                                       .isin(subject_ids)]
+        subject_ids_set = set(subject_ids)
+        self._filter_file_index(lambda idx: idx[0] in subject_ids_set)
         self.subjects = subject_ids
 
     def isolate_tasks(self, task_names):
         self.sched_df = self.sched_df[self.sched_df['Task_Name']
                                       .isin(task_names)]
+        self._filter_file_index(lambda idx: idx[1] in task_names)
 
     def isolate_data_sources(self, data_source_names):
         self.sched_df = self.sched_df[self.sched_df['Data_Source_Name']
                                       .isin(data_source_names)]
+        self._filter_file_index(lambda idx: idx[2] in data_source_names)
 
     def get_file_paths(self, subject_id, task_name, data_source_name):
         """Return all a dictionary of all files for a given subject, task,
         and data source."""
-        if self.sched_df.empty:
+        if self.sched_df is None or self.sched_df.empty:
             raise Exception('Schedule is empty, try Schedule.compile(path).')
-        sub_df = self.sched_df[
-            (self.sched_df['Subject'] == subject_id)
-            & (self.sched_df['Task_Name'] == task_name)
-            & (self.sched_df['Data_Source_Name'] == data_source_name)
-            ]
-        if sub_df.empty:
+        idx = (subject_id, task_name, data_source_name)
+        if idx not in self.file_index:
             raise Exception(
                 '({}, {}, {}) not found in schedule.'.format(subject_id,
                                                              task_name,
                                                              data_source_name)
                 )
-        list_of_files = sub_df[['File', 'Path']].to_dict('records')
-        files_dict = {ds['File']: ds['Path'] for ds in list_of_files}
-        return files_dict
+        return dict(self.file_index[idx])
+
+    def _filter_file_index(self, keep):
+        """Keep only the file index entries whose key satisfies keep."""
+        self.file_index = {idx: files_dict
+                           for idx, files_dict in self.file_index.iteritems()
+                           if keep(idx)}
+
+    @staticmethod
+    def _build_file_index(sched_df):
+        """
+        Map each (Subject, Task_Name, Data_Source_Name) in sched_df to its
+        dictionary of files.
+        """
+        file_index = {}
+        for subject_id, task_name, data_source_name, file_type, path in zip(
+                sched_df['Subject'], sched_df['Task_Name'],
+                sched_df['Data_Source_Name'], sched_df['File'],
+                sched_df['Path']):
+            idx = (subject_id, task_name, data_source_name)
+            file_index.setdefault(idx, {})[file_type] = path
+        return file_index
 
     @staticmethod
     def search(raw, data_paths):
         """Search the data paths for matching file patterns and return a pandas
         DataFrame of the results."""
-        files_dict = []
-        for task_name, task in raw.iteritems():
-            for data_source_name, patterns in task.iteritems():
-                for pattern_name, pattern in patterns.iteritems():
-                    for data_path in data_paths:
-                        for root, _, files in os.walk(data_path):
-                            for filepath in files:
-                                file_match = re.match(pattern, filepath)
-                                if file_match:
-                                    fd = file_match.groupdict()
-                                    fd['Task_Name'] = task_name
-                                    fd['Data_Source_Name'] = data_source_name
-                                    fd['File'] = pattern_name
-                                    fd['Path'] = os.path.join(root, filepath)
-                                    files_dict.append(fd)
-        files_df = pd.DataFrame(files_dict)
-        files_df.fillna({'Task_Order': 0}, inplace=True)
-        files_df[['Subject', 'Task_Order']] = \
-            files_df[['Subject', 'Task_Order']].astype(np.int64)
-        return files_df
+        return FileIndexer(raw).search(data_paths)
 
     @staticmethod
     def _resolve(files_df):
@@ -36,22 +36,43 @@ def get_renaming_dict(df, old_prefix, new_prefix):
     return re_dict
 
 
-def merge_and_rename_columns(df, new_name, old_names):
+def _coalesce_names(new_name, old_names):
+    """List the columns that new_name is filled from, in order."""
+    if type(old_names) is not list:
+        return [old_names]
+    if new_name in old_names:
+        return [new_name] + old_names
+    return list(old_names)
+
+
+def coalesce_columns(df, mapping):
     """
-    Create new_name column by filling in non-nan values from old_names in order.
+    Build every new_name column of mapping {new_name: old_names} from the first
+    non-nan value of its old_names, in order, as merge_and_rename_columns does.
+    All the old_names are read from df as it is, and df is not copied.
     """
-    res = df.copy(deep=True)
+    new_columns = {}
+    for new_name, old_names in mapping.iteritems():
+        names = _coalesce_names(new_name, old_names)
+        if len(names) == 1:
+            new_columns[new_name] = df[names[0]]
+            continue
 
-    if type(old_names) is not list:
-        if new_name != old_names:
-            res[new_name] = np.nan
-        sel = ~pd.notnull(res[new_name])
-        res.loc[sel, new_name] = res.loc[sel, old_names]
-    else:
+        values = df[names].values
+        valid = pd.notnull(values)
+        first = valid.argmax(axis=1)
+        column = values[np.arange(len(values)), first]
         if new_name not in old_names:
-            res[new_name] = np.nan
-        for old_name in old_names:
-            sel = ~pd.notnull(res[new_name])
-            res.loc[sel, new_name] = res.loc[sel, old_name]
+            column[~valid.any(axis=1)] = np.nan
+        new_columns[new_name] = pd.Series(column, index=df.index)
+    return pd.DataFrame(new_columns, index=df.index,
+                        columns=list(mapping.keys()))
 
+
+def merge_and_rename_columns(df, new_name, old_names):
+    """
+    Create new_name column by filling in non-nan values from old_names in order.
+    """
+    res = df.copy(deep=True)
+    res[new_name] = coalesce_columns(df, {new_name: old_names})[new_name]
     return res
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Validation tables of the files scheduled for an experiment.
+
+The status of every (Subject, Data_Source_Name, Task_Name, File) is kept in a
+long table whose Status column is a categorical of STATUSES:
+
+  Found: exactly one file was scheduled and it passed its check.
+  Corrupt: exactly one file was scheduled but it failed its check.
+  Missing: no file, or more than one, was scheduled.
+
+Every subject of the schedule has a row for every file scheduled for any
+subject. The tables are built with native group sizes and unstacking, without
+a Python call per cell.
+"""
+import pandas as pd
+import numpy as np
+
+STATUSES = ['Found', 'Corrupt', 'Missing']
+
+# The columns identifying a file of a subject, the wide matrices have one
+# column per combination of them.
+FILE_COLUMNS = ['Data_Source_Name', 'Task_Name', 'File']
+
+VALIDATION_COLUMNS = ['Subject'] + FILE_COLUMNS + ['Status']
+
+
+def file_counts(sched_df):
+    """
+    The number of scheduled files of each subject, as a wide matrix with a
+    row per Subject and a column per combination of FILE_COLUMNS.
+    """
+    counts = sched_df.groupby(['Subject'] + FILE_COLUMNS).size()
+    return counts.unstack(FILE_COLUMNS).fillna(0).astype(np.int64)
+
+
+def status_table(counts, checks=None):
+    """
+    The long validation table of the scheduled files.
+
+    Args:
+      counts (pandas DataFrame): the file counts, as from file_counts.
+      checks (pandas DataFrame): if given, the outcome of checking the files,
+        with the Subject and FILE_COLUMNS columns and a boolean Passed column.
+        Found files which failed their check are Corrupt. Files not checked
+        are taken to pass.
+
+    Output:
+      table (pandas DataFrame): the VALIDATION_COLUMNS, ordered by Subject and
+        then by file.
+    """
+    codes = np.where(counts.values == 1, 0, 2).astype(np.int8)
+
+    if checks is not None and len(checks) > 0:
+        failed = checks.loc[~checks['Passed'].astype(bool), :]
+        rows = counts.index.get_indexer(failed['Subject'])
+        cols = counts.columns.get_indexer(pd.MultiIndex.from_arrays(
+            [failed[col].values for col in FILE_COLUMNS]))
+        sel = (rows >= 0) & (cols >= 0)
+        rows, cols = rows[sel], cols[sel]
+        found = codes[rows, cols] == 0
+        codes[rows[found], cols[found]] = 1
+
+    n_subjects, n_files = codes.shape
+    table = pd.DataFrame({'Subject': np.repeat(counts.index.values, n_files)})
+    for level, col in enumerate(FILE_COLUMNS):
+        table[col] = np.tile(counts.columns.get_level_values(level).values,
+                             n_subjects)
+    table['Status'] = pd.Categorical.from_codes(codes.ravel(), STATUSES)
+    return table
+
+
+def status_matrix(table):
+    """
+    Unstack a long validation table into the wide matrix of statuses, with a
+    row per Subject and a column per combination of FILE_COLUMNS. Cells
+    without a row in the table are Missing.
+    """
+    codes = pd.Series(table['Status'].cat.codes.values,
+                      index=pd.MultiIndex.from_arrays(
+                          [table[col].values
+                           for col in ['Subject'] + FILE_COLUMNS],
+                          names=['Subject'] + FILE_COLUMNS))
+    codes = codes.unstack(FILE_COLUMNS).fillna(STATUSES.index('Missing'))
+    statuses = np.asarray(STATUSES, dtype=np.object)
+    return pd.DataFrame(statuses[codes.values.astype(np.int8)],
+                        index=codes.index,
+                        columns=codes.columns)
@@ -10,6 +10,7 @@ Tests for `BeGaze` Data Source provided in pypsych.data_sources.begaze module.
 
 
 import unittest
+import yaml
 import pandas as pd
 import numpy as np
 pd.set_option('display.max_rows', 50)
@@ -18,7 +19,8 @@ pd.set_option('display.width', 1000)
 from pkg_resources import resource_filename
 from pypsych.config import Config
 from pypsych.schedule import Schedule
-from pypsych.data_sources.begaze import BeGaze
+from pypsych.data_sources.begaze import BeGaze, DEFAULT_INTERPOLATION_WINDOW
+from pypsych.data_sources.interpolation import interpolate_gaps
 
 
 def assert_labelsdfs_equality(df1, df2):
@@ -152,5 +154,102 @@ class BeGazeBinData(unittest.TestCase):
         # TODO: check the output of this test
         self.begaze.bin_data()
 
+
+class BeGazeSamplesLoading(unittest.TestCase):
+    """
+    Tests that only the used columns of the samples file are read, that
+    streamed samples match them, and that the options are validated.
+    """
+
+    def setUp(self):
+        config_path = resource_filename('tests.config', 'config.yaml')
+        schedule_path = resource_filename('tests.schedule', 'schedule.yaml')
+        config = Config(yaml.load(open(config_path, 'r')))
+        schedule = Schedule(yaml.load(open(schedule_path, 'r')))
+        schedule.compile(['tests/data'])
+
+        self.subconfig = config.get_subconfig('Mock2', 'BeGaze')
+        self.subschedule = schedule.get_subschedule('Mock2', 'BeGaze')
+        self.file_paths = schedule.get_file_paths(101, 'Mock2', 'BeGaze')
+
+    def load_begaze(self, options=None):
+        subconfig = dict(self.subconfig)
+        if options is not None:
+            subconfig['Options'] = options
+        begaze = BeGaze(config=subconfig, schedule=self.subschedule)
+        begaze.load(self.file_paths)
+        return begaze
+
+    def test_samples_columns(self):
+        """Only the columns used in cleaning should be read."""
+        begaze = self.load_begaze()
+        self.assertEqual(sorted(begaze.data['samples'].columns),
+                         sorted(BeGaze.samples_dtypes.keys()))
+
+    def test_samples_dtypes(self):
+        """Selected samples should be equal to all columns after cleaning."""
+        full = pd.read_csv(self.file_paths['samples'],
+                           comment="#",
+                           delimiter="\t",
+                           skipinitialspace=True)
+        begaze = self.load_begaze()
+        samples = begaze.data['samples']
+        self.assertEqual(str(samples['L Event Info'].dtype), 'category')
+        pd.util.testing.assert_frame_equal(begaze._clean_samples(samples),
+                                           begaze._clean_samples(full))
+
+    def test_interpolation_window(self):
+        """Gaps are filled locally by default, or by one global fit."""
+        begaze = self.load_begaze()
+        samples = begaze.data['samples']
+        diameter = samples['L Pupil Diameter [mm]'].values.copy()
+        diameter[samples['L Event Info'].values != 'Fixation'] = np.nan
+        times = (samples['Time'].values - samples['Time'].values[0]) / 1000
+        for options, window in [(None, DEFAULT_INTERPOLATION_WINDOW),
+                                ({'interpolation': {'window': 20}}, 20),
+                                ({'interpolation': {'window': None}}, None)]:
+            begaze = self.load_begaze(options)
+            cleaned = begaze._clean_samples(begaze.data['samples'])
+            np.testing.assert_array_equal(
+                cleaned['LDiameter'].values,
+                interpolate_gaps(times, diameter, order=3, window=window))
+
+    def test_chunked_bins(self):
+        """Samples streamed in chunks are cleaned and binned as a whole."""
+        options = {'interpolation': {'window': 10}}
+        whole = self.load_begaze(options)
+        whole.merge_data()
+        whole.bin_data()
+        for chunksize in [7, 50, 2000]:
+            begaze = self.load_begaze(dict(options, chunksize=chunksize))
+            self.assertNotIn('samples', begaze.data)
+            self.assertTrue(begaze.validate_data()['samples'])
+            begaze.merge_data()
+            pd.util.testing.assert_frame_equal(
+                pd.concat(begaze._stream_samples()), whole.data['samples'])
+
+            begaze.bin_data()
+            self.assertEqual(list(begaze.output['Stat']),
+                             list(whole.output['Stat']))
+            np.testing.assert_allclose(
+                begaze.output['value'].values.astype(np.float64),
+                whole.output['value'].values.astype(np.float64),
+                rtol=1e-12, atol=1e-12)
+
+    def test_bad_options(self):
+        """Unknown options should not validate."""
+        with self.assertRaises(Exception):
+            self.load_begaze({'no such option': 1})
+        # Windows must hold enough samples for the spline
+        with self.assertRaises(Exception):
+            self.load_begaze({'interpolation': {'window': 3}})
+        self.load_begaze({'interpolation': {'window': 4}})
+        # Streamed samples need a window
+        with self.assertRaises(Exception):
+            self.load_begaze({'chunksize': 0})
+        with self.assertRaises(Exception):
+            self.load_begaze({'chunksize': 100,
+                              'interpolation': {'window': None}})
+
 if __name__ == '__main__':
     unittest.main()
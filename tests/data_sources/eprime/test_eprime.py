@@ -9,6 +9,10 @@ Tests for `EPrime` Data Source provided in pypsych.data_sources.eprime module.
 """
 
 
+import io
+import os
+import shutil
+import tempfile
 import unittest
 import pandas as pd
 pd.set_option('display.max_rows', 50)
@@ -17,7 +21,25 @@ pd.set_option('display.width', 1000)
 from pkg_resources import resource_filename
 from pypsych.config import Config
 from pypsych.schedule import Schedule
-from pypsych.data_sources.eprime import EPrime
+from pypsych.data_sources.eprime import EPrime, read_kv_frames
+
+
+def _read_whole(file_path):
+    """Reference parser splitting the whole decoded file at once."""
+    with io.open(file_path, 'r', encoding="utf-16") as kv_file:
+        raw = kv_file.read()
+        raw = raw.replace('\t', '')
+        raw = raw.replace('*** LogFrame End ***', '')
+        arr = raw.split('*** LogFrame Start ***')
+        frames = []
+        for frame in arr:
+            lines = frame.split('\n')
+            lines = [line.split(':', 1) for line in lines]
+            d = {line[0].strip(' '): line[1].strip(' ')
+                 for line in lines
+                 if len(line) == 2}
+            frames.append(d)
+        return pd.DataFrame.from_dict(frames)
 
 
 class EprimeLoading(unittest.TestCase):
@@ -79,5 +101,48 @@ class EPrimeBinData(unittest.TestCase):
         """Test if stats are being calculated correctly."""
         self.eprime.bin_data()
 
+
+class KVFramesParsing(unittest.TestCase):
+    """
+    Asserts that the streaming edat parser matches splitting the whole file.
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write_edat(self, text):
+        file_path = os.path.join(self.tmp_dir, 'edat.txt')
+        with io.open(file_path, 'w', encoding='utf-16') as kv_file:
+            kv_file.write(text)
+        return file_path
+
+    def test_test_data(self):
+        for filename in ['Mock1_1011_eprime.txt', 'Mock1_1021_eprime.txt',
+                         'Mock2_1012_eprime.txt']:
+            file_path = os.path.join('tests', 'data', filename)
+            pd.util.testing.assert_frame_equal(read_kv_frames(file_path),
+                                               _read_whole(file_path))
+
+    def test_irregular_frames(self):
+        text = (u'*** Header Start ***\nVersion: 1\n*** Header End ***\n'
+                u'\t*** LogFrame Start ***\n\tA: 1\n\tB:  x: y \n'
+                u'\t*** LogFrame End ***\n\tLevel: 2\n'
+                u'\t*** LogFrame Start ***\n\tB: 2\n\tB: 3\n'
+                u'\tC\t: caf\xe9\n\t*** LogFrame End ***\n'
+                u'\t*** LogFrame Start ***\n\t*** LogFrame End ***\n'
+                u'\t*** LogFrame Start ***\n\tA: 4\n')
+        file_path = self.write_edat(text)
+        frames = read_kv_frames(file_path)
+        pd.util.testing.assert_frame_equal(frames, _read_whole(file_path))
+        self.assertEqual(list(frames['B'].values[1:3]), [u'x: y', u'3'])
+
+        frames = read_kv_frames(file_path, keys=['A', 'C'])
+        self.assertEqual(list(frames.columns), ['A', 'C'])
+        pd.util.testing.assert_frame_equal(
+            frames, _read_whole(file_path).loc[:, ['A', 'C']])
+
 if __name__ == '__main__':
     unittest.main()
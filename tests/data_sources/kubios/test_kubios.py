@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_kubios
+----------------------------------
+
+Tests for `Kubios` Data Source provided in pypsych.data_sources.kubios module.
+"""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+import numpy as np
+from io import StringIO
+from scipy.io import savemat
+from pypsych.data_sources.kubios import Kubios, read_time_varying, \
+    section_range
+from pypsych.data_sources.sample_cache import SampleCache
+
+HEADER = ['; Time; Mean RR; STD RR; VLF power; VLF power; LF/HF ratio; '
+          'ApEn; Artefacts; ',
+          '; (s); (ms); (ms); (ms^2); (%); ; ; (%); ']
+
+
+def _read_concatenated(file_path):
+    """Reference reader concatenating the lines of the section."""
+    fbuffer = ""
+    with open(file_path, 'r') as f:
+        reader = False
+        for line in f:
+            if "TIME-VARYING RESULTS" in line:
+                reader = True
+            elif reader & ("RR INTERVAL DATA" in line):
+                reader = False
+            if reader:
+                fbuffer = fbuffer + line
+
+    df = pd.read_csv(StringIO(unicode(fbuffer)),
+                     delimiter=";",
+                     skipinitialspace=True,
+                     index_col=False,
+                     skiprows=3)
+    newcolumns = ["{} {}".format(*col)
+                  for col in zip(df.columns[1:-2],
+                                 df.iloc[0, 1:-2].fillna(""))]
+    df = df.iloc[1:, 1:-2]
+    df.columns = newcolumns
+    return df.astype(np.float)
+
+
+def write_report(path, n_rows, newline='\n', seed=0):
+    """Write a Kubios-like report with n_rows of time-varying results."""
+    rng = np.random.RandomState(seed)
+    lines = ['Kubios HRV analysis', '', 'RESULTS FOR SINGLE SAMPLES', '',
+             'TIME-VARYING RESULTS', 'Window width: 30 s', '']
+    lines.extend(HEADER)
+    for row in range(n_rows):
+        values = rng.uniform(0, 1000, size=7)
+        lines.append('; {:.3f}; '.format(row * 0.5)
+                     + '; '.join('{:.4f}'.format(v) for v in values)
+                     + '; ')
+    lines.extend(['', 'RR INTERVAL DATA', '; Time; RR; ', '; 0.1; 812; '])
+    with open(path, 'wb') as f:
+        f.write(newline.join(lines) + newline)
+
+
+class KubiosReaderTestCases(unittest.TestCase):
+    """
+    Asserts that the time-varying results are read as by concatenating the
+    lines of their section.
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_matches_concatenated(self):
+        for newline in ['\n', '\r\n']:
+            path = os.path.join(self.tmp_dir, 'report.txt')
+            write_report(path, 50, newline=newline)
+            samples = read_time_varying(path)
+            pd.util.testing.assert_frame_equal(samples,
+                                               _read_concatenated(path))
+            self.assertEqual(samples.shape, (50, 7))
+            self.assertEqual(samples.columns[0], 'Time (s)')
+
+    def test_section_range(self):
+        report = b'a\nx TIME-VARYING RESULTS\n1\n\nRR INTERVAL DATA\n2\n'
+        start, end = section_range(report)
+        self.assertEqual(report[start:end], b'x TIME-VARYING RESULTS\n1\n\n')
+        self.assertEqual(section_range(b'a\nTIME-VARYING RESULTS\n1'),
+                         (2, 24))
+        self.assertIsNone(section_range(b'RR INTERVAL DATA\n'))
+
+    def test_check_files(self):
+        """Reports are checked for rows without being parsed."""
+        kubios = Kubios({'Event': {'duration': 1000, 'bins': 1,
+                                   'pattern': 1}},
+                        {'samples': '.*', 'labels': '.*'})
+        labels_path = os.path.join(self.tmp_dir, 'labels.mat')
+        savemat(labels_path, {'events': np.array([[255, 1, 1, 255, 2]]).T})
+        for n_rows, expected in [(0, False), (1, False), (2, True)]:
+            samples_path = os.path.join(self.tmp_dir, 'report.txt')
+            write_report(samples_path, n_rows)
+            self.assertEqual(kubios.check_files({'samples': samples_path,
+                                                 'labels': labels_path}),
+                             {'samples': expected, 'labels': True})
+        self.assertEqual(kubios.check_files({'samples': labels_path}),
+                         {'samples': False, 'labels': False})
+
+    def test_cached(self):
+        """The merged data of a report is cached by the file hashes."""
+        samples_path = os.path.join(self.tmp_dir, 'report.txt')
+        labels_path = os.path.join(self.tmp_dir, 'labels.mat')
+        write_report(samples_path, 20)
+        savemat(labels_path, {'events': np.array([[255, 1, 1, 255, 2]]).T})
+        file_paths = {'samples': samples_path, 'labels': labels_path}
+
+        kubios = Kubios({'Event': {'duration': 1000, 'bins': 1,
+                                   'pattern': 1}},
+                        {'samples': '.*', 'labels': '.*'})
+        kubios.sample_cache = SampleCache(os.path.join(self.tmp_dir, 'cache'))
+        kubios.load_and_merge(file_paths)
+        merged = kubios.data['samples']
+        kubios.load_and_merge(file_paths)
+        self.assertEqual((kubios.sample_cache.hits,
+                          kubios.sample_cache.misses), (1, 1))
+        pd.util.testing.assert_frame_equal(kubios.data['samples'], merged)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_mask_store
+----------------------------------
+
+Tests for the MaskStore class provided in pypsych.data_sources.mask_store
+module.
+"""
+
+
+import os
+import shutil
+import pickle
+import tempfile
+import unittest
+import numpy as np
+from PIL import Image
+from pypsych.data_sources.mask_store import MaskStore, read_mask, mask_bits, \
+    unpack_mask
+
+MASK_SIZE = [13, 7]
+COLOR = [0, 255, 0]
+
+
+class MaskStoreTestCases(unittest.TestCase):
+    """
+    Asserts that the packed masks match the decoded bitmaps, that the masks
+    of an ID are compiled on its first lookup, and that they are reused until
+    one of its bitmaps changes.
+    """
+
+    def setUp(self):
+        self.rng = np.random.RandomState(3)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.store_dir = os.path.join(self.tmp_dir, 'store')
+        self.coders = {}
+        for coder in ['A', 'B']:
+            path = os.path.join(self.tmp_dir, coder)
+            os.makedirs(path)
+            for mask_id in ['2', '1', '3']:
+                self.write_bitmap(os.path.join(path, mask_id + '.png'))
+            self.coders[coder] = {'path': path,
+                                  'pattern': r'(?P<ID>[0-9]+)\.png',
+                                  'color': COLOR}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write_bitmap(self, path):
+        img = np.zeros((MASK_SIZE[1], MASK_SIZE[0], 3), dtype=np.uint8)
+        img[self.rng.uniform(size=img.shape[:2]) > 0.5] = COLOR
+        Image.fromarray(img).save(path)
+
+    def assert_matches_bitmaps(self, store):
+        for mask_id in ['1', '2', '3']:
+            packed, areas = store.get(mask_id)
+            self.assertEqual(packed.shape[0], 2)
+            for row, coder in enumerate(['A', 'B']):
+                path = os.path.join(self.coders[coder]['path'],
+                                    mask_id + '.png')
+                mask_vec = read_mask(path, MASK_SIZE, COLOR)
+                np.testing.assert_array_equal(
+                    unpack_mask(packed[row], MASK_SIZE), mask_vec)
+                self.assertEqual(areas[row], mask_vec.sum())
+
+                bits = mask_bits(packed, np.arange(mask_vec.size))
+                np.testing.assert_array_equal(bits[row], mask_vec)
+        self.assertIsNone(store.get('4'))
+
+    def test_pixel_layout(self):
+        """The pixel at column x and row y is at x + width*y."""
+        img = np.zeros((MASK_SIZE[1], MASK_SIZE[0], 3), dtype=np.uint8)
+        img[2, 10] = COLOR
+        path = os.path.join(self.tmp_dir, 'pixel.png')
+        Image.fromarray(img).save(path)
+        mask_vec = read_mask(path, MASK_SIZE, COLOR)
+        self.assertEqual(list(np.flatnonzero(mask_vec)),
+                         [10 + MASK_SIZE[0] * 2])
+
+    def test_in_memory(self):
+        store = MaskStore(self.coders, MASK_SIZE)
+        self.assert_matches_bitmaps(store)
+        self.assertEqual(store.compiled, 0)
+        self.assertIsNone(store.mask_path('1'))
+        self.assertEqual(store.warm_up(), 0)
+
+    def test_compiled_store(self):
+        store = MaskStore(self.coders, MASK_SIZE, self.store_dir)
+        self.assertFalse(os.path.isdir(self.store_dir))
+
+        # Only the IDs looked up are compiled
+        store.get('2')
+        self.assertEqual(store.compiled, 1)
+        self.assertEqual(os.listdir(self.store_dir),
+                         [os.path.basename(store.mask_path('2'))])
+        self.assertFalse(os.path.isfile(store.mask_path('1')))
+        self.assert_matches_bitmaps(store)
+        self.assertEqual(store.compiled, 3)
+
+        # A second load reads the masks back as memory maps
+        store = MaskStore(self.coders, MASK_SIZE, self.store_dir)
+        self.assert_matches_bitmaps(store)
+        self.assertEqual(store.compiled, 0)
+        self.assertIsInstance(store.get('1')[0], np.memmap)
+
+        # Pickling drops the loaded masks
+        state = pickle.loads(pickle.dumps(store))
+        self.assertEqual(len(state._cache), 0)
+        self.assert_matches_bitmaps(state)
+
+    def test_warm_up(self):
+        store = MaskStore(self.coders, MASK_SIZE, self.store_dir)
+        store.get('1')
+        self.assertEqual(store.warm_up(), 2)
+        self.assertEqual(len(os.listdir(self.store_dir)), 3)
+        self.assertEqual(store.warm_up(), 0)
+        self.assertEqual(len(store._cache), 1)
+
+        store = MaskStore(self.coders, MASK_SIZE, self.store_dir)
+        self.assert_matches_bitmaps(store)
+        self.assertEqual(store.compiled, 0)
+
+    def test_invalidation(self):
+        store = MaskStore(self.coders, MASK_SIZE, self.store_dir)
+        store.warm_up()
+        path = os.path.join(self.coders['B']['path'], '3.png')
+        self.write_bitmap(path)
+        stat = os.stat(path)
+        os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+
+        # Only the ID of the modified bitmap is compiled again
+        new_store = MaskStore(self.coders, MASK_SIZE, self.store_dir)
+        self.assertNotEqual(new_store.mask_path('3'), store.mask_path('3'))
+        self.assertEqual(new_store.mask_path('1'), store.mask_path('1'))
+        self.assert_matches_bitmaps(new_store)
+        self.assertEqual(new_store.compiled, 1)
+
+    def test_lru(self):
+        store = MaskStore(self.coders, MASK_SIZE, cache_size=2)
+        for mask_id in ['1', '2', '1', '3', '2', '1']:
+            store.get(mask_id)
+        # '2' is evicted by '3', then '1' by '2'
+        self.assertEqual((store.hits, store.misses), (1, 5))
+        self.assertEqual(list(store._cache.keys()), ['2', '1'])
+
+    def test_small_caches(self):
+        lookups = ['1', '1', '2', '1', '4']
+        store = MaskStore(self.coders, MASK_SIZE, cache_size=0)
+        for mask_id in lookups:
+            store.get(mask_id)
+        self.assertEqual((store.hits, store.misses), (0, 5))
+        self.assertEqual(len(store._cache), 0)
+        self.assert_matches_bitmaps(store)
+
+        store = MaskStore(self.coders, MASK_SIZE, cache_size=1)
+        for mask_id in lookups:
+            store.get(mask_id)
+        self.assertEqual((store.hits, store.misses), (1, 4))
+        self.assertEqual(list(store._cache.keys()), ['4'])
+        self.assert_matches_bitmaps(store)
+
+if __name__ == '__main__':
+    unittest.main()
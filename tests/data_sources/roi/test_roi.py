@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_roi
+----------------------------------
+
+Tests for `BeGazeROI` Data Source provided in pypsych.data_sources.roi module.
+"""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+import yaml
+import pandas as pd
+import numpy as np
+from PIL import Image
+from pkg_resources import resource_filename
+from pypsych.config import Config
+from pypsych.schedule import Schedule
+from pypsych.data_sources.roi import BeGazeROI
+from pypsych.data_sources.mask_store import read_mask
+from pypsych.data_sources.binning import bin_bounds, Segments, SegmentMoments
+
+SCREEN_SIZE = [40, 30]
+MASK_SIZE = [12, 8]
+MASK_POSITION = [5, 4]
+COLOR = [255, 0, 0]
+
+
+def _loop_rates(roi, xy, pos, label_bin):
+    """Reference implementation looking up one gaze point at a time."""
+    files = roi.mask_store.files
+    coded_rates = []
+    onmask_rates = []
+    for _, mask in files.loc[files['ID'] == label_bin['ID'], :].iterrows():
+        mask_vec = read_mask(mask['Path'], roi.mask_size, COLOR)
+        x = np.remainder(xy, roi.screen_size[0]) - roi.mask_position[0]
+        y = np.floor(np.divide(xy, roi.screen_size[0])) \
+            - roi.mask_position[1]
+        sel_onmask = (x > 0) & (x < roi.mask_size[0]) & \
+                     (y > 0) & (y < roi.mask_size[1])
+        mxy = (x + roi.mask_size[0] * y)[sel_onmask]
+        hits = 0.0
+        for p in mxy:
+            if mask_vec[int(p)]:
+                hits = hits + 1.0
+        coded_rates.append(hits / float(mask_vec.sum() * (np.sum(pos)+1)))
+        onmask_rates.append(np.mean(sel_onmask))
+    if not coded_rates:
+        return np.nan, np.nan
+    return np.mean(coded_rates), np.mean(onmask_rates)
+
+
+class BeGazeROIRatesTestCases(unittest.TestCase):
+    """
+    Asserts that the vectorized CODEDRATE and ONMASKRATE match a lookup of
+    every gaze point in every mask.
+    """
+
+    def setUp(self):
+        rng = np.random.RandomState(7)
+        self.mask_dir = tempfile.mkdtemp()
+        coders = {}
+        for coder in ['A', 'B']:
+            path = os.path.join(self.mask_dir, coder)
+            os.makedirs(path)
+            for mask_id in ['1.0', '2.0']:
+                img = np.zeros((MASK_SIZE[1], MASK_SIZE[0], 3), dtype=np.uint8)
+                img[rng.uniform(size=img.shape[:2]) > 0.5] = COLOR
+                Image.fromarray(img).save(
+                    os.path.join(path, '{}.png'.format(mask_id)))
+            coders[coder] = {'path': path,
+                             'pattern': r'(?P<ID>[0-9\.]+)\.png',
+                             'color': COLOR}
+
+        config_path = resource_filename('tests.config', 'config.yaml')
+        schedule_path = resource_filename('tests.schedule', 'schedule.yaml')
+        config = Config(yaml.load(open(config_path, 'r')))
+        schedule = Schedule(yaml.load(open(schedule_path, 'r')))
+        self.roi_config = {'Labels': config.get_subconfig('Mock2', 'BeGaze'),
+                           'ScreenSize': SCREEN_SIZE,
+                           'MaskSize': MASK_SIZE,
+                           'MaskPosition': MASK_POSITION,
+                           'Coders': coders}
+        self.roi_schedule = schedule.get_subschedule('Mock2', 'BeGaze')
+        self.roi = BeGazeROI(self.roi_config, self.roi_schedule)
+
+        # Gaze samples over the whole screen, with some invalid ones
+        n_samples = 3000
+        x = rng.uniform(0, SCREEN_SIZE[0], n_samples)
+        y = rng.randint(0, SCREEN_SIZE[1], n_samples)
+        xy = x + SCREEN_SIZE[0] * y
+        pos = rng.uniform(size=n_samples) > 0.1
+        xy[~pos] = np.nan
+        self.index = np.arange(n_samples) * 2.0
+        self.xy = xy
+        self.pos = pos
+
+        self.label_bins = pd.DataFrame({
+            'ID': ['1.0', '2.0', '3.0', '1.0', '2.0', '1.0'],
+            'Start_Time': [0.0, 1000.0, 2000.0, 2500.0, 5000.0, 9000.0],
+            'End_Time': [1000.0, 2200.0, 3000.0, 4000.0, 6000.0, 9500.0]})
+
+    def tearDown(self):
+        shutil.rmtree(self.mask_dir)
+
+    def test_rates_match_loop(self):
+        first, last = bin_bounds(self.index,
+                                 self.label_bins['Start_Time'].values,
+                                 self.label_bins['End_Time'].values)
+        moments = SegmentMoments(self.xy, self.pos, self.index,
+                                 Segments(first, last),
+                                 label_bins=self.label_bins)
+        coded_rates = self.roi._coded_rates(moments)
+        onmask_rates = self.roi._onmask_rates(moments)
+
+        for b, (_, label_bin) in enumerate(self.label_bins.iterrows()):
+            xy = pd.Series(self.xy[first[b]:last[b]])
+            pos = pd.Series(self.pos[first[b]:last[b]])
+            coded_rate, onmask_rate = _loop_rates(self.roi, xy, pos,
+                                                  label_bin)
+            np.testing.assert_allclose(coded_rates[b], coded_rate,
+                                       rtol=1e-12)
+            np.testing.assert_allclose(onmask_rates[b], onmask_rate,
+                                       rtol=1e-12)
+
+        # Bins of an ID without masks, and empty bins, have no rates
+        self.assertTrue(np.isnan(coded_rates[2]))
+        self.assertTrue(np.isnan(onmask_rates[5]))
+        self.assertTrue(coded_rates[0] > 0)
+
+    def test_pixel_layout(self):
+        """A gaze point hits the mask pixel at its own column and row."""
+        for coder in ['A', 'B']:
+            img = np.zeros((MASK_SIZE[1], MASK_SIZE[0], 3), dtype=np.uint8)
+            img[2, 7] = COLOR
+            Image.fromarray(img).save(
+                os.path.join(self.mask_dir, coder, '9.0.png'))
+        roi = BeGazeROI(self.roi_config, self.roi_schedule)
+
+        # The mask pixel (x=7, y=2), then its transpose (x=2, y=7)
+        def screen_xy(x, y):
+            return (MASK_POSITION[0] + x) + \
+                SCREEN_SIZE[0] * (MASK_POSITION[1] + y)
+        xy = np.array([screen_xy(7, 2), screen_xy(2, 7), screen_xy(2, 7)],
+                      dtype=np.float64)
+        index = np.arange(3.0)
+        label_bins = pd.DataFrame({'ID': ['9.0', '9.0'],
+                                   'Start_Time': [0.0, 1.0],
+                                   'End_Time': [3.0, 3.0]})
+        first, last = bin_bounds(index, label_bins['Start_Time'].values,
+                                 label_bins['End_Time'].values)
+        moments = SegmentMoments(xy, np.ones(3, dtype=bool), index,
+                                 Segments(first, last),
+                                 label_bins=label_bins)
+        np.testing.assert_allclose(roi._coded_rates(moments), [1 / 4.0, 0])
+
+    def test_mask_cache_size(self):
+        for size in [-1, 2.5, '8']:
+            config = dict(self.roi_config, MaskCacheSize=size)
+            with self.assertRaises(Exception):
+                BeGazeROI(config, self.roi_schedule)
+        config = dict(self.roi_config, MaskCacheSize=0)
+        roi = BeGazeROI(config, self.roi_schedule)
+        self.assertEqual(roi.mask_store.cache_size, 0)
+        self.assertIsNotNone(roi.mask_store.get('1.0'))
+
+    def test_no_streaming(self):
+        """The ROI rates need whole samples, so chunksize is rejected."""
+        config = dict(self.roi_config, Options={'chunksize': 100})
+        with self.assertRaises(Exception):
+            BeGazeROI(config, self.roi_schedule)
+
+    def test_lazy_masks(self):
+        store = self.roi.mask_store
+        self.assertEqual(len(store.files), 4)
+        self.assertEqual((store.hits, store.misses), (0, 0))
+
+        first, last = bin_bounds(self.index,
+                                 self.label_bins['Start_Time'].values,
+                                 self.label_bins['End_Time'].values)
+        for _ in range(2):
+            moments = SegmentMoments(self.xy, self.pos, self.index,
+                                     Segments(first, last),
+                                     label_bins=self.label_bins)
+            self.roi._coded_rates(moments)
+            self.roi._onmask_rates(moments)
+        # Each of the three IDs is loaded once, then found in the cache
+        self.assertEqual((store.hits, store.misses), (3, 3))
+
+        packed, areas = store.get('1.0')
+        self.assertEqual(packed.shape, (2, MASK_SIZE[0] * MASK_SIZE[1] // 8))
+        self.assertIsNone(store.get('3.0'))
+
+if __name__ == '__main__':
+    unittest.main()
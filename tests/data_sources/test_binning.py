@@ -0,0 +1,401 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_binning
+----------------------------------
+
+Tests for the vectorized binning engine provided in
+pypsych.data_sources.binning module.
+"""
+
+
+import unittest
+import pandas as pd
+import numpy as np
+from pypsych.data_sources.binning import bin_bounds, pool_groups, Segments, \
+    PooledSegments, SegmentMoments, StreamedMoments
+from pypsych.data_sources.statistics import get_statistic, Statistic
+from pypsych.data_sources.data_source import DataSource, LABEL_BIN_COLUMNS
+
+
+def _mask_stats(raw, channel, starts, ends, stat_fun):
+    """Reference implementation using one boolean mask per bin."""
+    stats = []
+    for start, end in zip(starts, ends):
+        selector = (raw.index.values >= start) & (raw.index.values < end)
+        stats.append(stat_fun(raw[selector][channel],
+                              raw.loc[selector, 'pos']))
+    return np.array(stats, dtype=np.float64)
+
+
+def _loop_label_bins(labels, info_columns):
+    """Reference implementation expanding one label at a time."""
+    rows = []
+    for _, label in labels.iterrows():
+        n_bins = label['N_Bins']
+        cuts = np.linspace(start=label['Start_Time'] + label['Left_Trim'],
+                           stop=(label['Start_Time']
+                                 + label['Duration']
+                                 - label['Right_Trim']),
+                           num=n_bins+1)
+        for bin_index in range(n_bins):
+            row = {col: label[col] for col in info_columns}
+            row.update({'Bin_Order': len(rows),
+                        'Start_Time': cuts[bin_index],
+                        'End_Time': cuts[bin_index + 1],
+                        'Bin_Index': bin_index})
+            rows.append(row)
+    label_bins = pd.DataFrame(rows, columns=LABEL_BIN_COLUMNS)
+    label_bins['Order'] = [
+        sum((prev['Label'], prev['Bin_Index'])
+            == (row['Label'], row['Bin_Index']) for prev in rows[:pos])
+        for pos, row in enumerate(rows)]
+    return label_bins
+
+
+class BinningEngineTestCases(unittest.TestCase):
+    """
+    Asserts that segment reductions match pandas reductions over masks.
+    """
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        index = np.sort(rng.uniform(0, 100, 500))
+        values = rng.normal(5, 1, 500)
+        pos = rng.uniform(size=500) > 0.2
+        values[~pos] = np.nan
+        self.raw = pd.DataFrame({'x': values, 'pos': pos}, index=index)
+
+        # Overlapping, empty, single-sample and out-of-range bins
+        self.starts = np.array([0.0, 10.0, 15.0, 50.0, 50.0, 99.99, 200.0,
+                                index[3]])
+        self.ends = np.array([10.0, 20.0, 30.0, 50.0, 40.0, 100.0, 300.0,
+                              index[4]])
+        first, last = bin_bounds(index, self.starts, self.ends)
+        self.moments = SegmentMoments(values, pos, index,
+                                      Segments(first, last))
+
+    def assert_matches(self, name, stat_fun):
+        vectorized = get_statistic(name).segment(self.moments)
+        reference = _mask_stats(self.raw, 'x', self.starts, self.ends,
+                                stat_fun)
+        np.testing.assert_allclose(vectorized, reference, rtol=1e-12)
+
+    def test_mean(self):
+        self.assert_matches('mean', lambda x, pos: np.mean(x))
+
+    def test_std(self):
+        self.assert_matches('std', lambda x, pos: x.std())
+
+    def test_sem(self):
+        self.assert_matches('sem', lambda x, pos: x.sem())
+
+    def test_var(self):
+        self.assert_matches('var', lambda x, pos: np.var(x))
+
+    def test_count(self):
+        self.assert_matches('count', lambda x, pos: np.size(x))
+
+    def test_nans(self):
+        self.assert_matches('nans', lambda x, pos: np.size(pos) - np.sum(pos))
+
+    def test_streamed_moments(self):
+        """Moments folded over chunks match those of all the samples."""
+        streamed = StreamedMoments(self.starts.size)
+        for first, last in [(0, 3), (3, 4), (4, 4), (4, 260), (260, 500)]:
+            chunk = self.raw.iloc[first:last]
+            streamed.add(SegmentMoments(
+                chunk['x'].values, chunk['pos'].values, chunk.index.values,
+                Segments(*bin_bounds(chunk.index.values, self.starts,
+                                     self.ends))))
+        for name in ['mean', 'std', 'sem', 'var', 'count', 'nans',
+                     'first_time', 'last_time']:
+            statistic = get_statistic(name)
+            np.testing.assert_allclose(statistic.segment(streamed),
+                                       statistic.segment(self.moments),
+                                       rtol=1e-12)
+
+
+class StatisticsRegistryTestCases(unittest.TestCase):
+    """
+    Asserts that panels entries resolve to registered or legacy statistics.
+    """
+
+    def test_resolve_name(self):
+        self.assertTrue(get_statistic('mean').vectorized)
+
+    def test_resolve_callable(self):
+        fun = lambda x, pos, label_bin: 0
+        statistic = get_statistic(fun)
+        self.assertFalse(statistic.vectorized)
+        self.assertIs(statistic.per_bin, fun)
+
+    def test_resolve_statistic(self):
+        statistic = Statistic('custom', per_bin=lambda x, pos, label_bin: 0)
+        self.assertIs(get_statistic(statistic), statistic)
+
+    def test_unknown_name(self):
+        with self.assertRaises(Exception):
+            get_statistic('no such statistic')
+
+
+class LabelBinsTestCases(unittest.TestCase):
+    """
+    Asserts that DataSource.create_label_bins expands labels as a loop over
+    the labels with np.linspace would.
+    """
+
+    def setUp(self):
+        rng = np.random.RandomState(2)
+        n_labels = 40
+        self.labels = pd.DataFrame({
+            'ID': ['id{}'.format(i) for i in range(n_labels)],
+            'Label': rng.choice(['A', 'B', 'C'], n_labels),
+            'Condition': rng.choice(['X', 'Y', np.nan], n_labels),
+            'N_Bins': rng.randint(0, 5, n_labels),
+            'Start_Time': rng.uniform(0, 1e5, n_labels),
+            'Duration': rng.choice([0.0, 1000.0, 3000.0], n_labels),
+            'Left_Trim': rng.choice([0, 100], n_labels),
+            'Right_Trim': rng.choice([0, 250], n_labels)})
+
+    def assert_matches(self, data_source, info_columns, divisor=1.0):
+        label_bins = data_source.create_label_bins(self.labels)
+        expected = _loop_label_bins(self.labels, info_columns)
+        expected[['Start_Time', 'End_Time']] = \
+            expected[['Start_Time', 'End_Time']] / divisor
+
+        self.assertEqual(list(label_bins.columns), LABEL_BIN_COLUMNS)
+        for col in ['Order', 'Bin_Order', 'Bin_Index']:
+            self.assertEqual(label_bins[col].dtype, np.int64)
+            self.assertEqual(list(label_bins[col]), list(expected[col]))
+        for col in ['Start_Time', 'End_Time']:
+            self.assertEqual(label_bins[col].dtype, np.float64)
+            np.testing.assert_array_equal(label_bins[col], expected[col])
+        for col in ['ID', 'Label', 'Condition']:
+            self.assertEqual(list(label_bins[col].fillna('')),
+                             list(expected[col].fillna('')))
+
+    def test_label_info(self):
+        data_source = DataSource({}, {})
+        self.assert_matches(data_source, ['Label', 'Condition'])
+
+    def test_id_and_time_units(self):
+        data_source = DataSource({}, {})
+        data_source.label_info_columns = ['ID', 'Label', 'Condition']
+        data_source.label_time_divisor = 1000.0
+        self.assert_matches(data_source, ['ID', 'Label', 'Condition'],
+                            divisor=1000.0)
+
+
+class _MockSource(DataSource):
+    """A data source with a precomputed set of label bins."""
+
+    def __init__(self, panels, label_bins):
+        super(_MockSource, self).__init__({}, {})
+        self.panels = panels
+        self.label_bins = label_bins
+
+    def create_label_bins(self, labels):
+        return self.label_bins.copy(deep=True)
+
+
+class BinDataTestCases(unittest.TestCase):
+    """
+    Asserts that DataSource.bin_data gives the same Panels for registered
+    statistics as for legacy per-bin callables.
+    """
+
+    def test_vectorized_matches_per_bin(self):
+        rng = np.random.RandomState(1)
+        index = rng.uniform(0, 60, 300)  # deliberately unsorted
+        values = rng.normal(0, 1, 300)
+        pos = rng.uniform(size=300) > 0.1
+        values[~pos] = np.nan
+        samples = pd.DataFrame({'x': values, 'pos': pos}, index=index)
+
+        label_bins = pd.DataFrame({
+            'Order': [0, 0, 1],
+            'ID': ['a', 'b', 'c'],
+            'Label': ['L', 'M', 'L'],
+            'Condition': ['C', 'C', 'D'],
+            'Bin_Order': [2, 0, 1],
+            'Start_Time': [0.0, 20.0, 40.0],
+            'End_Time': [20.0, 45.0, 41.0],
+            'Bin_Index': [0, 0, 0]})
+
+        statistics = {'VAL': 'mean', 'SEM': 'sem', 'COUNT': 'count',
+                      'NANS': 'nans'}
+        # Legacy callables take the per-bin path.
+        per_bin = {'VAL': lambda x, pos, label_bin: np.mean(x),
+                   'SEM': lambda x, pos, label_bin: x.sem(axis=0),
+                   'COUNT': lambda x, pos, label_bin: np.size(x),
+                   'NANS': lambda x, pos, label_bin:
+                       np.size(pos) - np.sum(pos)}
+
+        fast = _MockSource({'x': statistics}, label_bins)
+        fast.data = {'samples': samples, 'labels': None}
+        fast.bin_data()
+        slow = _MockSource({'x': per_bin}, label_bins)
+        slow.data = {'samples': samples, 'labels': None}
+        slow.bin_data()
+
+        for stat_name in statistics.keys():
+            expected = slow.output_panels()['x'][stat_name]
+            result = fast.output_panels()['x'][stat_name]
+            self.assertEqual(list(result.index), list(expected.index))
+            np.testing.assert_allclose(result['stat'].astype(np.float64),
+                                       expected['stat'].astype(np.float64),
+                                       rtol=1e-12)
+
+    def test_bin_chunks(self):
+        """Binning chunks of the samples matches binning them whole."""
+        rng = np.random.RandomState(2)
+        index = np.sort(rng.uniform(0, 60, 300))
+        values = rng.normal(0, 1, 300)
+        pos = rng.uniform(size=300) > 0.1
+        values[~pos] = np.nan
+        samples = pd.DataFrame({'x': values, 'pos': pos}, index=index)
+        label_bins = pd.DataFrame({
+            'Order': [0, 0, 1],
+            'ID': ['a', 'b', 'c'],
+            'Label': ['L', 'M', 'L'],
+            'Condition': ['C', 'C', 'D'],
+            'Bin_Order': [0, 1, 2],
+            'Start_Time': [0.0, 20.0, 40.0],
+            'End_Time': [20.0, 45.0, 41.0],
+            'Bin_Index': [0, 0, 0]})
+        panels = {'x': {'VAL': 'mean', 'SEM': 'sem', 'COUNT': 'count',
+                        'NANS': 'nans'}}
+
+        whole = _MockSource(panels, label_bins)
+        whole.data = {'samples': samples, 'labels': None}
+        whole.bin_data()
+        streamed = _MockSource(panels, label_bins)
+        streamed.data = {'labels': None}
+        streamed.bin_chunks(samples.iloc[first:first + 70]
+                            for first in range(0, 300, 70))
+        self.assertEqual(list(streamed.output['Stat']),
+                         list(whole.output['Stat']))
+        np.testing.assert_allclose(
+            streamed.output['value'].values.astype(np.float64),
+            whole.output['value'].values.astype(np.float64),
+            rtol=1e-12)
+
+        # Chunks out of time order, and per-bin callables, cannot be binned
+        with self.assertRaises(Exception):
+            streamed.bin_chunks([samples.iloc[100:], samples.iloc[:100]])
+        streamed.panels = {'x': {'VAL': lambda x, pos, label_bin: 0}}
+        with self.assertRaises(Exception):
+            streamed.bin_chunks([samples])
+
+
+def _pooled_stats(raw, channel, label_bins, stat_fun):
+    """Reference implementation appending the samples of each group's bins."""
+    stats = pd.Series(np.nan, index=label_bins.index)
+    conditions = label_bins['Condition'].fillna('<none>')
+    for cond_lbl in pd.Series(zip(conditions, label_bins['Label'])).unique():
+        sel = (conditions == cond_lbl[0]) \
+            & (label_bins['Label'] == cond_lbl[1])
+        samples = pd.Series(name=channel)
+        pos = pd.Series(name='pos')
+        for _, label_bin in label_bins.loc[sel, :].iterrows():
+            selector = (raw.index.values >= label_bin['Start_Time']) \
+                & (raw.index.values < label_bin['End_Time'])
+            samples = samples.append(raw.loc[selector, channel])
+            pos = pos.append(raw.loc[selector, 'pos'])
+        stats[sel] = stat_fun(samples, pos)
+    return stats.values
+
+
+class PooledSegmentsTestCases(unittest.TestCase):
+    """
+    Asserts that statistics pooled over groups of bins match statistics of
+    the appended samples of each group.
+    """
+
+    def setUp(self):
+        rng = np.random.RandomState(2)
+        index = np.sort(rng.uniform(0, 100, 800))
+        values = rng.normal(3, 2, 800)
+        pos = rng.uniform(size=800) > 0.2
+        values[~pos] = np.nan
+        self.raw = pd.DataFrame({'x': values, 'pos': pos}, index=index)
+
+        # Overlapping, empty and out-of-range bins, in groups with and
+        # without a condition
+        self.label_bins = pd.DataFrame({
+            'Label': ['L', 'M', 'L', 'L', 'M', 'N', 'N', 'L', 'M'],
+            'Condition': ['A', 'A', 'B', 'A', np.nan, 'A', 'A', 'B', np.nan],
+            'Start_Time': [0.0, 5.0, 20.0, 30.0, 40.0, 200.0, 250.0, 25.0,
+                           60.0],
+            'End_Time': [10.0, 25.0, 30.0, 45.0, 55.0, 210.0, 260.0, 35.0,
+                         70.0]})
+        first, last = bin_bounds(index,
+                                 self.label_bins['Start_Time'].values,
+                                 self.label_bins['End_Time'].values)
+        self.groups = pool_groups(self.label_bins['Condition'].values,
+                                  self.label_bins['Label'].values)
+        self.segments = PooledSegments(Segments(first, last), self.groups)
+        self.moments = SegmentMoments(values, pos, index, self.segments)
+
+    def test_groups(self):
+        np.testing.assert_array_equal(self.groups,
+                                      [0, 1, 2, 0, 3, 4, 4, 2, 3])
+        np.testing.assert_array_equal(self.segments.first_bins,
+                                      [0, 1, 2, 4, 5])
+
+    def assert_matches(self, name, stat_fun):
+        pooled = self.segments.to_bins(
+            get_statistic(name).segment(self.moments))
+        reference = _pooled_stats(self.raw, 'x', self.label_bins, stat_fun)
+        np.testing.assert_allclose(pooled, reference, rtol=1e-12)
+
+    def test_mean(self):
+        self.assert_matches('mean', lambda x, pos: np.mean(x))
+
+    def test_std(self):
+        self.assert_matches('std', lambda x, pos: x.std(axis=0))
+
+    def test_sem(self):
+        self.assert_matches('sem', lambda x, pos: x.sem(axis=0))
+
+    def test_count(self):
+        self.assert_matches('count', lambda x, pos: np.size(x))
+
+    def test_first_and_last_time(self):
+        self.assert_matches('first_time',
+                            lambda x, pos: x.index[0] if len(x) else np.nan)
+        self.assert_matches('last_time',
+                            lambda x, pos: x.index[-1] if len(x) else np.nan)
+
+    def test_bin_data(self):
+        """DataSource.bin_data pools over the pool_by columns."""
+        label_bins = self.label_bins.copy()
+        label_bins['Order'] = 0
+        label_bins['ID'] = np.nan
+        label_bins['Bin_Order'] = np.arange(len(label_bins))
+        label_bins['Bin_Index'] = 0
+
+        pooled = {}
+        for name, statistics in [('fast', {'VAL': 'mean', 'SEM': 'sem'}),
+                                 ('slow', {'VAL': lambda x, pos, b:
+                                           np.mean(x),
+                                           'SEM': lambda x, pos, b:
+                                           x.sem(axis=0)})]:
+            data_source = _MockSource({'x': statistics}, label_bins)
+            data_source.pool_by = ['Condition', 'Label']
+            data_source.data = {'samples': self.raw, 'labels': None}
+            data_source.bin_data()
+            pooled[name] = data_source.output_panels()['x']
+
+        for stat_name, stat_fun in [('VAL', lambda x, pos: np.mean(x)),
+                                    ('SEM', lambda x, pos: x.sem(axis=0))]:
+            reference = _pooled_stats(self.raw, 'x', label_bins, stat_fun)
+            for name in ['fast', 'slow']:
+                np.testing.assert_allclose(
+                    pooled[name][stat_name]['stat'].astype(np.float64),
+                    reference, rtol=1e-12)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_file_checks
+----------------------------------
+
+Tests for the lightweight file checks provided in
+pypsych.data_sources.file_checks module.
+"""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from scipy.io import savemat
+from pypsych.data_sources.file_checks import peek_lines, has_rows, mat_rows
+from pypsych.data_sources.data_source import DataSource
+
+
+class FileChecksTestCases(unittest.TestCase):
+    """
+    Asserts that files are checked for records from their start only.
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, name, text):
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, 'wb') as f:
+            f.write(text)
+        return path
+
+    def test_peek_lines(self):
+        path = self.write('a.txt', '# comment\n\nh1\th2\n  # note\n1\t2 # x\n'
+                                   + '3\t4\n' * 10000)
+        self.assertEqual(peek_lines(path, 3, comment='#', block_size=4),
+                         ['h1\th2', '1\t2 ', '3\t4'])
+        self.assertEqual(len(peek_lines(path, 5)), 5)
+
+    def test_has_rows(self):
+        self.assertTrue(has_rows(self.write('b.txt', 'h\n1\n2'), 2))
+        self.assertFalse(has_rows(self.write('c.txt', 'h\n1\n\n'), 2))
+        self.assertTrue(has_rows(self.write('d.txt', '1\n2\n'), 2,
+                                 header=False))
+        self.assertFalse(has_rows(self.write('e.txt', ''), 2, header=False))
+
+    def test_mat_rows(self):
+        path = os.path.join(self.tmp_dir, 'f.mat')
+        savemat(path, {'events': np.zeros((7, 1))})
+        self.assertEqual(mat_rows(path, 'events'), 7)
+        self.assertEqual(mat_rows(path, 'other'), 0)
+
+    def test_check_files(self):
+        data_source = DataSource({}, {'samples': '.*', 'labels': '.*',
+                                      'extra': '.*'})
+        checks = data_source.check_files({
+            'samples': self.write('g.txt', 'h\n1\n2\n'),
+            'labels': os.path.join(self.tmp_dir, 'does_not_exist.txt')})
+        self.assertEqual(checks, {'samples': True, 'labels': False,
+                                  'extra': False})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_handoff
+----------------------------------
+
+Tests for the HandoffCache class provided in pypsych.data_sources.handoff
+module.
+"""
+
+
+import pickle
+import unittest
+import pandas as pd
+import numpy as np
+from pypsych.data_sources.handoff import HandoffCache, data_bytes
+
+
+class HandoffCacheTestCases(unittest.TestCase):
+    """
+    Asserts that entries are handed over once, and that entries beyond the
+    memory budget are evicted.
+    """
+
+    def setUp(self):
+        frame = pd.DataFrame({'a': np.arange(100.0), 'b': ['x'] * 100})
+        self.data = {'samples': frame, 'labels': frame.iloc[:10]}
+        self.size = data_bytes(self.data)
+
+    def test_pop_once(self):
+        cache = HandoffCache()
+        self.assertTrue(cache.put('a', self.data))
+        self.assertEqual(cache.nbytes, self.size)
+        data = cache.pop('a')
+        self.assertIs(data['samples'], self.data['samples'])
+        self.assertIsNone(cache.pop('a'))
+        self.assertEqual((cache.hits, cache.misses, cache.nbytes), (1, 1, 0))
+
+    def test_budget(self):
+        cache = HandoffCache(max_bytes=2 * self.size)
+        for key in ['a', 'b', 'c']:
+            cache.put(key, self.data)
+        # The newest entry is evicted, the oldest ones are kept
+        self.assertEqual(cache.evicted, 1)
+        self.assertIsNone(cache.pop('c'))
+        self.assertIsNotNone(cache.pop('a'))
+
+        # Replacing an entry does not count it twice
+        cache.put('b', self.data)
+        self.assertEqual((len(cache), cache.nbytes), (1, self.size))
+
+    def test_not_pickled(self):
+        cache = HandoffCache()
+        cache.put('a', self.data)
+        cache.put('b', {'samples': [1, 2, 3]})
+        self.assertEqual(cache.evicted, 1)
+        self.assertEqual(len(pickle.loads(pickle.dumps(cache))), 0)
+
+if __name__ == '__main__':
+    unittest.main()
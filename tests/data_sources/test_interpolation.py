@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_interpolation
+----------------------------------
+
+Tests for the gap filling provided in pypsych.data_sources.interpolation
+module.
+"""
+
+
+import unittest
+import pandas as pd
+import numpy as np
+from scipy.interpolate import UnivariateSpline
+from pypsych.data_sources.interpolation import nan_runs, interpolate_gaps, \
+    fit_groups, chunk_cut, MAX_MERGED_WINDOWS
+
+
+class InterpolateGapsTestCases(unittest.TestCase):
+    """
+    Asserts that gaps are filled as Series.interpolate fills them, or from
+    their windows of valid samples.
+    """
+
+    def setUp(self):
+        rng = np.random.RandomState(6)
+        self.x = np.arange(2000) * 2.0
+        self.y = 4 + 0.3*np.sin(self.x / 500.0) + rng.normal(0, 0.01, 2000)
+        # Leading, interior and trailing gaps
+        for start, stop in [(0, 5), (100, 110), (130, 135), (700, 760),
+                            (1990, 2000)]:
+            self.y[start:stop] = np.nan
+
+    def test_nan_runs(self):
+        starts, stops = nan_runs(np.array([np.nan, 1, np.nan, np.nan, 2,
+                                           np.nan]))
+        self.assertEqual(list(starts), [0, 2, 5])
+        self.assertEqual(list(stops), [1, 4, 6])
+
+    def test_global_matches_pandas(self):
+        expected = pd.Series(self.y, index=self.x)\
+            .interpolate(method='spline', order=3).values
+        np.testing.assert_array_equal(interpolate_gaps(self.x, self.y),
+                                      expected)
+
+    def test_no_gaps(self):
+        y = np.arange(10.0)
+        np.testing.assert_array_equal(interpolate_gaps(np.arange(10), y), y)
+        y[:] = np.nan
+        self.assertTrue(np.isnan(interpolate_gaps(np.arange(10), y)).all())
+
+    def test_local_windows(self):
+        """Separate gaps are each fit from their own window."""
+        window = 20
+        filled = interpolate_gaps(self.x, self.y, window=window)
+        valid_pos = np.flatnonzero(~np.isnan(self.y))
+        self.assertTrue(np.isnan(filled[:5]).all())
+        for start, stop in [(700, 760), (1990, 2000)]:
+            rank = np.searchsorted(valid_pos, start)
+            fit_pos = valid_pos[rank - window:rank + window]
+            spl = UnivariateSpline(self.x[fit_pos], self.y[fit_pos], k=3)
+            np.testing.assert_array_equal(filled[start:stop],
+                                          spl(self.x[start:stop]))
+
+    def test_overlapping_windows(self):
+        """Gaps closer than their windows share one fit."""
+        window = 20
+        filled = interpolate_gaps(self.x, self.y, window=window)
+        valid_pos = np.flatnonzero(~np.isnan(self.y))
+        lo = np.searchsorted(valid_pos, 100) - window
+        hi = np.searchsorted(valid_pos, 130) + window
+        fit_pos = valid_pos[lo:hi]
+        spl = UnivariateSpline(self.x[fit_pos], self.y[fit_pos], k=3)
+        for start, stop in [(100, 110), (130, 135)]:
+            np.testing.assert_array_equal(filled[start:stop],
+                                          spl(self.x[start:stop]))
+
+    def test_max_gap(self):
+        filled = interpolate_gaps(self.x, self.y, window=20, max_gap=30.0)
+        # (700, 760) spans 122 ms and (1990, 2000) 20 ms to the last sample
+        self.assertTrue(np.isnan(filled[700:760]).all())
+        self.assertFalse(np.isnan(filled[100:110]).any())
+        self.assertFalse(np.isnan(filled[1990:2000]).any())
+        np.testing.assert_array_equal(filled[~np.isnan(self.y)],
+                                      self.y[~np.isnan(self.y)])
+    def test_chunk_cut(self):
+        """Filling either side of a cut matches filling the whole channel."""
+        window = 20
+        y = self.y.copy()
+        y[200:1800:50] = np.nan
+        expected = interpolate_gaps(self.x, y, window=window)
+        for end in [300, 1000, 1990]:
+            cut = chunk_cut(y[:end], window)
+            self.assertLessEqual(cut, end - window)
+            head = interpolate_gaps(self.x[:cut], y[:cut], window=window)
+            tail = interpolate_gaps(self.x[cut - window:], y[cut - window:],
+                                    window=window)
+            np.testing.assert_array_equal(
+                np.concatenate([head, tail[window:]]), expected)
+        # The valid runs between these gaps are too short
+        self.assertIsNone(chunk_cut(y[100:140], window))
+
+    def test_clipped_windows(self):
+        """Windows clipped at the ends still hold order + 1 samples."""
+        x = np.arange(20.0)
+        y = np.sin(x / 5.0)
+        y[17:] = np.nan
+        y[1:4] = np.nan
+        valid_pos = np.flatnonzero(~np.isnan(y))
+        for window in [1, 2, 3]:
+            filled = interpolate_gaps(x, y, window=window)
+            self.assertFalse(np.isnan(filled).any())
+            # The trailing gap is fit from the last four valid samples
+            fit_pos = valid_pos[-4:]
+            spl = UnivariateSpline(x[fit_pos], y[fit_pos], k=3)
+            np.testing.assert_array_equal(filled[17:], spl(x[17:]))
+            # The gap after the first sample from the first four
+            fit_pos = valid_pos[:max(4, 1 + window)]
+            spl = UnivariateSpline(x[fit_pos], y[fit_pos], k=3)
+            np.testing.assert_array_equal(filled[1:4], spl(x[1:4]))
+    def test_capped_groups(self):
+        """Chained overlapping windows are split into bounded fits."""
+        lo = np.array([0, 5, 10, 15, 20, 40])
+        hi = np.array([8, 13, 18, 23, 28, 48])
+        firsts, lasts = fit_groups(lo, hi)
+        self.assertEqual((list(firsts), list(lasts)), ([0, 5], [4, 5]))
+        firsts, lasts = fit_groups(lo, hi, max_fit=14)
+        self.assertEqual((list(firsts), list(lasts)), ([0, 2, 4, 5],
+                                                        [1, 3, 4, 5]))
+
+    def test_capped_chain(self):
+        """A long run of close gaps does not become one global fit."""
+        window = 5
+        y = self.y.copy()
+        y[200:1800:8] = np.nan
+        filled = interpolate_gaps(self.x, y, window=window)
+        self.assertFalse(np.isnan(filled[5:]).any())
+        valid_pos = np.flatnonzero(~np.isnan(y))
+        # Each gap is filled from a fit of at most the capped span
+        max_fit = MAX_MERGED_WINDOWS * 2 * window
+        starts, _ = nan_runs(y)
+        ranks = np.searchsorted(valid_pos, starts[1:])
+        lo = np.maximum(ranks - window, 0)
+        hi = np.minimum(ranks + window, valid_pos.size)
+        firsts, lasts = fit_groups(lo, hi, max_fit)
+        self.assertTrue(len(firsts) > 10)
+        self.assertTrue((hi[lasts] - lo[firsts] <= max_fit).all())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_sample_cache
+----------------------------------
+
+Tests for the SampleCache class provided in
+pypsych.data_sources.sample_cache module.
+"""
+
+
+import os
+import time
+import shutil
+import tempfile
+import unittest
+import yaml
+import pandas as pd
+import numpy as np
+from pkg_resources import resource_filename
+from pypsych.config import Config
+from pypsych.schedule import Schedule
+from pypsych.data_sources.begaze import BeGaze
+from pypsych.data_sources.sample_cache import SampleCache
+
+
+class SampleCacheTestCases(unittest.TestCase):
+    """
+    Asserts that DataFrames are read back from the cache as they were stored.
+    """
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = SampleCache(self.cache_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_roundtrip(self):
+        samples = pd.DataFrame({'x': [1.5, np.nan, 3.0],
+                                'pos': [True, False, True],
+                                'info': pd.Categorical(['a', 'b', 'a'])},
+                               index=pd.Index([0.0, 0.5, 1.0], name='Time'))
+        labels = pd.DataFrame({'Label': ['L', None], 'N_Bins': [1, 2]})
+        data = {'samples': samples, 'labels': labels}
+
+        self.assertIsNone(self.cache.get('k'))
+        self.cache.put('k', data)
+        cached = self.cache.get('k')
+        self.assertEqual(sorted(cached.keys()), ['labels', 'samples'])
+        for name, frame in data.iteritems():
+            pd.util.testing.assert_frame_equal(cached[name], frame)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_eviction(self):
+        frame = pd.DataFrame({'x': np.zeros(1000)})
+        for key in ['a', 'b', 'c']:
+            self.cache.put(key, {'samples': frame})
+            # Entries are ordered by mtime, which may be coarse.
+            past = time.time() - 100 + len(os.listdir(self.cache_dir))
+            os.utime(os.path.join(self.cache_dir, key), (past, past))
+        self.cache.get('a')
+
+        entry_path = os.path.join(self.cache_dir, 'a')
+        entry_size = sum(os.path.getsize(os.path.join(root, filename))
+                         for root, _, filenames in os.walk(entry_path)
+                         for filename in filenames)
+        self.cache.evict(2 * entry_size)
+        self.assertEqual(sorted(os.listdir(self.cache_dir)), ['a', 'c'])
+
+
+class SampleCacheDataSourceTestCases(unittest.TestCase):
+    """
+    Asserts that data sources merge the same data with and without the cache.
+    """
+
+    def setUp(self):
+        config_path = resource_filename('tests.config', 'config.yaml')
+        schedule_path = resource_filename('tests.schedule', 'schedule.yaml')
+        config = Config(yaml.load(open(config_path, 'r')))
+        schedule = Schedule(yaml.load(open(schedule_path, 'r')))
+        schedule.compile(['tests/data'])
+
+        self.subconfig = config.get_subconfig('Mock2', 'BeGaze')
+        self.subschedule = schedule.get_subschedule('Mock2', 'BeGaze')
+        self.file_paths = schedule.get_file_paths(101, 'Mock2', 'BeGaze')
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def merge(self, sample_cache, subconfig=None):
+        if subconfig is None:
+            subconfig = self.subconfig
+        begaze = BeGaze(config=subconfig, schedule=self.subschedule)
+        begaze.sample_cache = sample_cache
+        begaze.load_and_merge(self.file_paths)
+        return begaze
+
+    def test_cached_merge(self):
+        expected = self.merge(None)
+        cache = SampleCache(self.cache_dir)
+        self.merge(cache)
+        cached = self.merge(cache)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        for name, frame in expected.data.iteritems():
+            pd.util.testing.assert_frame_equal(cached.data[name], frame)
+
+        cached.bin_data()
+        expected.bin_data()
+        pd.util.testing.assert_frame_equal(cached.output, expected.output)
+
+    def test_key_depends_on_config(self):
+        cache = SampleCache(self.cache_dir)
+        subconfig = dict(self.subconfig)
+        subconfig['Options'] = {'interpolation': {'window': 10}}
+        self.assertNotEqual(
+            cache.key(self.merge(None), self.file_paths),
+            cache.key(self.merge(None, subconfig), self.file_paths))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_smoothers
+----------------------------------
+
+Tests for the channel smoothers provided in pypsych.data_sources.smoothers
+module.
+"""
+
+
+import unittest
+import pandas as pd
+import numpy as np
+from pypsych.data_sources.smoothers import SMOOTHERS, spline, \
+    windowed_spline, whittaker, get_smoother
+from pypsych.data_sources.biopac import Biopac
+
+
+class SmoothersTestCases(unittest.TestCase):
+    """
+    Asserts that the smoothers agree with their definitions.
+    """
+
+    def setUp(self):
+        rng = np.random.RandomState(4)
+        self.x = np.arange(3000) * 100
+        self.truth = 70 + 5*np.sin(np.arange(3000) / 100.0)
+        self.y = self.truth + rng.normal(0, 0.7, 3000)
+
+    def test_constant_channel(self):
+        """Every smoother should leave a constant channel unchanged."""
+        y = np.full(3000, 60.0)
+        for name, smoother in SMOOTHERS.iteritems():
+            np.testing.assert_allclose(smoother(self.x, y), y, rtol=1e-9,
+                                       err_msg=name)
+
+    def test_short_channels(self):
+        for name, smoother in SMOOTHERS.iteritems():
+            if name in ['spline', 'windowed_spline']:
+                continue
+            for n_samples in [1, 2, 3, 4, 7]:
+                y = np.arange(n_samples, dtype=np.float64)
+                self.assertEqual(smoother(self.x[:n_samples], y).shape,
+                                 y.shape)
+
+    def test_whittaker_normal_equations(self):
+        n_samples, lam = 50, 30.0
+        y = self.y[:n_samples]
+        d2 = np.diff(np.eye(n_samples), n=2, axis=0)
+        dense = np.linalg.solve(np.eye(n_samples) + lam * d2.T.dot(d2), y)
+        np.testing.assert_allclose(whittaker(self.x[:n_samples], y, lam=lam),
+                                   dense, rtol=1e-10)
+        for n_samples in [3, 4]:
+            d2 = np.diff(np.eye(n_samples), n=2, axis=0)
+            dense = np.linalg.solve(np.eye(n_samples) + lam * d2.T.dot(d2),
+                                    self.y[:n_samples])
+            np.testing.assert_allclose(
+                whittaker(self.x[:n_samples], self.y[:n_samples], lam=lam),
+                dense, rtol=1e-10)
+
+    def test_windowed_spline_single_window(self):
+        """A channel shorter than the window gets the full spline."""
+        np.testing.assert_array_equal(
+            windowed_spline(self.x, self.y, window=5000),
+            spline(self.x, self.y))
+
+    def test_windowed_spline_blending(self):
+        smoothed = windowed_spline(self.x, self.y, window=700, overlap=100)
+        rms = np.sqrt(np.mean((smoothed - self.truth)**2))
+        self.assertLess(rms, 0.5)
+        # No jumps where the windows meet
+        self.assertLess(np.max(np.abs(np.diff(smoothed))), 0.5)
+
+    def test_get_smoother(self):
+        smoother = get_smoother({'method': 'savgol', 'window': 11})
+        self.assertEqual(smoother(self.x, self.y).shape, self.y.shape)
+
+
+class BiopacSmootherOptionTestCases(unittest.TestCase):
+    """
+    Asserts that Biopac smooths its channels with the smoother option.
+    """
+
+    def setUp(self):
+        rng = np.random.RandomState(5)
+        self.samples = pd.DataFrame(rng.normal(70, 1, size=(500, 3)),
+                                    columns=['bpm', 'rr', 'twave'])
+
+    def clean(self, options=None):
+        config = {'Event': {'duration': 1000, 'bins': 1, 'pattern': 1}}
+        if options is not None:
+            config['Options'] = options
+        biopac = Biopac(config, {'samples': '.*', 'labels': '.*'})
+        return biopac._clean_samples(self.samples.copy())
+
+    def test_default_spline(self):
+        cleaned = self.clean()
+        np.testing.assert_array_equal(
+            cleaned['bpm'].values,
+            spline(np.arange(500) * 100, self.samples['bpm'].values))
+
+    def test_whittaker_option(self):
+        cleaned = self.clean({'smoother': {'method': 'whittaker',
+                                           'lam': 100.0}})
+        np.testing.assert_array_equal(
+            cleaned['rr'].values,
+            whittaker(None, self.samples['rr'].values, lam=100.0))
+        self.assertTrue(cleaned['pos'].all())
+
+    def test_bad_smoother(self):
+        with self.assertRaises(Exception):
+            self.clean({'smoother': {'method': 'no such smoother'}})
+
+    def test_bad_parameters(self):
+        """Parameters are validated against the chosen smoother."""
+        for smoother in [{'method': 'windowed_spline', 'window': 6000.0},
+                         {'method': 'windowed_spline', 'window': 600,
+                          'overlap': 600},
+                         {'method': 'windowed_spline', 'window': 500},
+                         {'method': 'windowed_spline', 'overlap': -1},
+                         {'method': 'savgol', 'window': 11.0},
+                         {'method': 'savgol', 'polyorder': 2.5},
+                         {'method': 'spline', 'scale': 0},
+                         {'method': 'whittaker', 'lam': -1.0},
+                         {'method': 'whittaker', 'lamda': 10.0},
+                         {'method': 'spline', 'window': 100}]:
+            with self.assertRaises(Exception):
+                self.clean({'smoother': smoother})
+        self.clean({'smoother': {'method': 'windowed_spline', 'window': 200,
+                                 'overlap': 50, 'scale': 0.5}})
+        self.clean({'smoother': {'method': 'savgol', 'window': 11,
+                                 'polyorder': 2}})
+
+if __name__ == '__main__':
+    unittest.main()
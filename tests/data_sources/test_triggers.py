@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_triggers
+----------------------------------
+
+Tests for the trigger-edge detection provided in pypsych.data_sources.triggers
+module.
+"""
+
+
+import unittest
+import pandas as pd
+import numpy as np
+from pypsych.data_sources.triggers import trigger_edges, trigger_labels
+
+
+def _padded_labels(flags):
+    """Reference implementation comparing padded copies of the channel."""
+    low_offset = np.append(-255, flags)
+    high_offset = np.append(flags, flags[-1])
+    sel = ((low_offset-high_offset) != 0)[:-1]
+    labels = pd.DataFrame({'flag': flags[sel],
+                           'Start_Time': np.where(sel)[0]})
+    return labels[(labels['flag'] != 255)]
+
+
+class TriggerEdgesTestCases(unittest.TestCase):
+    """
+    Asserts that events are found at every change of the flag channel.
+    """
+
+    def assert_labels(self, flags, expected_flags, expected_starts):
+        labels = trigger_labels(np.array(flags, dtype=np.uint8))
+        self.assertEqual(list(labels['flag']), expected_flags)
+        self.assertEqual(list(labels['Start_Time']), expected_starts)
+
+    def test_event_at_first_sample(self):
+        self.assert_labels([3, 3, 255, 255, 4], [3, 4], [0, 4])
+
+    def test_event_at_last_sample(self):
+        self.assert_labels([255, 255, 3, 3, 255, 7], [3, 7], [2, 5])
+
+    def test_single_sample(self):
+        self.assert_labels([5], [5], [0])
+        self.assert_labels([255], [], [])
+
+    def test_repeated_idle_codes(self):
+        self.assert_labels([255] * 5, [], [])
+        self.assert_labels([255, 255, 1, 255, 255, 255, 1, 1, 255],
+                           [1, 1], [2, 6])
+
+    def test_adjacent_events(self):
+        """Events without idle samples between them are still separate."""
+        self.assert_labels([1, 1, 2, 2, 1], [1, 2, 1], [0, 2, 4])
+
+    def test_empty_channel(self):
+        self.assertEqual(list(trigger_edges(np.array([]))), [])
+        self.assert_labels([], [], [])
+
+    def test_matches_padded_reference(self):
+        rng = np.random.RandomState(3)
+        flags = rng.choice([1, 2, 255], size=5000, p=[0.01, 0.01, 0.98])
+        flags = np.repeat(flags, rng.randint(1, 20, size=flags.size))
+        pd.util.testing.assert_frame_equal(trigger_labels(flags),
+                                           _padded_labels(flags))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,6 +9,9 @@ Tests for `Experiment` class provided in pypsych.experiment module.
 """
 
 
+import os
+import shutil
+import tempfile
 import unittest
 import pandas as pd
 import numpy as np
@@ -73,5 +76,147 @@ class ExperimentProcessingTestCases(unittest.TestCase):
         """Consume a schedule."""
         self.experiment.process()
 
+
+class ExperimentParallelTestCases(unittest.TestCase):
+    """
+    Asserts that processing in a worker pool matches a serial run.
+    """
+
+    def setUp(self):
+        self.config_path = resource_filename('tests.experiment',
+                                             'begaze_experiment.yaml')
+
+    def _process(self, **kwargs):
+        experiment = Experiment(config_path=self.config_path)
+        experiment.compile()
+        experiment.process(**kwargs)
+        return experiment.output
+
+    def test_parallel_matches_serial(self):
+        """Outputs are identical regardless of worker completion order."""
+        serial = self._process()
+        parallel = self._process(workers=2)
+        self.assertEqual(serial.keys(), parallel.keys())
+        for task_name, output in serial.iteritems():
+            pd.util.testing.assert_frame_equal(output, parallel[task_name])
+
+
+class ExperimentSampleCacheTestCases(unittest.TestCase):
+    """
+    Asserts that outputs are identical with and without the sample cache.
+    """
+
+    def setUp(self):
+        self.config_path = resource_filename('tests.experiment',
+                                             'begaze_experiment.yaml')
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def _process(self, **kwargs):
+        experiment = Experiment(config_path=self.config_path)
+        experiment.sample_cache_path = self.cache_dir
+        experiment.compile()
+        experiment.process(**kwargs)
+        return experiment
+
+    def test_cached_matches_uncached(self):
+        uncached = self._process(use_cache=False)
+        self.assertIsNone(uncached.sample_cache)
+        first = self._process()
+        second = self._process()
+        self.assertEqual(first.sample_cache.hits, 0)
+        self.assertEqual(second.sample_cache.misses, 0)
+        for task_name, output in uncached.output.iteritems():
+            pd.util.testing.assert_frame_equal(output,
+                                               second.output[task_name])
+
+
+class ExperimentValidationTestCases(unittest.TestCase):
+    """
+    Asserts that the lightweight validation matches loading every file, and
+    that it finds corrupt files.
+    """
+
+    def setUp(self):
+        self.config_path = resource_filename('tests.experiment',
+                                             'begaze_experiment.yaml')
+        self.data_dir = tempfile.mkdtemp()
+        for filename in os.listdir('tests/data'):
+            if 'begaze' in filename:
+                shutil.copy(os.path.join('tests/data', filename),
+                            self.data_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir)
+
+    def _validate(self, **kwargs):
+        experiment = Experiment(config_path=self.config_path)
+        experiment.data_paths = [self.data_dir]
+        experiment.compile()
+        return experiment.validate_files(**kwargs)
+
+    def test_matches_full(self):
+        checked = self._validate(workers=4)
+        loaded = self._validate(full=True)
+        pd.util.testing.assert_frame_equal(checked[0], loaded[0])
+        self.assertEqual(checked[1:], loaded[1:])
+        self.assertEqual(checked[1], [101, 102])
+
+    def test_corrupt(self):
+        with open(os.path.join(self.data_dir, '1022_begaze_samples.txt'),
+                  'w') as f:
+            f.write('Time\tL Pupil Diameter [mm]\n0.0\t3.0\n')
+        validation, valid_subjects, invalid_subjects = self._validate()
+        self.assertEqual(validation.loc[102, ('BeGaze', 'Mock2', 'samples')],
+                         'Corrupt')
+        self.assertEqual(validation.loc[102, ('BeGaze', 'Mock2', 'labels')],
+                         'Found')
+        self.assertEqual((valid_subjects, invalid_subjects), ([101], [102]))
+
+
+class ExperimentHandoffTestCases(unittest.TestCase):
+    """
+    Asserts that processing the data kept by validation matches loading the
+    files again, within and beyond the memory budget.
+    """
+
+    def setUp(self):
+        self.config_path = resource_filename('tests.experiment',
+                                             'begaze_experiment.yaml')
+
+    def _process(self, handoff_max_bytes=None, **kwargs):
+        experiment = Experiment(config_path=self.config_path)
+        if handoff_max_bytes is not None:
+            experiment.handoff_max_bytes = handoff_max_bytes
+        experiment.compile(**kwargs)
+        n_kept = len(experiment.handoff) if experiment.handoff else 0
+        experiment.process()
+        return experiment, n_kept
+
+    def assert_outputs_equal(self, output, other):
+        self.assertEqual(output.keys(), other.keys())
+        for task_name, task_output in output.iteritems():
+            pd.util.testing.assert_frame_equal(task_output, other[task_name])
+
+    def test_handoff_matches_reload(self):
+        reloaded, _ = self._process(validate=True)
+        self.assertIsNone(reloaded.handoff)
+        handed, n_kept = self._process(validate=True, handoff=True)
+        self.assertEqual(n_kept, 2)
+        self.assertEqual((handed.handoff.hits, handed.handoff.misses), (2, 0))
+        self.assertEqual(len(handed.handoff), 0)
+        self.assert_outputs_equal(reloaded.output, handed.output)
+
+    def test_eviction(self):
+        reloaded, _ = self._process()
+        handed, n_kept = self._process(handoff_max_bytes=0, validate=True,
+                                       handoff=True)
+        self.assertEqual(n_kept, 0)
+        self.assertEqual(handed.handoff.evicted, 2)
+        self.assertEqual((handed.handoff.hits, handed.handoff.misses), (0, 2))
+        self.assert_outputs_equal(reloaded.output, handed.output)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_output
+----------------------------------
+
+Tests for the long-format output model and `OutputBuilder` class provided in
+pypsych.output module.
+"""
+
+
+import unittest
+import pandas as pd
+import numpy as np
+from pypsych.output import OutputBuilder, LONG_COLUMNS, long_block, \
+    concat_long, long_to_panels, panels_to_long, pivot_long
+
+
+def _label_bins(n_bins=3):
+    return pd.DataFrame({'Order': np.arange(n_bins),
+                         'ID': ['a', 'b', np.nan][:n_bins],
+                         'Label': 'L',
+                         'Condition': 'C',
+                         'Bin_Order': np.arange(n_bins)[::-1],
+                         'Bin_Index': 0,
+                         'Start_Time': 0.0,
+                         'End_Time': 1.0})
+
+
+def _subject_output(subject_id):
+    label_bins = _label_bins()
+    long_df = concat_long([
+        long_block(label_bins, 'x', 'VAL', np.arange(3) + 10.0 * subject_id),
+        long_block(label_bins, 'x', 'SEM', np.ones(3)),
+        long_block(label_bins, 'y', 'VAL', np.zeros(3))])
+    long_df.insert(0, 'Subject', subject_id)
+    return long_df
+
+
+class LongFormatTestCases(unittest.TestCase):
+    """
+    Asserts that the long-format tables are typed and convert to Panels.
+    """
+
+    def setUp(self):
+        self.long_df = _subject_output(101)
+
+    def test_columns(self):
+        self.assertEqual(list(self.long_df.columns), LONG_COLUMNS)
+        self.assertEqual(self.long_df['Label'].dtype.name, 'category')
+        self.assertEqual(self.long_df['value'].dtype, np.float64)
+        self.assertEqual(self.long_df['Bin_Order'].dtype, np.int64)
+
+    def test_sorted_by_bin_order(self):
+        val = self.long_df[(self.long_df['Channel'] == 'x')
+                           & (self.long_df['Stat'] == 'VAL')]
+        self.assertEqual(list(val['Bin_Order']), [0, 1, 2])
+        self.assertEqual(list(val['value']), [1012.0, 1011.0, 1010.0])
+
+    def test_panels_round_trip(self):
+        panels = long_to_panels(self.long_df)
+        self.assertEqual(sorted(panels.keys()), ['x', 'y'])
+        self.assertEqual(sorted(panels['x'].items), ['SEM', 'VAL'])
+        self.assertEqual(list(panels['x'].minor_axis),
+                         ['Order', 'ID', 'Label', 'Condition', 'Bin_Order',
+                          'Bin_Index', 'stat', 'Subject'])
+        round_trip = panels_to_long(panels)
+        round_trip = round_trip.sort_values(by=['Channel', 'Stat',
+                                                'Bin_Order'])
+        expected = self.long_df.sort_values(by=['Channel', 'Stat',
+                                                'Bin_Order'])
+        for col in LONG_COLUMNS:
+            self.assertEqual(list(round_trip[col].astype(object).fillna('')),
+                             list(expected[col].astype(object).fillna('')))
+
+
+def _pivot_panels(long_df):
+    """
+    Reference pivoting of the Panel views with a Python aggfunc, one
+    pd.pivot_table per channel statistic.
+    """
+    pivots = {}
+    for channel, stats in long_to_panels(long_df).iteritems():
+        pivots[channel] = {}
+        stats.loc[:, :, 'Event'] = stats.loc[:, :, 'Label'] \
+            + stats.loc[:, :, 'Bin_Index'].astype(str)
+        for stat_name, stat in stats.iteritems():
+            full_cols = stat[['Subject', 'Condition',
+                              'ID', 'Order']].dropna(how='all', axis=1)\
+                                             .columns
+            pivots[channel][stat_name] = pd.pivot_table(
+                stat,
+                values='stat',
+                index=list(full_cols),
+                columns='Event',
+                aggfunc=lambda x: x.iloc[0])
+    return pivots
+
+
+class PivotLongTestCases(unittest.TestCase):
+    """
+    Asserts that the wide tables unstacked at once match pivoting each
+    channel statistic of the Panel views.
+    """
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        blocks = []
+        for subject_id in [102, 101, 103]:
+            label_bins = pd.DataFrame({
+                'Order': np.repeat(np.arange(4), 2),
+                'ID': np.repeat(np.array(['b', 'a', None, 'c'],
+                                         dtype=np.object), 2),
+                'Label': np.repeat(['Lab', 'La', 'Lab', 'Lab'], 2),
+                'Condition': np.repeat(['C', 'D', 'C', 'C'], 2),
+                'Bin_Order': np.arange(8),
+                'Bin_Index': np.tile([0, 1], 4)})
+            x_val = rng.uniform(size=8)
+            x_val[3] = np.nan
+            subject_blocks = [
+                long_block(label_bins, 'x', 'VAL', x_val),
+                long_block(label_bins, 'x', 'COUNT', np.arange(8.0))]
+            # A channel without conditions
+            label_bins['Condition'] = np.nan
+            subject_blocks.append(long_block(label_bins, 'y', 'VAL',
+                                             rng.uniform(size=8)))
+            subject_output = concat_long(subject_blocks)
+            subject_output.insert(0, 'Subject', subject_id)
+            blocks.append(subject_output)
+        self.long_df = concat_long(blocks)
+
+    def test_matches_panels(self):
+        pivots = pivot_long(self.long_df)
+        expected = _pivot_panels(self.long_df)
+        self.assertEqual(sorted(pivots.keys()), sorted(expected.keys()))
+        for channel, stats in expected.iteritems():
+            self.assertEqual(sorted(pivots[channel].keys()),
+                             sorted(stats.keys()))
+            for stat_name, stat in stats.iteritems():
+                pd.util.testing.assert_frame_equal(pivots[channel][stat_name],
+                                                   stat.astype(np.float64),
+                                                   check_index_type=False)
+
+    def test_layout(self):
+        pivots = pivot_long(self.long_df)
+        val = pivots['y']['VAL']
+        self.assertEqual(val.index.names, ['Subject', 'ID', 'Order'])
+        self.assertEqual(list(val.columns), ['La0', 'La1', 'Lab0', 'Lab1'])
+        self.assertEqual(val.columns.name, 'Event')
+        self.assertEqual(list(val.index.get_level_values('Subject')),
+                         [101] * 3 + [102] * 3 + [103] * 3)
+        # The bins without an ID are left out, and the NaN value of 'x' is
+        # kept as is
+        self.assertTrue(np.isnan(pivots['x']['VAL'].loc[(101, 'D', 'a', 1),
+                                                        'La1']))
+        self.assertEqual(pivots['x']['COUNT'].loc[(101, 'D', 'a', 1), 'La1'],
+                         3.0)
+
+    def test_empty(self):
+        self.assertEqual(pivot_long(concat_long([])), {})
+
+
+class OutputBuilderTestCases(unittest.TestCase):
+    """
+    Asserts that collecting then concatenating once matches growing the
+    output one subject at a time.
+    """
+
+    def setUp(self):
+        self.subjects = [101, 102, 103]
+        self.outputs = [_subject_output(subject_id)
+                        for subject_id in self.subjects]
+        self.expected = concat_long(self.outputs)
+
+    def test_build(self):
+        builder = OutputBuilder(['Task'])
+        for subject_id, output in zip(self.subjects, self.outputs):
+            builder.add('Task', subject_id, output)
+        pd.util.testing.assert_frame_equal(builder.build()['Task'],
+                                           self.expected)
+
+    def test_build_preallocated(self):
+        """Blocks are placed in subject order whatever order they arrive in."""
+        builder = OutputBuilder(['Task'], subjects=self.subjects + [104])
+        for subject_id, output in reversed(zip(self.subjects, self.outputs)):
+            builder.add('Task', subject_id, output)
+        pd.util.testing.assert_frame_equal(builder.build()['Task'],
+                                           self.expected)
+
+    def test_empty_task(self):
+        builder = OutputBuilder(['Task', 'Other'], subjects=[101])
+        builder.add('Task', 101, self.outputs[0])
+        output = builder.build()
+        self.assertTrue(output['Other'].empty)
+        self.assertEqual(list(output['Other'].columns), LONG_COLUMNS)
+
+if __name__ == '__main__':
+    unittest.main()
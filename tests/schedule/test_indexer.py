@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_indexer
+----------------------------------
+
+Tests for `FileIndexer` class provided in pypsych.indexer module.
+"""
+
+
+import unittest
+import os
+import re
+import time
+import shutil
+import tempfile
+import yaml
+import numpy as np
+import pandas as pd
+from pkg_resources import resource_filename
+from pypsych.indexer import FileIndexer, required_literals
+
+
+def _walk_search(raw, data_paths):
+    """Reference search walking every data path once per pattern."""
+    files_dict = []
+    for task_name, task in raw.iteritems():
+        for data_source_name, patterns in task.iteritems():
+            for pattern_name, pattern in patterns.iteritems():
+                for data_path in data_paths:
+                    for root, _, files in os.walk(data_path):
+                        for filepath in files:
+                            file_match = re.match(pattern, filepath)
+                            if file_match:
+                                fd = file_match.groupdict()
+                                fd['Task_Name'] = task_name
+                                fd['Data_Source_Name'] = data_source_name
+                                fd['File'] = pattern_name
+                                fd['Path'] = os.path.join(root, filepath)
+                                files_dict.append(fd)
+    files_df = pd.DataFrame(files_dict)
+    files_df.fillna({'Task_Order': 0}, inplace=True)
+    files_df[['Subject', 'Task_Order']] = \
+        files_df[['Subject', 'Task_Order']].astype(np.int64)
+    return files_df
+
+
+class RequiredLiteralsTestCases(unittest.TestCase):
+    """
+    Asserts that the literal prefilter only contains text every match has.
+    """
+
+    def test_literal_runs(self):
+        self.assertEqual(
+            required_literals('(?P<Subject>[0-9]{3})_begaze_samples.txt'),
+            ['_begaze_samples', 'txt'])
+
+    def test_optional_text(self):
+        self.assertEqual(required_literals('x?yz|w'), [])
+        self.assertEqual(required_literals('x?yz'), ['yz'])
+
+    def test_ignorecase(self):
+        self.assertEqual(required_literals('(?i)abc'), [])
+
+
+class FileIndexerTestCases(unittest.TestCase):
+    """
+    Asserts that the single-pass indexer finds the same files, in the same
+    order, as walking the data paths once per pattern.
+    """
+
+    def setUp(self):
+        self.raw = yaml.load(open(resource_filename('tests.schedule',
+                                                    'schedule.yaml'), 'r'))
+        self.data_paths = ['tests/data', 'tests']
+
+    def test_search(self):
+        indexer = FileIndexer(self.raw)
+        files_df = indexer.search(self.data_paths)
+        pd.util.testing.assert_frame_equal(
+            files_df, _walk_search(self.raw, self.data_paths))
+
+    def test_timings(self):
+        indexer = FileIndexer(self.raw)
+        indexer.search(self.data_paths)
+        self.assertEqual(sorted(indexer.timings.keys()),
+                         sorted(self.data_paths))
+
+
+class FileIndexCacheTestCases(unittest.TestCase):
+    """
+    Asserts that the persistent index only rescans changed directories and
+    finds the same files as a full scan.
+    """
+
+    def setUp(self):
+        self.raw = yaml.load(open(resource_filename('tests.schedule',
+                                                    'schedule.yaml'), 'r'))
+        self.tmp = tempfile.mkdtemp()
+        self.data_path = os.path.join(self.tmp, 'data')
+        self.cache_dir = os.path.join(self.tmp, 'cache')
+        self.dirs = [os.path.join(self.data_path, name)
+                     for name in ['a', 'b', os.path.join('b', 'c')]]
+        for dirname in self.dirs:
+            os.makedirs(dirname)
+        for subject in [101, 102]:
+            for dirname in self.dirs:
+                for suffix in ['begaze_samples.txt', 'begaze_labels.txt']:
+                    self._touch(dirname, '{}1_{}'.format(subject, suffix))
+
+        # Backdate the directories so that their listings can be reused
+        past = time.time() - 60
+        for dirname in [self.data_path] + self.dirs:
+            os.utime(dirname, (past, past))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    @staticmethod
+    def _touch(dirname, filename):
+        open(os.path.join(dirname, filename), 'w').close()
+
+    def _search(self, rebuild=False):
+        indexer = FileIndexer(self.raw, cache_dir=self.cache_dir,
+                              rebuild=rebuild)
+        files_df = indexer.search([self.data_path])
+        return files_df, indexer.report[self.data_path]
+
+    def test_cold_and_warm(self):
+        cold, cold_report = self._search()
+        warm, warm_report = self._search()
+        self.assertEqual(cold_report, {'reused': 0, 'rescanned': 4})
+        self.assertEqual(warm_report, {'reused': 4, 'rescanned': 0})
+        pd.util.testing.assert_frame_equal(cold, warm)
+        pd.util.testing.assert_frame_equal(
+            cold, FileIndexer(self.raw).search([self.data_path]))
+
+    def test_changed_directory(self):
+        self._search()
+        self._touch(self.dirs[2], '1031_begaze_samples.txt')
+        files_df, report = self._search()
+        self.assertEqual(report, {'reused': 3, 'rescanned': 1})
+        self.assertIn(103, list(files_df['Subject']))
+        pd.util.testing.assert_frame_equal(
+            files_df, FileIndexer(self.raw).search([self.data_path]))
+
+    def test_rebuild(self):
+        self._search()
+        _, report = self._search(rebuild=True)
+        self.assertEqual(report, {'reused': 0, 'rescanned': 4})
+
+    def test_schedule_change(self):
+        """A different schedule does not reuse the index of another."""
+        self._search()
+        self.raw['Mock1']['BeGaze']['samples'] = '(?P<Subject>[0-9]{3})x'
+        _, report = self._search()
+        self.assertEqual(report, {'reused': 0, 'rescanned': 4})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -194,5 +194,45 @@ class ScheduleValidationTestCases(unittest.TestCase):
         """File patterns that provide Subject_ID and Task_Order are accepted."""
         self.schedule.validate_patterns(self.good_schedule)
 
+
+class ScheduleFileIndexTestCases(unittest.TestCase):
+    """
+    Asserts that get_file_paths agrees with filtering sched_df through
+    compilation and isolation of subjects, tasks and data sources.
+    """
+
+    def setUp(self):
+        schedule_path = resource_filename('tests.schedule', 'schedule.yaml')
+        self.schedule = Schedule(yaml.load(open(schedule_path, 'r')))
+        self.schedule.compile(['tests/data'])
+
+    def assert_index_matches_sched_df(self):
+        sched_df = self.schedule.sched_df
+        expected = {}
+        for _, row in sched_df.iterrows():
+            idx = (row['Subject'], row['Task_Name'], row['Data_Source_Name'])
+            expected.setdefault(idx, {})[row['File']] = row['Path']
+        self.assertEqual(self.schedule.file_index, expected)
+        for idx, files_dict in expected.iteritems():
+            self.assertEqual(self.schedule.get_file_paths(*idx), files_dict)
+
+    def test_compile(self):
+        self.assertTrue(len(self.schedule.file_index) > 0)
+        self.assert_index_matches_sched_df()
+
+    def test_remove_subject(self):
+        self.schedule.remove_subject(101)
+        self.assert_index_matches_sched_df()
+        with self.assertRaises(Exception):
+            self.schedule.get_file_paths(101, 'Mock1', 'BeGaze')
+
+    def test_isolate(self):
+        self.schedule.isolate_subjects([102])
+        self.schedule.isolate_tasks(['Mock1'])
+        self.schedule.isolate_data_sources(['BeGaze', 'EPrime'])
+        self.assert_index_matches_sched_df()
+        self.assertEqual(sorted(self.schedule.file_index.keys()),
+                         [(102, 'Mock1', 'BeGaze'), (102, 'Mock1', 'EPrime')])
+
 if __name__ == '__main__':
     unittest.main()
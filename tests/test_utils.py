@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_utils
+----------------------------------
+
+Tests for the column helpers of the `pypsych.utils` module.
+"""
+
+import unittest
+import pandas as pd
+import numpy as np
+from pypsych.utils import coalesce_columns, merge_and_rename_columns
+
+
+def _merge_one_by_one(df, new_name, old_names):
+    """Reference filling of new_name with one masked assignment per column."""
+    res = df.copy(deep=True)
+    if type(old_names) is not list:
+        old_names = [old_names]
+    if new_name not in old_names:
+        res[new_name] = np.nan
+    for old_name in old_names:
+        sel = ~pd.notnull(res[new_name])
+        res.loc[sel, new_name] = res.loc[sel, old_name]
+    return res
+
+
+class CoalesceColumnsTestCases(unittest.TestCase):
+    """
+    Asserts that coalesce_columns fills columns as merge_and_rename_columns
+    always has.
+    """
+
+    def setUp(self):
+        self.df = pd.DataFrame({'A': [u'1', np.nan, np.nan, np.nan],
+                                'B': [u'5', u'6', np.nan, np.nan],
+                                'C': [np.nan, u'7', u'8', np.nan],
+                                'X': [1.0, np.nan, 3.0, np.nan],
+                                'Y': [np.nan, 2.0, 4.0, np.nan]},
+                               index=[3, 4, 5, 6])
+        self.mapping = {'ID': ['A', 'B', 'C'],
+                        'B': ['C', 'B'],
+                        'Condition': 'C',
+                        'X': 'X',
+                        'Num': ['X', 'Y']}
+
+    def test_matches_one_by_one(self):
+        coalesced = coalesce_columns(self.df, self.mapping)
+        self.assertEqual(list(coalesced.columns), list(self.mapping.keys()))
+        for new_name, old_names in self.mapping.iteritems():
+            expected = _merge_one_by_one(self.df, new_name, old_names)
+            pd.util.testing.assert_series_equal(coalesced[new_name],
+                                                expected[new_name],
+                                                check_dtype=False)
+
+    def test_does_not_modify(self):
+        df = self.df.copy()
+        coalesce_columns(self.df, self.mapping)
+        pd.util.testing.assert_frame_equal(self.df, df)
+
+    def test_wrapper(self):
+        res = merge_and_rename_columns(self.df, 'ID', ['C', 'A'])
+        self.assertEqual(list(res['ID'].values[:3]), [u'1', u'7', u'8'])
+        self.assertTrue(pd.isnull(res['ID'].values[3]))
+        pd.util.testing.assert_frame_equal(res.drop('ID', axis=1), self.df)
+
+    def test_missing_column(self):
+        with self.assertRaises(KeyError):
+            coalesce_columns(self.df, {'ID': ['A', 'Z']})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_validation
+----------------------------------
+
+Tests for the validation tables of the `pypsych.validation` module.
+"""
+
+import unittest
+import pandas as pd
+import numpy as np
+from pypsych.validation import file_counts, status_table, status_matrix, \
+    STATUSES, VALIDATION_COLUMNS
+
+
+def _sched_df(rows):
+    return pd.DataFrame.from_records(
+        rows, columns=['Subject', 'Data_Source_Name', 'Task_Name', 'File',
+                       'Path'])
+
+
+class ValidationTableTestCases(unittest.TestCase):
+    """
+    Asserts that each file gets its status, and that the wide matrix matches
+    the long table.
+    """
+
+    def setUp(self):
+        self.sched_df = _sched_df([
+            (1, 'BeGaze', 'T', 'labels', 'a'),
+            (1, 'BeGaze', 'T', 'samples', 'b'),
+            (1, 'EPrime', 'T', 'samples', 'c'),
+            (2, 'BeGaze', 'T', 'labels', 'd'),
+            (2, 'BeGaze', 'T', 'samples', 'e'),
+            (2, 'BeGaze', 'T', 'samples', 'f'),
+            (3, 'BeGaze', 'T', 'labels', 'g'),
+            (3, 'BeGaze', 'T', 'samples', 'h'),
+            (3, 'EPrime', 'T', 'samples', 'i')])
+        self.checks = pd.DataFrame.from_records(
+            [(1, 'BeGaze', 'T', 'samples', True),
+             (1, 'EPrime', 'T', 'samples', False),
+             (2, 'BeGaze', 'T', 'samples', False),
+             (3, 'BeGaze', 'T', 'labels', False),
+             (4, 'BeGaze', 'T', 'labels', False)],
+            columns=['Subject', 'Data_Source_Name', 'Task_Name', 'File',
+                     'Passed'])
+
+    def test_counts(self):
+        counts = file_counts(self.sched_df)
+        self.assertEqual(list(counts.index), [1, 2, 3])
+        self.assertEqual(counts.columns.names,
+                         ['Data_Source_Name', 'Task_Name', 'File'])
+        np.testing.assert_array_equal(counts.values,
+                                      [[1, 1, 1], [1, 2, 0], [1, 1, 1]])
+
+    def test_statuses(self):
+        table = status_table(file_counts(self.sched_df), self.checks)
+        self.assertEqual(list(table.columns), VALIDATION_COLUMNS)
+        self.assertEqual(str(table['Status'].dtype), 'category')
+        self.assertEqual(list(table['Status'].cat.categories), STATUSES)
+        # Multiple files are Missing even when their check failed
+        self.assertEqual(list(table['Status']),
+                         ['Found', 'Found', 'Corrupt',
+                          'Found', 'Missing', 'Missing',
+                          'Corrupt', 'Found', 'Found'])
+
+        matrix = status_matrix(table)
+        self.assertEqual(matrix.loc[1, ('EPrime', 'T', 'samples')], 'Corrupt')
+        self.assertEqual(matrix.loc[2, ('EPrime', 'T', 'samples')], 'Missing')
+        self.assertEqual(matrix.loc[3, ('BeGaze', 'T', 'labels')], 'Corrupt')
+
+        # Cells without rows are Missing
+        matrix = status_matrix(table.iloc[1:])
+        self.assertEqual(matrix.loc[1, ('BeGaze', 'T', 'labels')], 'Missing')
+
+    def test_unchecked(self):
+        matrix = status_matrix(status_table(file_counts(self.sched_df)))
+        self.assertEqual(list((matrix == 'Found').all(axis=1)),
+                         [True, False, True])
+
+if __name__ == '__main__':
+    unittest.main()